@@ -0,0 +1,137 @@
+"""
+Configuración de la base de datos a partir de variables de entorno.
+
+- SQLite (por defecto): journal WAL, synchronous=NORMAL, busy_timeout y
+  mmap/cache_size aplicados al abrir cada conexión (init_command), transacciones
+  IMMEDIATE para que dos reservas simultáneas esperen el bloqueo de escritura en
+  lugar de fallar con "database is locked", y conexiones persistentes.
+- PostgreSQL (DB_ENGINE=postgresql): pool de conexiones de psycopg 3
+  (requiere `psycopg[pool]`) o, con DB_POOL_MAX_SIZE=0, conexiones persistentes.
+
+En ambos casos las conexiones reutilizadas se comprueban antes de usarse
+(CONN_HEALTH_CHECKS).
+
+Réplica de lectura opcional (alias "replica", ver SaludConectada/db_routing.py):
+DB_REPLICA_HOST/DB_REPLICA_PORT con PostgreSQL, o SQLITE_REPLICA_PATH con una
+copia local que refresca el comando `sync_local_replica`.
+"""
+import os
+from pathlib import Path
+
+SQLITE_BUSY_TIMEOUT_MS = 20_000
+SQLITE_MMAP_SIZE = 256 * 1024 * 1024
+SQLITE_CACHE_SIZE_KIB = 64 * 1024
+DB_CONN_MAX_AGE = 600
+DB_POOL_MIN_SIZE = 2
+DB_POOL_MAX_SIZE = 10
+DB_POOL_TIMEOUT = 10
+
+
+def _env_int(env, name, default):
+    value = env.get(name, "")
+    return int(value) if value else default
+
+
+def sqlite_init_command(
+    busy_timeout_ms=SQLITE_BUSY_TIMEOUT_MS,
+    mmap_size=SQLITE_MMAP_SIZE,
+    cache_size_kib=SQLITE_CACHE_SIZE_KIB,
+):
+    """
+    PRAGMAs que se ejecutan en cada conexión nueva. journal_mode es persistente
+    en el fichero; el resto es por conexión. cache_size negativo = KiB.
+    """
+    return ";".join((
+        "PRAGMA journal_mode=WAL",
+        f"PRAGMA busy_timeout={busy_timeout_ms}",
+        "PRAGMA synchronous=NORMAL",
+        f"PRAGMA mmap_size={mmap_size}",
+        f"PRAGMA cache_size=-{cache_size_kib}",
+        "PRAGMA temp_store=MEMORY",
+    ))
+
+
+def sqlite_database(path, env=None):
+    env = os.environ if env is None else env
+    return {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": path,
+        "CONN_MAX_AGE": _env_int(env, "DB_CONN_MAX_AGE", DB_CONN_MAX_AGE),
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": {
+            "init_command": sqlite_init_command(
+                busy_timeout_ms=_env_int(env, "SQLITE_BUSY_TIMEOUT_MS", SQLITE_BUSY_TIMEOUT_MS),
+                mmap_size=_env_int(env, "SQLITE_MMAP_SIZE", SQLITE_MMAP_SIZE),
+                cache_size_kib=_env_int(env, "SQLITE_CACHE_SIZE_KIB", SQLITE_CACHE_SIZE_KIB),
+            ),
+            # Tomar el bloqueo de escritura al empezar la transacción: con DEFERRED,
+            # una transacción que lee y luego escribe falla sin esperar a busy_timeout
+            "transaction_mode": "IMMEDIATE",
+        },
+    }
+
+
+def postgresql_database(env=None):
+    env = os.environ if env is None else env
+    pool_max_size = _env_int(env, "DB_POOL_MAX_SIZE", DB_POOL_MAX_SIZE)
+    database = {
+        "ENGINE": "django.db.backends.postgresql",
+        "NAME": env.get("DB_NAME", "saludconectada"),
+        "USER": env.get("DB_USER", ""),
+        "PASSWORD": env.get("DB_PASSWORD", ""),
+        "HOST": env.get("DB_HOST", ""),
+        "PORT": env.get("DB_PORT", ""),
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": {},
+    }
+    if pool_max_size:
+        # El pool gestiona la vida de las conexiones: Django exige CONN_MAX_AGE=0
+        database["CONN_MAX_AGE"] = 0
+        database["OPTIONS"]["pool"] = {
+            "min_size": min(_env_int(env, "DB_POOL_MIN_SIZE", DB_POOL_MIN_SIZE), pool_max_size),
+            "max_size": pool_max_size,
+            "timeout": _env_int(env, "DB_POOL_TIMEOUT", DB_POOL_TIMEOUT),
+        }
+    else:
+        database["CONN_MAX_AGE"] = _env_int(env, "DB_CONN_MAX_AGE", DB_CONN_MAX_AGE)
+    return database
+
+
+def replica_from_env(env=None):
+    """
+    Entrada `replica` de DATABASES, o None si no hay réplica configurada.
+    En los tests la réplica apunta a la base de tests principal (MIRROR).
+    """
+    env = os.environ if env is None else env
+    engine = env.get("DB_ENGINE", "sqlite").lower()
+    if engine in ("postgres", "postgresql"):
+        if not env.get("DB_REPLICA_HOST"):
+            return None
+        replica = postgresql_database(env)
+        replica["HOST"] = env["DB_REPLICA_HOST"]
+        replica["PORT"] = env.get("DB_REPLICA_PORT", replica["PORT"])
+    else:
+        if not env.get("SQLITE_REPLICA_PATH"):
+            return None
+        replica = sqlite_database(env["SQLITE_REPLICA_PATH"], env)
+    replica["TEST"] = {"MIRROR": "default"}
+    return replica
+
+
+def database_from_env(default_sqlite_path, env=None):
+    """
+    Entrada `default` de DATABASES según DB_ENGINE ("sqlite" o "postgresql").
+    """
+    env = os.environ if env is None else env
+    engine = env.get("DB_ENGINE", "sqlite").lower()
+    if engine in ("postgres", "postgresql"):
+        return postgresql_database(env)
+    if engine != "sqlite":
+        raise ValueError(f"DB_ENGINE no soportado: {engine}")
+    path = Path(env.get("SQLITE_PATH") or default_sqlite_path)
+    database = sqlite_database(path, env)
+    # Base de tests en un fichero y no en memoria: los tests con varios hilos
+    # (reservas simultáneas) necesitan WAL y busy_timeout, y la memoria compartida
+    # responde "database table is locked" sin esperar
+    database["TEST"] = {"NAME": str(path.with_name(f"test_{path.name}"))}
+    return database
@@ -0,0 +1,115 @@
+"""
+Enrutado de lecturas a la réplica (alias "replica", ver SaludConectada/database.py).
+
+Por defecto todo va a la base principal. Las lecturas se envían a la réplica
+solo dentro de `use_replica()` (vistas con `@replica_view`), y nunca:
+
+- dentro de `pin_primary()`: las rutas de escritura (reservar, cancelar,
+  recalcular métricas) leen lo que acaban de escribir, aunque las llame
+  código que optó por la réplica;
+- dentro de una transacción abierta en la base principal;
+- para las sesiones: una sesión recién creada aún no habría llegado a la réplica.
+
+Las escrituras van siempre a la base principal.
+"""
+from contextlib import ContextDecorator
+from contextvars import ContextVar
+from functools import wraps
+
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA_DB_ALIAS = "replica"
+PRIMARY_ONLY_APP_LABELS = {"sessions"}
+
+_REPLICA = "replica"
+_PRIMARY = "primary"
+_read_target = ContextVar("db_read_target", default=None)
+
+
+def replica_configured():
+    return REPLICA_DB_ALIAS in connections.settings
+
+
+class _ReadTarget(ContextDecorator):
+    target = None
+
+    def _recreate_cm(self):
+        # Como decorador, la misma instancia sirve a todas las llamadas (también
+        # desde varios hilos): cada llamada usa una nueva para guardar su token
+        return type(self)()
+
+    def __enter__(self):
+        current = _read_target.get()
+        # Una ruta fijada a la principal no se puede volver a soltar desde dentro
+        self._token = _read_target.set(_PRIMARY if current == _PRIMARY else self.target)
+        return self
+
+    def __exit__(self, *exc_info):
+        _read_target.reset(self._token)
+        return False
+
+
+class use_replica(_ReadTarget):
+    """
+    Envía las lecturas a la réplica (si hay una configurada).
+    Sirve como context manager y como decorador, también de `handle` en comandos.
+    """
+    target = _REPLICA
+
+
+class pin_primary(_ReadTarget):
+    """
+    Fija las lecturas a la base principal (lectura de las propias escrituras).
+    """
+    target = _PRIMARY
+
+
+def _iter_on_replica(iterable):
+    # Se entra y sale por cada trozo: el generador no debe dejar el contexto activo entre yields
+    iterator = iter(iterable)
+    while True:
+        with use_replica():
+            try:
+                chunk = next(iterator)
+            except StopIteration:
+                return
+        yield chunk
+
+
+def replica_view(view_func):
+    """
+    Decorador para vistas de solo lectura que toleran datos con algo de retraso.
+    Se coloca debajo de @role_required: el usuario y la sesión se resuelven en la
+    base principal. En respuestas en streaming, las lecturas que se hacen al
+    generar el contenido también van a la réplica.
+    """
+    @wraps(view_func)
+    def _wrapped_view(request, *args, **kwargs):
+        with use_replica():
+            response = view_func(request, *args, **kwargs)
+        if getattr(response, "streaming", False):
+            response.streaming_content = _iter_on_replica(response.streaming_content)
+        return response
+    return _wrapped_view
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _read_target.get() != _REPLICA or not replica_configured():
+            return None
+        if model._meta.app_label in PRIMARY_ONLY_APP_LABELS:
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return REPLICA_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Principal y réplica tienen los mismos datos
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # La réplica recibe el esquema por replicación (o sync_local_replica)
+        return db != REPLICA_DB_ALIAS
@@ -10,12 +10,20 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from dotenv import load_dotenv
+
+from .database import database_from_env, replica_from_env
+
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# Cargar variables desde .env antes de leer cualquier ajuste del entorno
+load_dotenv(BASE_DIR / ".env")
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
@@ -45,11 +53,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Primero, para medir la petición completa (latencia, consultas, tiempo SQL)
+    'dashboard.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    # Usuario autenticado desde la caché (accounts.user_cache); sin consulta por petición
+    'accounts.middleware.CachedAuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -76,14 +87,48 @@ WSGI_APPLICATION = 'SaludConectada.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
+# SQLite afinado (WAL, busy_timeout, conexiones persistentes) por defecto;
+# DB_ENGINE=postgresql con DB_NAME/DB_USER/DB_PASSWORD/DB_HOST/DB_PORT usa
+# PostgreSQL con pool de conexiones. Ver SaludConectada/database.py.
 
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': database_from_env(BASE_DIR / 'db.sqlite3'),
 }
 
+# Réplica de lectura opcional para paneles y reportes (SQLITE_REPLICA_PATH o
+# DB_REPLICA_HOST). Las vistas la usan con @replica_view; ver SaludConectada/db_routing.py
+_replica = replica_from_env()
+if _replica:
+    DATABASES['replica'] = _replica
+
+DATABASE_ROUTERS = ['SaludConectada.db_routing.ReplicaRouter']
+
+
+# Caché
+# Sesiones, usuario autenticado, agendas de los paneles y métricas. En memoria
+# de cada proceso por defecto; con CACHE_REDIS_URL (requiere `redis`) se comparte
+# entre procesos y las invalidaciones llegan a todos los workers.
+
+if os.environ.get("CACHE_REDIS_URL"):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ["CACHE_REDIS_URL"],
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'OPTIONS': {'MAX_ENTRIES': int(os.environ.get("CACHE_MAX_ENTRIES", "10000"))},
+        },
+    }
+
+# Sesiones: cached_db lee de la caché y escribe también en la base (sobreviven a
+# un reinicio). Con SESSION_ENGINE=django.contrib.sessions.backends.signed_cookies
+# van firmadas en la cookie, sin base ni caché.
+SESSION_ENGINE = os.environ.get("SESSION_ENGINE", "django.contrib.sessions.backends.cached_db")
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -138,11 +183,27 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = "accounts.User"
 
-import os
 DAILY_API_KEY = os.environ.get("DAILY_API_KEY", "")
 DAILY_DOMAIN = os.environ.get("DAILY_DOMAIN", "")  # ej: "saludconectada.daily.co"
-DAILY_API_BASE_URL = "https://api.daily.co/v1"
-
-from dotenv import load_dotenv
-# Cargar variables desde .env
-load_dotenv(BASE_DIR / ".env")
\ No newline at end of file
+DAILY_API_BASE_URL = os.environ.get("DAILY_API_BASE_URL", "https://api.daily.co/v1")
+DAILY_ROOM_PRIVACY = os.environ.get("DAILY_ROOM_PRIVACY", "public")  # "public" o "private"
+
+# Salas de Daily pre-creadas que el pool intenta mantener disponibles (0 lo desactiva)
+VIDEO_ROOM_POOL_SIZE = int(os.environ.get("VIDEO_ROOM_POOL_SIZE", "20"))
+
+# Índice de agenda en memoria (bitsets) para acelerar el cálculo de slots.
+# Activar con SCHEDULING_SCHEDULE_INDEX=1. Con varios procesos (gunicorn con
+# varios workers) requiere CACHE_REDIS_URL: los contadores de versión que lo
+# invalidan viven en la caché, y con la LocMemCache por proceso los demás
+# workers seguirían sirviendo slots ya reservados. Ver scheduling/schedule_index.py
+SCHEDULING_SCHEDULE_INDEX = os.environ.get("SCHEDULING_SCHEDULE_INDEX", "") == "1"
+
+# Métricas de peticiones por vista (panel "Supervisar uso del sistema").
+# Desactivar con REQUEST_METRICS_ENABLED=0
+REQUEST_METRICS_ENABLED = os.environ.get("REQUEST_METRICS_ENABLED", "1") == "1"
+REQUEST_METRICS_FLUSH_SECONDS = int(os.environ.get("REQUEST_METRICS_FLUSH_SECONDS", "60"))
+
+# Sincronización con el sistema de información de salud regional (vacío la desactiva)
+EXTERNAL_SYNC_URL = os.environ.get("EXTERNAL_SYNC_URL", "")
+EXTERNAL_SYNC_TOKEN = os.environ.get("EXTERNAL_SYNC_TOKEN", "")
+EXTERNAL_SYNC_CHUNK_SIZE = int(os.environ.get("EXTERNAL_SYNC_CHUNK_SIZE", "500"))
@@ -18,5 +18,11 @@ class User(AbstractUser):
         help_text="Rol del usuario en la plataforma",
     )
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # Listado y filtros por rol (gestión de usuarios, directorio de médicos)
+            models.Index(fields=["role", "id"], name="user_role_idx"),
+        ]
+
     def __str__(self):
         return f"{self.username} ({self.get_role_display()})"
@@ -0,0 +1,15 @@
+# accounts/signals.py
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import User
+from .user_cache import invalidate_cached_users
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, update_fields=None, **kwargs):
+    # El inicio de sesión solo toca last_login, que no se cachea
+    if update_fields and set(update_fields) <= {"last_login"}:
+        return
+    invalidate_cached_users(instance.pk)
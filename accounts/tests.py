@@ -1,3 +1,97 @@
-from django.test import TestCase
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
 
-# Create your tests here.
+from .models import User
+from .user_cache import get_user
+
+SIGNED_COOKIES = "django.contrib.sessions.backends.signed_cookies"
+
+
+@override_settings(REQUEST_METRICS_ENABLED=False)
+class CachedUserTests(TestCase):
+    """
+    Resolución cacheada del usuario autenticado (accounts.user_cache): las
+    páginas no consultan sesión ni usuario, y un cambio de rol, de contraseña
+    o la desactivación se aplican en la siguiente petición.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = cls._user("usercache_admin", User.Roles.ADMIN)
+        cls.patient = cls._user("usercache_patient", User.Roles.PATIENT)
+
+    @staticmethod
+    def _user(name, role):
+        return User.objects.create_user(
+            username=name, email=f"{name}@example.com", password="clave-de-prueba-1", role=role,
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.patient)
+        self.dashboard_url = reverse("dashboard:patient_dashboard")
+
+    def _commit(self, write):
+        # Las invalidaciones se aplican al confirmar la transacción
+        with self.captureOnCommitCallbacks(execute=True):
+            return write()
+
+    def _assert_warm_page(self):
+        self.client.get(self.dashboard_url)
+        # Ni sesión ni usuario; la agenda del panel también sale de la caché
+        with self.assertNumQueries(0):
+            response = self.client.get(self.dashboard_url)
+        self.assertEqual(response.status_code, 200)
+
+    def test_warm_page_runs_no_queries(self):
+        self._assert_warm_page()
+
+    @override_settings(SESSION_ENGINE=SIGNED_COOKIES)
+    def test_signed_cookie_sessions(self):
+        self.client.force_login(self.patient)
+        self._assert_warm_page()
+
+    def test_last_login_does_not_invalidate(self):
+        self.client.get(self.dashboard_url)
+        self._commit(lambda: self.patient.save(update_fields=["last_login"]))
+        with self.assertNumQueries(0):
+            self.client.get(self.dashboard_url)
+
+    def test_role_change_in_manage_users(self):
+        self.client.get(self.dashboard_url)
+        admin_client = self.client_class()
+        admin_client.force_login(self.admin)
+        response = self._commit(lambda: admin_client.post(
+            reverse("dashboard:manage_users"),
+            {"users": [self.patient.pk], "role": User.Roles.DOCTOR},
+        ))
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.client.get(self.dashboard_url).status_code, 403)
+        self.assertEqual(self.client.get(reverse("dashboard:doctor_dashboard")).status_code, 200)
+
+    def test_password_change_ends_old_sessions(self):
+        self.client.get(self.dashboard_url)
+        self.patient.set_password("clave-de-prueba-2")
+        self._commit(self.patient.save)
+        self.assertEqual(self.client.get(self.dashboard_url).status_code, 302)
+
+    def test_deactivated_user_is_logged_out(self):
+        self.client.get(self.dashboard_url)
+        self.patient.is_active = False
+        self._commit(self.patient.save)
+        self.assertEqual(self.client.get(self.dashboard_url).status_code, 302)
+
+    def test_save_keeps_deferred_fields(self):
+        self.client.get(self.dashboard_url)
+        request = RequestFactory().get("/")
+        request.session = self.client.session
+        cached = get_user(request)
+        self.assertIn("password", cached.get_deferred_fields())
+
+        cached.first_name = "Cacheado"
+        self._commit(cached.save)
+        password = self.patient.password
+        self.patient.refresh_from_db()
+        self.assertEqual(self.patient.first_name, "Cacheado")
+        self.assertEqual(self.patient.password, password)
@@ -0,0 +1,109 @@
+# accounts/user_cache.py
+"""
+Resolución cacheada del usuario autenticado.
+
+AuthenticationMiddleware carga la fila del usuario en cada petición, casi
+siempre solo para que role_required mire `user.role`. Aquí se guardan en la
+caché de Django los campos esenciales (USER_CACHE_FIELDS) y la huella de la
+contraseña (get_session_auth_hash), y con ellos se reconstruye un User cuyos
+demás campos quedan diferidos. Junto con una sesión cached_db o signed_cookies,
+una petición autenticada no consulta la base ni para la sesión ni para el usuario.
+
+- La entrada solo se usa si la huella coincide con la guardada en la sesión.
+  Si no (contraseña cambiada, entrada ausente), se resuelve por el camino de
+  django.contrib.auth, que cierra la sesión si ya no es válida, y se recachea.
+- Cada usuario tiene un contador de versión, como las agendas de los paneles:
+  las señales de User (ver signals.py) lo incrementan al confirmarse la
+  transacción, y los cambios con QuerySet.update() (cambio de rol masivo)
+  llaman a invalidate_cached_users() a mano.
+- Si una vista lee un campo diferido, se carga de la base; save() sobre la
+  instancia solo escribe los campos cargados.
+
+Con la caché en memoria de cada proceso, otros workers pueden servir la
+entrada anterior hasta USER_CACHE_TIMEOUT: con varios procesos, configurar
+una caché compartida (CACHE_REDIS_URL).
+"""
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.utils.crypto import constant_time_compare
+
+from .models import User
+
+USER_CACHE_FIELDS = (
+    "id", "username", "first_name", "last_name", "email", "role",
+    "is_active", "is_staff", "is_superuser",
+)
+USER_CACHE_TIMEOUT = 5 * 60
+
+# from_db() espera los valores en el orden de los campos del modelo
+_CACHED_ATTNAMES = [
+    field.attname for field in User._meta.concrete_fields if field.attname in USER_CACHE_FIELDS
+]
+
+_ENTRY_KEY = "accounts:user:{user_id}"
+_VERSION_KEY = "accounts:user:version:{user_id}"
+
+
+def _cached_user(entry, version, backend_path, session_hash):
+    if entry is None or entry["version"] != version:
+        return None
+    if backend_path not in settings.AUTHENTICATION_BACKENDS:
+        return None
+    if not session_hash or not constant_time_compare(session_hash, entry["session_hash"]):
+        return None
+    user = User.from_db(DEFAULT_DB_ALIAS, _CACHED_ATTNAMES, entry["values"])
+    user.backend = backend_path
+    return user
+
+
+def get_user(request):
+    """
+    Igual que django.contrib.auth.get_user, pero leyendo el usuario de la caché
+    cuando la entrada es válida para la sesión.
+    """
+    session = request.session
+    if SESSION_KEY not in session or BACKEND_SESSION_KEY not in session:
+        return auth.get_user(request)
+
+    user_id = User._meta.pk.to_python(session[SESSION_KEY])
+    entry_key = _ENTRY_KEY.format(user_id=user_id)
+    version_key = _VERSION_KEY.format(user_id=user_id)
+    cached = cache.get_many([entry_key, version_key])
+    version = cached.get(version_key, 0)
+    user = _cached_user(
+        cached.get(entry_key), version, session[BACKEND_SESSION_KEY], session.get(HASH_SESSION_KEY),
+    )
+    if user is not None:
+        return user
+
+    user = auth.get_user(request)
+    if user.is_authenticated and user.pk == user_id:
+        cache.set(entry_key, {
+            "version": version,
+            "values": [getattr(user, attname) for attname in _CACHED_ATTNAMES],
+            "session_hash": user.get_session_auth_hash(),
+        }, USER_CACHE_TIMEOUT)
+    return user
+
+
+def _bump(user_ids):
+    for user_id in user_ids:
+        key = _VERSION_KEY.format(user_id=user_id)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, timeout=None)
+    cache.delete_many([_ENTRY_KEY.format(user_id=user_id) for user_id in user_ids])
+
+
+def invalidate_cached_users(*user_ids):
+    """
+    Descarta el usuario cacheado de estos ids al confirmarse la transacción en
+    curso (o en el acto, fuera de una transacción).
+    """
+    user_ids = set(user_ids)
+    if user_ids:
+        transaction.on_commit(lambda: _bump(user_ids))
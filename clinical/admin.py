@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import MedicalRecord, Consultation
+from .models import ArchivedConsultation, MedicalRecord, Consultation
 
 
 @admin.register(MedicalRecord)
@@ -12,3 +12,9 @@ class ConsultationAdmin(admin.ModelAdmin):
     list_display = ("appointment", "created_at", "updated_at")
     search_fields = ("appointment__patient__username", "appointment__doctor__username")
 
+
+
+@admin.register(ArchivedConsultation)
+class ArchivedConsultationAdmin(admin.ModelAdmin):
+    list_display = ("appointment", "created_at", "archived_at")
+    search_fields = ("appointment__patient__username", "appointment__doctor__username")
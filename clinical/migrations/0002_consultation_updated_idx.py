@@ -0,0 +1,17 @@
+# Generated by Django 5.2.9 on 2026-10-18 12:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clinical', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='consultation',
+            index=models.Index(fields=['updated_at', 'id'], name='consultation_updated_idx'),
+        ),
+    ]
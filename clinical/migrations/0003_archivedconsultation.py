@@ -0,0 +1,32 @@
+# Generated by Django 5.2.9 on 2026-10-18 12:50
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clinical', '0002_consultation_updated_idx'),
+        ('scheduling', '0014_archivedappointment'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedConsultation',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('doctor_notes', models.TextField(blank=True, verbose_name='Notas del médico')),
+                ('recommendations', models.TextField(blank=True, verbose_name='Recomendaciones / tratamiento')),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Archivada')),
+                ('appointment', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='consultation', to='scheduling.archivedappointment')),
+            ],
+            options={
+                'verbose_name': 'Consulta archivada',
+                'verbose_name_plural': 'Consultas archivadas',
+            },
+        ),
+    ]
@@ -1,7 +1,8 @@
 from django.conf import settings
 from django.db import models
+from django.utils import timezone
 
-from scheduling.models import Appointment  # vínculo con citas
+from scheduling.models import Appointment, ArchivedAppointment  # vínculo con citas
 
 
 User = settings.AUTH_USER_MODEL
@@ -37,6 +38,36 @@ class Consultation(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Cursor de cambios de la sincronización externa (dashboard.external_sync)
+            models.Index(fields=["updated_at", "id"], name="consultation_updated_idx"),
+        ]
+
     def __str__(self):
         return f"Consulta para cita {self.appointment_id}"
 
+
+
+class ArchivedConsultation(models.Model):
+    """
+    Consulta de una cita archivada (ver scheduling.archive). Conserva el id original.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    appointment = models.OneToOneField(
+        ArchivedAppointment,
+        on_delete=models.CASCADE,
+        related_name="consultation",
+    )
+    doctor_notes = models.TextField("Notas del médico", blank=True)
+    recommendations = models.TextField("Recomendaciones / tratamiento", blank=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField("Archivada", default=timezone.now)
+
+    class Meta:
+        verbose_name = "Consulta archivada"
+        verbose_name_plural = "Consultas archivadas"
+
+    def __str__(self):
+        return f"Consulta archivada para cita {self.appointment_id}"
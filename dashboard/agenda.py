@@ -0,0 +1,163 @@
+# dashboard/agenda.py
+"""
+Agenda cacheada de los paneles de paciente y médico.
+
+Cada usuario tiene en la caché de Django una entrada con sus próximas citas
+(y, para pacientes, el resumen de la última consulta) como datos planos: los
+nombres ya resueltos, sin instancias del ORM. Con la caché caliente el panel
+no hace ninguna consulta para pintar la agenda.
+
+Coherencia: igual que el índice de agenda de scheduling, cada usuario tiene
+un contador de versión. Las señales de Appointment y Consultation
+(ver signals.py) lo incrementan para el paciente y el médico afectados al
+confirmarse la transacción, y borran su entrada. Una entrada guardada con otra
+versión se descarta, así que un panel que se calculó a la vez que una reserva
+no deja una agenda vieja en la caché.
+
+Las escrituras que no pasan por save()/delete() (QuerySet.update,
+bulk_create) deben llamar a invalidate_agendas() a mano, salvo las que solo
+tocan la videollamada, que el panel no muestra. El nombre del otro
+participante de cada cita puede quedar desfasado hasta AGENDA_TIMEOUT.
+"""
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from django.core.cache import cache
+from django.db import transaction
+
+from clinical.models import ArchivedConsultation, Consultation
+from scheduling.models import UPCOMING_APPOINTMENT_STATUSES, Appointment
+
+PATIENT_AGENDA_SIZE = 5
+DOCTOR_AGENDA_SIZE = 10
+AGENDA_TIMEOUT = 15 * 60
+
+# Campos de Appointment que el panel no muestra: guardarlos no invalida la agenda
+AGENDA_IGNORED_FIELDS = {"video_call_url", "video_room_lock_until", "updated_at"}
+
+_ENTRY_KEY = "dashboard:agenda:{kind}:{user_id}"
+_VERSION_KEY = "dashboard:agenda:version:{user_id}"
+_KINDS = ("patient", "doctor")
+
+
+@dataclass
+class AgendaAppointment:
+    id: int
+    scheduled_datetime: datetime
+    status: str
+    doctor: str
+    patient: str
+
+    def get_status_display(self):
+        return Appointment.Status(self.status).label
+
+
+@dataclass
+class ConsultationSummary:
+    appointment_id: int
+    created_at: datetime
+    doctor_notes: str
+    recommendations: str
+
+
+@dataclass
+class Agenda:
+    upcoming: list = field(default_factory=list)
+    last_consultation: ConsultationSummary | None = None
+
+
+def _upcoming(**filters):
+    return (
+        Appointment.objects
+        .filter(status__in=UPCOMING_APPOINTMENT_STATUSES, **filters)
+        .select_related("doctor", "patient")
+        .order_by("scheduled_datetime")
+    )
+
+
+def _summaries(appointments):
+    return [
+        AgendaAppointment(
+            id=appointment.id,
+            scheduled_datetime=appointment.scheduled_datetime,
+            status=appointment.status,
+            doctor=str(appointment.doctor),
+            patient=str(appointment.patient),
+        )
+        for appointment in appointments
+    ]
+
+
+def _last_consultation(patient_id):
+    """
+    Última consulta del paciente; si todas están archivadas, la más reciente del archivo.
+    """
+    fields = ("appointment_id", "created_at", "doctor_notes", "recommendations")
+    for model in (Consultation, ArchivedConsultation):
+        row = (
+            model.objects
+            .filter(appointment__patient_id=patient_id)
+            .order_by("-created_at")
+            .values(*fields)
+            .first()
+        )
+        if row is not None:
+            return ConsultationSummary(**row)
+    return None
+
+
+def build_patient_agenda(patient_id):
+    return Agenda(
+        upcoming=_summaries(_upcoming(patient_id=patient_id)[:PATIENT_AGENDA_SIZE]),
+        last_consultation=_last_consultation(patient_id),
+    )
+
+
+def build_doctor_agenda(doctor_id):
+    return Agenda(upcoming=_summaries(_upcoming(doctor_id=doctor_id)[:DOCTOR_AGENDA_SIZE]))
+
+
+def _cached_agenda(kind, user_id, build):
+    entry_key = _ENTRY_KEY.format(kind=kind, user_id=user_id)
+    version_key = _VERSION_KEY.format(user_id=user_id)
+    cached = cache.get_many([entry_key, version_key])
+    version = cached.get(version_key, 0)
+    entry = cached.get(entry_key)
+    if entry is not None and entry[0] == version:
+        return entry[1]
+    agenda = build(user_id)
+    cache.set(entry_key, (version, agenda), AGENDA_TIMEOUT)
+    return agenda
+
+
+def get_patient_agenda(user):
+    return _cached_agenda("patient", user.pk, build_patient_agenda)
+
+
+def get_doctor_agenda(user):
+    return _cached_agenda("doctor", user.pk, build_doctor_agenda)
+
+
+def _bump(user_ids):
+    for user_id in user_ids:
+        key = _VERSION_KEY.format(user_id=user_id)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, timeout=None)
+    cache.delete_many([
+        _ENTRY_KEY.format(kind=kind, user_id=user_id)
+        for user_id in user_ids
+        for kind in _KINDS
+    ])
+
+
+def invalidate_agendas(*user_ids):
+    """
+    Invalida la agenda de estos usuarios cuando se confirme la transacción en
+    curso (o en el acto, fuera de una transacción): así nadie puede recalcularla
+    con los datos anteriores después de invalidarla.
+    """
+    user_ids = {user_id for user_id in user_ids if user_id is not None}
+    if user_ids:
+        transaction.on_commit(lambda: _bump(user_ids))
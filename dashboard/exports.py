@@ -0,0 +1,262 @@
+# dashboard/exports.py
+"""
+Exportación de citas en CSV y XLSX en streaming.
+
+Las filas se leen con `iterator()` por bloques y se escriben según se generan,
+así la memoria no depende del número de citas exportadas. El XLSX se genera
+sin dependencias: es un ZIP escrito sobre un buffer que se vacía en cada bloque
+(zipfile admite destinos no "seekables") con las celdas como texto en línea.
+
+Los reportes incluyen las citas archivadas (scheduling.archive): cada tabla se
+recorre en orden por su índice y las filas se mezclan al vuelo.
+"""
+import csv
+import io
+import re
+import zipfile
+from datetime import datetime, time, timedelta
+from itertools import islice
+from xml.sax.saxutils import escape
+
+from django.utils import timezone
+
+from scheduling.archive import merge_by_schedule
+from scheduling.models import Appointment, ArchivedAppointment
+
+EXPORT_CHUNK_SIZE = 2000
+
+EXPORT_HEADER = (
+    "ID",
+    "Fecha y hora",
+    "Paciente",
+    "Email paciente",
+    "Médico",
+    "Estado",
+    "Motivo",
+    "Creada",
+    "Cancelada",
+)
+
+# Excel y LibreOffice evalúan como fórmula una celda que empieza por estos caracteres
+CSV_FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+
+def filtered_appointments(filters, model=Appointment):
+    """
+    Citas (o citas archivadas, según `model`) que cumplen los filtros de
+    ReportFilterForm (cleaned_data). Las fechas son días locales completos.
+    """
+    queryset = model.objects.all()
+    tz = timezone.get_current_timezone()
+    if filters.get("date_from"):
+        queryset = queryset.filter(
+            scheduled_datetime__gte=timezone.make_aware(datetime.combine(filters["date_from"], time.min), tz)
+        )
+    if filters.get("date_to"):
+        next_day = filters["date_to"] + timedelta(days=1)
+        queryset = queryset.filter(
+            scheduled_datetime__lt=timezone.make_aware(datetime.combine(next_day, time.min), tz)
+        )
+    if filters.get("doctor"):
+        queryset = queryset.filter(doctor=filters["doctor"])
+    if filters.get("status"):
+        queryset = queryset.filter(status=filters["status"])
+    return queryset
+
+
+def filtered_appointment_sources(filters):
+    """
+    [citas vivas, citas archivadas] que cumplen los filtros.
+    """
+    return [filtered_appointments(filters, model) for model in (Appointment, ArchivedAppointment)]
+
+
+def latest_appointments(filters, limit):
+    """
+    Las `limit` citas más recientes que cumplen los filtros, vivas o archivadas.
+    """
+    sources = [
+        list(
+            queryset
+            .select_related("patient", "doctor")
+            .order_by("-scheduled_datetime", "-id")[:limit]
+        )
+        for queryset in filtered_appointment_sources(filters)
+    ]
+    return list(islice(merge_by_schedule(sources, descending=True), limit))
+
+
+def _format_datetime(value):
+    return timezone.localtime(value).strftime("%Y-%m-%d %H:%M") if value else ""
+
+
+def export_rows(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Genera una tupla por cita, leyendo la base de datos por bloques.
+    `queryset` puede ser una lista de querysets (ver filtered_appointment_sources).
+    """
+    sources = queryset if isinstance(queryset, (list, tuple)) else [queryset]
+    appointments = merge_by_schedule(
+        source
+        .select_related("patient", "doctor")
+        .only(
+            "id", "scheduled_datetime", "status", "reason", "created_at", "canceled_at",
+            "patient__username", "patient__first_name", "patient__last_name", "patient__email",
+            "doctor__username", "doctor__first_name", "doctor__last_name",
+        )
+        .order_by("scheduled_datetime", "id")
+        .iterator(chunk_size=chunk_size)
+        for source in sources
+    )
+    for appt in appointments:
+        yield (
+            appt.pk,
+            _format_datetime(appt.scheduled_datetime),
+            appt.patient.get_full_name() or appt.patient.username,
+            appt.patient.email,
+            appt.doctor.get_full_name() or appt.doctor.username,
+            appt.get_status_display(),
+            appt.reason,
+            _format_datetime(appt.created_at),
+            _format_datetime(appt.canceled_at),
+        )
+
+
+class _Echo:
+    """
+    Pseudo-buffer para csv.writer: devuelve la línea en vez de guardarla.
+    """
+
+    def write(self, value):
+        return value
+
+
+def _csv_cell(value):
+    """
+    Neutraliza texto introducido por usuarios (motivo, nombres) que se abriría
+    como fórmula: con un apóstrofo delante la hoja de cálculo lo muestra como texto.
+    """
+    if isinstance(value, str) and value.startswith(CSV_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def stream_csv(rows, header=EXPORT_HEADER):
+    writer = csv.writer(_Echo())
+    # BOM para que Excel detecte UTF-8 (acentos)
+    yield "\ufeff" + writer.writerow(header)
+    for row in rows:
+        yield writer.writerow([_csv_cell(value) for value in row])
+
+
+class _ChunkBuffer(io.RawIOBase):
+    """
+    Destino no "seekable" del ZIP: acumula lo escrito hasta que se vacía.
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+_XLSX_STATIC_PARTS = (
+    (
+        "[Content_Types].xml",
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>',
+    ),
+    (
+        "_rels/.rels",
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>',
+    ),
+    (
+        "xl/workbook.xml",
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Citas" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>',
+    ),
+    (
+        "xl/_rels/workbook.xml.rels",
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '</Relationships>',
+    ),
+)
+
+_SHEET_HEAD = (
+    b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+_SHEET_TAIL = b"</sheetData></worksheet>"
+
+# Caracteres de control que XML 1.0 no admite
+_ILLEGAL_XML_CHARS = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+
+def _xlsx_cell(value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return f"<c><v>{value}</v></c>"
+    text = escape(_ILLEGAL_XML_CHARS.sub("", str(value)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def _xlsx_row(values):
+    return ("<row>" + "".join(_xlsx_cell(value) for value in values) + "</row>").encode()
+
+
+def stream_xlsx(rows, header=EXPORT_HEADER, flush_every=500):
+    buffer = _ChunkBuffer()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, content in _XLSX_STATIC_PARTS:
+            archive.writestr(name, content)
+        yield buffer.drain()
+
+        with archive.open("xl/worksheets/sheet1.xml", "w", force_zip64=True) as sheet:
+            sheet.write(_SHEET_HEAD)
+            sheet.write(_xlsx_row(header))
+            for count, row in enumerate(rows, start=1):
+                sheet.write(_xlsx_row(row))
+                if count % flush_every == 0:
+                    data = buffer.drain()
+                    if data:
+                        yield data
+            sheet.write(_SHEET_TAIL)
+    yield buffer.drain()
+
+
+EXPORT_FORMATS = {
+    "csv": (stream_csv, "text/csv; charset=utf-8", "csv"),
+    "xlsx": (
+        stream_xlsx,
+        "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        "xlsx",
+    ),
+}
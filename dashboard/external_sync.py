@@ -0,0 +1,322 @@
+# dashboard/external_sync.py
+"""
+Sincronización de citas y consultas con el sistema de información de salud regional.
+
+- Cada entidad tiene un cursor (SyncCursor) con el último (updated_at, id)
+  confirmado; en cada ejecución solo se leen las filas posteriores, en orden
+  y por tandas, recorriendo el índice (updated_at, id).
+- Cada tanda se envía como un POST con JSON comprimido en gzip a
+  EXTERNAL_SYNC_URL/<entidad>/bulk, con una Idempotency-Key derivada del rango
+  de cursores para que el receptor pueda descartar reenvíos.
+- El cursor avanza solo cuando el sistema externo confirma la tanda: si la
+  ejecución falla, la siguiente continúa desde el último lote confirmado.
+- Solo se leen filas con updated_at anterior a ahora - EXTERNAL_SYNC_SETTLE_SECONDS,
+  para no saltarse transacciones que aún no habían confirmado al avanzar el cursor.
+
+Las ejecuciones se solicitan desde el panel (SyncRun pendiente) y las procesa
+el worker `run_external_sync`. Para pruebas hay un receptor falso en
+dashboard.fake_his (comando `fake_his_server`).
+
+Solo se sincronizan campos que cambian con save() (y por tanto con updated_at):
+las actualizaciones masivas de la sala de videollamada no forman parte del envío.
+"""
+import gzip
+import json
+import logging
+import random
+import time
+from datetime import timedelta
+
+import requests
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from requests.adapters import HTTPAdapter
+
+from clinical.models import Consultation
+from scheduling.models import Appointment
+
+from .models import SyncCursor, SyncRun
+
+logger = logging.getLogger(__name__)
+
+EXTERNAL_SYNC_CHUNK_SIZE = 500
+EXTERNAL_SYNC_SETTLE_SECONDS = 10
+# (conexión, lectura) en segundos
+EXTERNAL_SYNC_TIMEOUT = (3.05, 30)
+EXTERNAL_SYNC_MAX_RETRIES = 3
+EXTERNAL_SYNC_RETRY_BASE_SECONDS = 0.5
+# Sin latido durante este tiempo, una ejecución en curso se da por interrumpida
+EXTERNAL_SYNC_STALE_SECONDS = 300
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# Entidad -> (modelo, campos enviados)
+ENTITIES = {
+    "appointments": (
+        Appointment,
+        (
+            "id", "patient_id", "doctor_id", "scheduled_datetime", "reason",
+            "status", "created_at", "canceled_at", "updated_at",
+        ),
+    ),
+    "consultations": (
+        Consultation,
+        ("id", "appointment_id", "doctor_notes", "recommendations", "created_at", "updated_at"),
+    ),
+}
+ENTITY_LABELS = {
+    "appointments": "Citas",
+    "consultations": "Consultas",
+}
+
+
+class SyncError(Exception):
+    """
+    El sistema externo no aceptó una tanda; el cursor no avanzó.
+    """
+
+
+def get_chunk_size():
+    return getattr(settings, "EXTERNAL_SYNC_CHUNK_SIZE", EXTERNAL_SYNC_CHUNK_SIZE)
+
+
+def is_configured():
+    return bool(getattr(settings, "EXTERNAL_SYNC_URL", ""))
+
+
+class SyncClient:
+    """
+    Sesión HTTP con keep-alive para enviar las tandas, con reintentos y backoff
+    para errores de red y respuestas 429/5xx.
+    """
+
+    def __init__(self):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=1, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def send(self, entity, body, idempotency_key):
+        url = f"{settings.EXTERNAL_SYNC_URL.rstrip('/')}/{entity}/bulk"
+        headers = {
+            "Authorization": f"Bearer {getattr(settings, 'EXTERNAL_SYNC_TOKEN', '')}",
+            "Content-Type": "application/json",
+            "Content-Encoding": "gzip",
+            "Idempotency-Key": idempotency_key,
+        }
+        attempts = 1 + EXTERNAL_SYNC_MAX_RETRIES
+        for attempt in range(attempts):
+            try:
+                response = self.session.post(
+                    url, data=body, headers=headers, timeout=EXTERNAL_SYNC_TIMEOUT,
+                )
+            except requests.RequestException as exc:
+                error = f"{exc.__class__.__name__}: {exc}"
+            else:
+                if response.status_code < 300:
+                    return
+                error = f"HTTP {response.status_code}: {response.text[:200]}"
+                if response.status_code not in RETRYABLE_STATUS_CODES:
+                    break
+            if attempt + 1 < attempts:
+                # Backoff exponencial con jitter completo
+                time.sleep(random.uniform(0, EXTERNAL_SYNC_RETRY_BASE_SECONDS * (2 ** attempt)))
+        raise SyncError(f"{entity}: {error}")
+
+    def close(self):
+        self.session.close()
+
+
+def _changed_rows(entity, cursor, until):
+    model, fields = ENTITIES[entity]
+    queryset = model.objects.filter(updated_at__lt=until)
+    if cursor.last_updated_at is not None:
+        queryset = queryset.filter(
+            Q(updated_at__gt=cursor.last_updated_at)
+            | Q(updated_at=cursor.last_updated_at, id__gt=cursor.last_id)
+        )
+    return queryset.order_by("updated_at", "id").values(*fields)
+
+
+def _cursors():
+    existing = {cursor.entity: cursor for cursor in SyncCursor.objects.all()}
+    return [
+        existing.get(entity) or SyncCursor.objects.create(entity=entity)
+        for entity in ENTITIES
+    ]
+
+
+def _settled_until(settle_seconds):
+    return timezone.now() - timedelta(seconds=settle_seconds)
+
+
+def build_payload(entity, rows):
+    """
+    Devuelve (cuerpo sin comprimir, cuerpo gzip) de una tanda.
+    """
+    raw = json.dumps({"entity": entity, "records": rows}, cls=DjangoJSONEncoder).encode()
+    return raw, gzip.compress(raw, compresslevel=6)
+
+
+def _idempotency_key(entity, rows):
+    first, last = rows[0], rows[-1]
+    return (
+        f"{entity}:{first['updated_at'].isoformat()}:{first['id']}"
+        f"-{last['updated_at'].isoformat()}:{last['id']}"
+    )
+
+
+def sync_entity(client, run, cursor, until, chunk_size):
+    """
+    Envía todas las filas pendientes de una entidad, tanda por tanda.
+    Lanza SyncError si una tanda no se confirma (el cursor queda en la anterior).
+    """
+    while True:
+        rows = list(_changed_rows(cursor.entity, cursor, until)[:chunk_size])
+        if not rows:
+            return
+        raw, body = build_payload(cursor.entity, rows)
+        client.send(cursor.entity, body, _idempotency_key(cursor.entity, rows))
+
+        last = rows[-1]
+        now = timezone.now()
+        cursor.last_updated_at = last["updated_at"]
+        cursor.last_id = last["id"]
+        cursor.last_synced_at = now
+        with transaction.atomic():
+            cursor.save(update_fields=["last_updated_at", "last_id", "last_synced_at"])
+            SyncRun.objects.filter(pk=run.pk).update(
+                records_sent=F("records_sent") + len(rows),
+                chunks_sent=F("chunks_sent") + 1,
+                bytes_raw=F("bytes_raw") + len(raw),
+                bytes_sent=F("bytes_sent") + len(body),
+                heartbeat_at=now,
+            )
+        if len(rows) < chunk_size:
+            return
+
+
+def pending_counts(until=None, cursors=None):
+    """
+    {entidad: filas pendientes de enviar} según los cursores actuales.
+    """
+    until = until or _settled_until(EXTERNAL_SYNC_SETTLE_SECONDS)
+    return {
+        cursor.entity: _changed_rows(cursor.entity, cursor, until).count()
+        for cursor in cursors or _cursors()
+    }
+
+
+def request_sync(user=None):
+    """
+    Solicita una ejecución (la procesa el worker). Si ya hay una pendiente o
+    en curso, la devuelve en lugar de crear otra. Devuelve (run, creada).
+    """
+    active = SyncRun.objects.filter(
+        status__in=[SyncRun.Status.PENDING, SyncRun.Status.RUNNING]
+    ).order_by("created_at").first()
+    if active is not None:
+        return active, False
+    return SyncRun.objects.create(requested_by=user), True
+
+
+def _mark_stale_runs(now):
+    SyncRun.objects.filter(
+        status=SyncRun.Status.RUNNING,
+        heartbeat_at__lt=now - timedelta(seconds=EXTERNAL_SYNC_STALE_SECONDS),
+    ).update(
+        status=SyncRun.Status.FAILED,
+        finished_at=now,
+        last_error="Ejecución interrumpida (sin latido del worker).",
+    )
+
+
+def claim_run(create=False):
+    """
+    Toma la ejecución pendiente más antigua con un UPDATE condicional
+    (PENDING -> RUNNING). Con `create`, si no hay ninguna pendiente crea una
+    (ejecución programada). Devuelve None si otra ejecución sigue activa.
+    """
+    now = timezone.now()
+    _mark_stale_runs(now)
+    if SyncRun.objects.filter(status=SyncRun.Status.RUNNING).exists():
+        return None
+
+    pending = SyncRun.objects.filter(status=SyncRun.Status.PENDING).order_by("created_at").first()
+    if pending is None:
+        if not create:
+            return None
+        pending = SyncRun.objects.create()
+    claimed = SyncRun.objects.filter(pk=pending.pk, status=SyncRun.Status.PENDING).update(
+        status=SyncRun.Status.RUNNING, started_at=now, heartbeat_at=now,
+    )
+    if not claimed:
+        return None
+    pending.refresh_from_db()
+    return pending
+
+
+def run_sync(run, settle_seconds=EXTERNAL_SYNC_SETTLE_SECONDS, chunk_size=None):
+    """
+    Ejecuta una sincronización ya reclamada y deja su resultado en `run`.
+    """
+    chunk_size = chunk_size or get_chunk_size()
+    until = _settled_until(settle_seconds)
+    cursors = _cursors()
+    run.total_pending = sum(pending_counts(until, cursors).values())
+    run.save(update_fields=["total_pending"])
+
+    error = ""
+    if not is_configured():
+        error = "EXTERNAL_SYNC_URL no está configurada."
+    else:
+        client = SyncClient()
+        try:
+            for cursor in cursors:
+                sync_entity(client, run, cursor, until, chunk_size)
+        except SyncError as exc:
+            error = str(exc)
+        except Exception as exc:
+            # Un fallo inesperado (base de datos, datos no serializables...) tampoco
+            # debe dejar la ejecución en curso hasta que caduque su latido
+            logger.exception("Falló la sincronización externa %s.", run.pk)
+            error = f"{exc.__class__.__name__}: {exc}"
+        finally:
+            client.close()
+
+    run.refresh_from_db()
+    run.status = SyncRun.Status.FAILED if error else SyncRun.Status.SUCCEEDED
+    run.last_error = error
+    run.finished_at = timezone.now()
+    run.save(update_fields=["status", "last_error", "finished_at"])
+    return run
+
+
+def get_sync_overview(recent_runs=10):
+    """
+    Datos del panel: cursores con su pendiente, ejecución activa y últimas ejecuciones.
+    """
+    cursors = _cursors()
+    pending = pending_counts(cursors=cursors)
+    runs = list(SyncRun.objects.select_related("requested_by")[:recent_runs])
+    return {
+        "configured": is_configured(),
+        "endpoint": getattr(settings, "EXTERNAL_SYNC_URL", ""),
+        "cursors": [
+            {
+                "entity": cursor.entity,
+                "label": ENTITY_LABELS[cursor.entity],
+                "cursor": cursor,
+                "pending": pending[cursor.entity],
+            }
+            for cursor in cursors
+        ],
+        "active_run": next(
+            (run for run in runs if run.status in (SyncRun.Status.PENDING, SyncRun.Status.RUNNING)),
+            None,
+        ),
+        "runs": runs,
+    }
@@ -0,0 +1,114 @@
+# dashboard/fake_his.py
+"""
+Servidor HTTP local que hace de sistema de información de salud regional
+para probar la sincronización externa sin red:
+
+    python manage.py fake_his_server --port 8766
+    EXTERNAL_SYNC_URL=http://127.0.0.1:8766/api EXTERNAL_SYNC_TOKEN=fake ...
+
+Acepta POST /api/<entidad>/bulk con JSON (opcionalmente gzip), guarda la última
+versión de cada registro y cuenta los reenvíos por Idempotency-Key.
+También se puede levantar en un hilo desde código con FakeHealthRecordServer().
+"""
+import gzip
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeHealthRecordServer:
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, failure_rate=0.0):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        # {entidad: {id: registro}}
+        self.records = {}
+        self.request_count = 0
+        self.accepted_batches = 0
+        self.duplicate_batches = 0
+        self.bytes_received = 0
+        self._idempotency_keys = set()
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/api"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self._httpd.serve_forever()
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status, body):
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length)
+                with server._lock:
+                    server.request_count += 1
+                    server.bytes_received += len(raw)
+                if server.latency:
+                    time.sleep(server.latency)
+                if not self.headers.get("Authorization", "").startswith("Bearer "):
+                    return self._send(401, {"error": "authentication-error"})
+                if server.failure_rate and random.random() < server.failure_rate:
+                    return self._send(503, {"error": "service-unavailable"})
+
+                parts = self.path.strip("/").split("/")
+                if len(parts) != 3 or parts[0] != "api" or parts[2] != "bulk":
+                    return self._send(404, {"error": "not-found"})
+                entity = parts[1]
+                try:
+                    if self.headers.get("Content-Encoding") == "gzip":
+                        raw = gzip.decompress(raw)
+                    records = json.loads(raw)["records"]
+                except (OSError, ValueError, KeyError):
+                    return self._send(400, {"error": "invalid-payload"})
+
+                key = self.headers.get("Idempotency-Key")
+                with server._lock:
+                    if key and key in server._idempotency_keys:
+                        server.duplicate_batches += 1
+                        return self._send(200, {"accepted": 0, "duplicate": True})
+                    if key:
+                        server._idempotency_keys.add(key)
+                    stored = server.records.setdefault(entity, {})
+                    for record in records:
+                        stored[record["id"]] = record
+                    server.accepted_batches += 1
+                self._send(200, {"accepted": len(records)})
+
+        return Handler
@@ -1,5 +1,6 @@
 from django import forms
 from accounts.models import User
+from scheduling.models import Appointment
 
 
 class UserRoleForm(forms.ModelForm):
@@ -7,3 +8,67 @@ class UserRoleForm(forms.ModelForm):
         model = User
         fields = ("role",)
         labels = {"role": "Rol"}
+
+
+class UserSearchForm(forms.Form):
+    """
+    Búsqueda en la gestión de usuarios: prefijo de usuario o correo y rol.
+    """
+    q = forms.CharField(
+        label="Buscar",
+        required=False,
+        max_length=150,
+        widget=forms.TextInput(attrs={"placeholder": "Usuario o correo (empieza por…)"}),
+    )
+    role = forms.ChoiceField(
+        label="Rol",
+        required=False,
+        choices=[("", "Todos")] + list(User.Roles.choices),
+    )
+
+
+class BulkRoleChangeForm(forms.Form):
+    """
+    Cambio de rol de uno o varios usuarios (la fila individual envía un solo id).
+    """
+    users = forms.ModelMultipleChoiceField(
+        queryset=User.objects.all(),
+        widget=forms.MultipleHiddenInput,
+        error_messages={"required": "Selecciona al menos un usuario."},
+    )
+    role = forms.ChoiceField(label="Nuevo rol", choices=User.Roles.choices)
+
+
+class ReportFilterForm(forms.Form):
+    """
+    Filtros del reporte de citas (pantalla y exportación).
+    """
+    date_from = forms.DateField(
+        label="Desde",
+        required=False,
+        widget=forms.DateInput(attrs={"type": "date"}),
+    )
+    date_to = forms.DateField(
+        label="Hasta",
+        required=False,
+        widget=forms.DateInput(attrs={"type": "date"}),
+    )
+    doctor = forms.ModelChoiceField(
+        queryset=User.objects.filter(role=User.Roles.DOCTOR).order_by("username"),
+        label="Médico",
+        required=False,
+        empty_label="Todos",
+    )
+    status = forms.ChoiceField(
+        label="Estado",
+        required=False,
+        choices=[("", "Todos")] + list(Appointment.Status.choices),
+    )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        date_from = cleaned_data.get("date_from")
+        date_to = cleaned_data.get("date_to")
+        if date_from and date_to and date_from > date_to:
+            raise forms.ValidationError("La fecha inicial no puede ser posterior a la final.")
+        return cleaned_data
@@ -0,0 +1,232 @@
+import random
+import shutil
+import statistics
+import tempfile
+import threading
+import time as time_module
+from collections import Counter
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import (
+    IntegrityError,
+    OperationalError,
+    close_old_connections,
+    connections,
+    transaction,
+)
+from django.utils import timezone
+
+from accounts.models import User
+from SaludConectada.database import sqlite_database
+from scheduling.models import APPOINTMENT_SLOT_DELTA, Appointment
+
+BENCH_ALIAS_PREFIX = "bench_db_"
+BENCH_DOCTORS = 50
+BENCH_PATIENTS = 500
+# Slots posibles por médico: suficientes para que los choques sean raros
+BENCH_SLOTS_PER_DOCTOR = 20_000
+
+# Perfil sin afinar: lo que Django usa con solo ENGINE y NAME
+# (journal por rollback, synchronous=FULL, transacciones DEFERRED,
+# busy timeout de 5 s y una conexión nueva por petición)
+BASELINE_PROFILE = {"ENGINE": "django.db.backends.sqlite3"}
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara escrituras concurrentes (reservas) por segundo entre SQLite sin "
+        "afinar y el perfil de settings (WAL, busy_timeout, conexiones persistentes) "
+        "sobre una base de datos temporal."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=8)
+        parser.add_argument("--seconds", type=float, default=5.0, help="Duración de cada perfil.")
+        parser.add_argument(
+            "--profiles",
+            default="baseline,tuned",
+            help="Perfiles a medir, separados por comas (baseline, tuned).",
+        )
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        profiles = [name for name in options["profiles"].split(",") if name]
+        unknown = set(profiles) - {"baseline", "tuned"}
+        if unknown:
+            raise CommandError(f"Perfiles desconocidos: {', '.join(sorted(unknown))}")
+
+        workdir = Path(tempfile.mkdtemp(prefix="saludconectada-bench-"))
+        results = {}
+        try:
+            for profile in profiles:
+                alias = f"{BENCH_ALIAS_PREFIX}{profile}"
+                self._register(alias, self._profile_settings(profile, workdir / f"{profile}.sqlite3"))
+                try:
+                    doctor_ids, patient_ids = self._setup(alias)
+                    self.stdout.write(f"{profile}: {self._pragmas(alias)}")
+                    results[profile] = self._run(alias, doctor_ids, patient_ids, options)
+                finally:
+                    connections[alias].close()
+                    self._unregister(alias)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+        self._report(results)
+
+    # --- Perfiles ------------------------------------------------------------
+
+    def _profile_settings(self, profile, path):
+        if profile == "baseline":
+            return {**BASELINE_PROFILE, "NAME": path}
+        default = settings.DATABASES["default"]
+        if default["ENGINE"] == "django.db.backends.sqlite3":
+            return {**default, "NAME": path}
+        # Con PostgreSQL en settings se mide el perfil SQLite afinado por defecto
+        return sqlite_database(path)
+
+    def _register(self, alias, database):
+        configured = connections.configure_settings({"default": settings.DATABASES["default"], alias: database})
+        connections.settings[alias] = configured[alias]
+
+    def _unregister(self, alias):
+        connections.settings.pop(alias, None)
+        if hasattr(connections._connections, alias):
+            delattr(connections._connections, alias)
+
+    def _pragmas(self, alias):
+        with connections[alias].cursor() as cursor:
+            values = {}
+            for pragma in ("journal_mode", "synchronous", "busy_timeout"):
+                cursor.execute(f"PRAGMA {pragma}")
+                values[pragma] = cursor.fetchone()[0]
+        return ", ".join(f"{name}={value}" for name, value in values.items())
+
+    # --- Datos -----------------------------------------------------------------
+
+    def _setup(self, alias):
+        """
+        Crea solo las tablas de usuarios y citas (con sus índices y restricciones)
+        en la base temporal. Sin señales: escribirían en la base principal.
+        """
+        with connections[alias].schema_editor() as editor:
+            editor.create_model(User)
+            editor.create_model(Appointment)
+        users = User.objects.using(alias).bulk_create(
+            [
+                User(username=f"doctor{i}", email=f"doctor{i}@example.com", role=User.Roles.DOCTOR, password="!")
+                for i in range(BENCH_DOCTORS)
+            ]
+            + [
+                User(username=f"patient{i}", email=f"patient{i}@example.com", role=User.Roles.PATIENT, password="!")
+                for i in range(BENCH_PATIENTS)
+            ]
+        )
+        doctor_ids = [user.pk for user in users if user.role == User.Roles.DOCTOR]
+        patient_ids = [user.pk for user in users if user.role == User.Roles.PATIENT]
+        return doctor_ids, patient_ids
+
+    # --- Carga -----------------------------------------------------------------
+
+    def _run(self, alias, doctor_ids, patient_ids, options):
+        start = timezone.now().replace(minute=0, second=0, microsecond=0) + timedelta(days=1)
+        deadline = time_module.perf_counter() + options["seconds"]
+        barrier = threading.Barrier(options["threads"])
+        counters = []
+        latencies = []
+        lock = threading.Lock()
+
+        def worker(seed):
+            rng = random.Random(seed)
+            stats = Counter()
+            durations = []
+            barrier.wait()
+            try:
+                while time_module.perf_counter() < deadline:
+                    # Ciclo de una petición: Django cierra o conserva la conexión
+                    # según CONN_MAX_AGE al empezar y al terminar
+                    close_old_connections()
+                    began = time_module.perf_counter()
+                    stats[self._book(alias, rng, start, doctor_ids, patient_ids)] += 1
+                    durations.append(time_module.perf_counter() - began)
+                    close_old_connections()
+            finally:
+                connections[alias].close()
+                with lock:
+                    counters.append(stats)
+                    latencies.extend(durations)
+
+        threads = [
+            threading.Thread(target=worker, args=(options["seed"] + i,))
+            for i in range(options["threads"])
+        ]
+        started = time_module.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time_module.perf_counter() - started
+
+        totals = sum(counters, Counter())
+        latencies.sort()
+        return {
+            "written": totals["written"],
+            "taken": totals["taken"],
+            "locked": totals["locked"],
+            "writes_per_second": totals["written"] / elapsed,
+            "p50_ms": statistics.median(latencies) * 1000 if latencies else 0.0,
+            "p95_ms": latencies[int(len(latencies) * 0.95)] * 1000 if latencies else 0.0,
+        }
+
+    def _book(self, alias, rng, start, doctor_ids, patient_ids):
+        """
+        Misma forma que una reserva: comprobar el slot y crear la cita en una transacción.
+        """
+        doctor_id = rng.choice(doctor_ids)
+        scheduled = start + APPOINTMENT_SLOT_DELTA * rng.randrange(BENCH_SLOTS_PER_DOCTOR)
+        appointments = Appointment.objects.using(alias)
+        try:
+            with transaction.atomic(using=alias):
+                taken = (
+                    appointments
+                    .filter(doctor_id=doctor_id, scheduled_datetime=scheduled)
+                    .exclude(status=Appointment.Status.CANCELED)
+                    .exists()
+                )
+                if taken:
+                    return "taken"
+                appointments.bulk_create([
+                    Appointment(
+                        doctor_id=doctor_id,
+                        patient_id=rng.choice(patient_ids),
+                        scheduled_datetime=scheduled,
+                        reason="Benchmark",
+                    )
+                ])
+        except IntegrityError:
+            return "taken"
+        except OperationalError:
+            # "database is locked"
+            return "locked"
+        return "written"
+
+    # --- Resultado -------------------------------------------------------------
+
+    def _report(self, results):
+        self.stdout.write(
+            f"{'Perfil':<10} {'Escrituras/s':>13} {'Escritas':>9} {'Ocupados':>9} "
+            f"{'Bloqueos':>9} {'p50':>9} {'p95':>9}"
+        )
+        for profile, result in results.items():
+            self.stdout.write(
+                f"{profile:<10} {result['writes_per_second']:>13.0f} {result['written']:>9} "
+                f"{result['taken']:>9} {result['locked']:>9} "
+                f"{result['p50_ms']:>7.1f}ms {result['p95_ms']:>7.1f}ms"
+            )
+        if "baseline" in results and "tuned" in results:
+            baseline = results["baseline"]["writes_per_second"]
+            if baseline:
+                gain = results["tuned"]["writes_per_second"] / baseline
+                self.stdout.write(self.style.SUCCESS(f"Ganancia del perfil afinado: x{gain:.1f}"))
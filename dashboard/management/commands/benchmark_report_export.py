@@ -0,0 +1,119 @@
+import time as time_module
+import tracemalloc
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import User
+from SaludConectada.db_routing import pin_primary
+from dashboard.views import reports_export
+from scheduling.models import Appointment
+
+BENCH_PREFIX = "bench_export_"
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide la exportación de citas en streaming para varios tamaños: "
+        "tiempo hasta el primer byte, tiempo total y pico de memoria."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            default="5000,20000,50000",
+            help="Número de citas por reporte, separados por comas.",
+        )
+        parser.add_argument("--format", choices=("csv", "xlsx"), default="csv")
+        parser.add_argument(
+            "--keep",
+            action="store_true",
+            help="No borrar los usuarios y citas de prueba al terminar.",
+        )
+
+    # Crea sus propios datos y los lee enseguida: nada de réplica desfasada
+    @pin_primary()
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(size) for size in options["sizes"].split(",")]
+        except ValueError:
+            raise CommandError("--sizes debe ser una lista de enteros.")
+
+        admin, doctors = self._setup(sizes)
+        factory = RequestFactory()
+        url = reverse("dashboard:reports_export", args=[options["format"]])
+
+        self.stdout.write(f"{'Citas':>10} {'1er byte':>10} {'Total':>10} {'Bytes':>12} {'Pico mem.':>12}")
+        peaks = []
+        for size, doctor in zip(sizes, doctors):
+            request = factory.get(url, {"doctor": doctor.pk})
+            request.user = admin
+
+            tracemalloc.start()
+            started = time_module.perf_counter()
+            response = reports_export(request, options["format"])
+            first_byte = None
+            total_bytes = 0
+            for chunk in response.streaming_content:
+                if chunk and first_byte is None:
+                    first_byte = time_module.perf_counter() - started
+                total_bytes += len(chunk)
+            elapsed = time_module.perf_counter() - started
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            peaks.append(peak)
+
+            self.stdout.write(
+                f"{size:>10} {first_byte * 1000:>8.1f}ms {elapsed:>9.2f}s "
+                f"{total_bytes:>12} {peak / 1024:>10.0f}KB"
+            )
+
+        if not options["keep"]:
+            self._cleanup()
+
+        growth = peaks[-1] / peaks[0] if peaks[0] else 0
+        self.stdout.write(
+            f"Crecimiento del pico de memoria entre {sizes[0]} y {sizes[-1]} citas: x{growth:.2f}"
+        )
+
+    def _setup(self, sizes):
+        self._cleanup()
+        admin = User.objects.create_user(
+            username=f"{BENCH_PREFIX}admin",
+            email=f"{BENCH_PREFIX}admin@example.com",
+            role=User.Roles.ADMIN,
+        )
+        patient = User.objects.create_user(
+            username=f"{BENCH_PREFIX}patient",
+            email=f"{BENCH_PREFIX}patient@example.com",
+            role=User.Roles.PATIENT,
+        )
+        start = timezone.now().replace(second=0, microsecond=0) - timedelta(days=365)
+        doctors = []
+        for index, size in enumerate(sizes):
+            doctor = User.objects.create_user(
+                username=f"{BENCH_PREFIX}doctor{index}",
+                email=f"{BENCH_PREFIX}doctor{index}@example.com",
+                role=User.Roles.DOCTOR,
+            )
+            doctors.append(doctor)
+            Appointment.objects.bulk_create(
+                (
+                    Appointment(
+                        patient=patient,
+                        doctor=doctor,
+                        scheduled_datetime=start + timedelta(minutes=20 * i),
+                        reason="Consulta de control",
+                        status=Appointment.Status.COMPLETED,
+                    )
+                    for i in range(size)
+                ),
+                batch_size=5000,
+            )
+        return admin, doctors
+
+    def _cleanup(self):
+        User.objects.filter(username__startswith=BENCH_PREFIX).delete()
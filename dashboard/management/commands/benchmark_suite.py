@@ -0,0 +1,318 @@
+import json
+import platform
+import statistics
+import time as time_module
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import User
+from SaludConectada.db_routing import pin_primary
+from scheduling.booking import book_appointment
+from scheduling.models import Appointment
+from scheduling.summaries import get_slot_summary_calendar
+from scheduling.utils import (
+    find_earliest_available_slots,
+    get_available_slots_for_doctor_and_date,
+    get_available_slots_over_range,
+)
+
+from .generate_synthetic_data import SYNTH_PREFIX
+
+BENCH_PREFIX = "bench_suite_"
+RESULTS_VERSION = 1
+
+# Consultas SQL por ejecución de cada caso (medidas; dashboard.tests.QueryBudgetTests
+# las exige exactas). Las páginas no consultan la sesión ni el usuario (sesión
+# cached_db y accounts.user_cache); los paneles de paciente y médico leen su agenda
+# de la caché, y el paso 1 su directorio de disponibilidad (scheduling.directory):
+# solo queda el selector de médicos. Los primeros slots cuentan con encontrarlos en
+# el primer tramo de la búsqueda (hoy).
+QUERY_BUDGETS = {
+    "slots_over_range_14d": 2,
+    "slots_single_day": 2,
+    "slot_summary_calendar": 3,
+    "earliest_slots": 3,
+    "booking": 14,
+    "step1": 1,
+    "step2": 6,
+    "earliest_slots_page": 4,
+    "patient_dashboard": 0,
+    "patient_appointments": 1,
+    "doctor_dashboard": 0,
+    "doctor_appointments": 1,
+    "admin_dashboard": 3,
+    "reports": 3,
+    "reports_export_csv": 3,
+    "system_usage": 2,
+    "doctor_utilization": 6,
+    "external_sync": 4,
+    "manage_users": 2,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide los caminos críticos (slots, pasos 1 y 2, paneles, reportes y reservas) "
+        "sobre los datos existentes y comprueba un presupuesto de consultas por caso. "
+        "Los resultados se pueden guardar en JSON y comparar con una ejecución anterior."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeat", type=int, default=5, help="Ejecuciones medidas por caso.")
+        parser.add_argument(
+            "--only",
+            default="",
+            help="Casos a ejecutar, separados por comas (por defecto todos).",
+        )
+        parser.add_argument(
+            "--output",
+            help="Ruta del JSON de resultados ('-' para escribirlo por la salida estándar).",
+        )
+        parser.add_argument(
+            "--compare",
+            help="JSON de una ejecución anterior con el que comparar.",
+        )
+        parser.add_argument(
+            "--max-slowdown",
+            type=float,
+            default=0.25,
+            help="Aumento relativo de la mediana que cuenta como regresión al comparar.",
+        )
+
+    # Crea sus propios datos y los lee enseguida: nada de réplica desfasada
+    @pin_primary()
+    def handle(self, *args, **options):
+        if options["repeat"] < 1:
+            raise CommandError("--repeat debe ser al menos 1.")
+        only = {name for name in options["only"].split(",") if name}
+        unknown = only - set(QUERY_BUDGETS)
+        if unknown:
+            raise CommandError(f"Casos desconocidos: {', '.join(sorted(unknown))}")
+
+        self._setup()
+        try:
+            # Las métricas de peticiones harían consultas propias al volcarse
+            with override_settings(ALLOWED_HOSTS=["*"], REQUEST_METRICS_ENABLED=False):
+                results = self._run_cases(only, options["repeat"])
+        finally:
+            self._cleanup()
+
+        report = {
+            "version": RESULTS_VERSION,
+            "run_at": timezone.now().isoformat(),
+            "environment": {
+                "database": connection.vendor,
+                "python": platform.python_version(),
+                "schedule_index": bool(getattr(settings, "SCHEDULING_SCHEDULE_INDEX", False)),
+                "doctors": User.objects.filter(role=User.Roles.DOCTOR).count(),
+                "appointments": Appointment.objects.count(),
+            },
+            "repeat": options["repeat"],
+            "cases": results,
+        }
+
+        to_stdout = options["output"] == "-"
+        if not to_stdout:
+            self._print_table(results)
+
+        failures = [
+            f"{name}: {case['queries']} consultas (presupuesto {case['budget']})"
+            for name, case in results.items()
+            if not case["within_budget"]
+        ]
+        if options["compare"]:
+            regressions = self._compare(results, options["compare"], options["max_slowdown"])
+            report["regressions"] = regressions
+            failures.extend(regressions)
+            if not to_stdout:
+                for line in regressions:
+                    self.stdout.write(self.style.WARNING(f"Regresión: {line}"))
+
+        if to_stdout:
+            self.stdout.write(json.dumps(report, indent=2))
+        elif options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as handle:
+                json.dump(report, handle, indent=2)
+            self.stdout.write(f"Resultados guardados en {options['output']}")
+
+        if failures:
+            raise CommandError("; ".join(failures))
+        if not to_stdout:
+            self.stdout.write(self.style.SUCCESS("Todos los casos dentro de presupuesto."))
+
+    # --- Datos -------------------------------------------------------------
+
+    def _setup(self):
+        """
+        Usa el primer médico y paciente sintéticos (o, si no hay, cualquiera)
+        y un administrador propio que se borra al terminar.
+        """
+        self._cleanup()
+        with_availability = User.objects.filter(
+            role=User.Roles.DOCTOR,
+            availabilities__is_active=True,
+        ).distinct()
+        self.doctor = (
+            with_availability.filter(username__startswith=SYNTH_PREFIX).order_by("id").first()
+            or with_availability.order_by("id").first()
+        )
+        patients = User.objects.filter(role=User.Roles.PATIENT)
+        self.patient = (
+            patients.filter(username__startswith=SYNTH_PREFIX).order_by("id").first()
+            or patients.order_by("id").first()
+        )
+        if self.doctor is None or self.patient is None:
+            raise CommandError(
+                "Se necesita al menos un médico con disponibilidad y un paciente. "
+                "Genera datos con generate_synthetic_data."
+            )
+        self.admin = User.objects.create_user(
+            username=f"{BENCH_PREFIX}admin",
+            email=f"{BENCH_PREFIX}admin@example.com",
+            role=User.Roles.ADMIN,
+        )
+
+        self.today = timezone.localdate()
+        slots_by_date = get_available_slots_over_range(self.doctor, self.today + timedelta(days=1), 28)
+        self.free_slots = [slot for slots in slots_by_date.values() for slot in slots]
+        self.busy_date = next(
+            (day for day, slots in slots_by_date.items() if slots),
+            self.today + timedelta(days=1),
+        )
+        self.booked_ids = []
+
+    def _cleanup(self):
+        ids = getattr(self, "booked_ids", None)
+        if ids:
+            Appointment.objects.filter(pk__in=ids).delete()
+            ids.clear()
+        User.objects.filter(username__startswith=BENCH_PREFIX).delete()
+
+    # --- Casos -------------------------------------------------------------
+
+    def _cases(self):
+        patient_client = Client()
+        patient_client.force_login(self.patient)
+        doctor_client = Client()
+        doctor_client.force_login(self.doctor)
+        admin_client = Client()
+        admin_client.force_login(self.admin)
+
+        def page(client, url_name, params=None, args=None, stream=False):
+            url = reverse(url_name, args=args)
+
+            def run():
+                response = client.get(url, params or {})
+                if response.status_code != 200:
+                    raise CommandError(f"{url} devolvió {response.status_code}")
+                if stream:
+                    for _ in response.streaming_content:
+                        pass
+            return run
+
+        def book():
+            if not self.free_slots:
+                raise CommandError("El médico de prueba no tiene slots libres para reservar.")
+            slot_start, _ = self.free_slots.pop(0)
+            appointment = book_appointment(self.patient, self.doctor, slot_start, reason="benchmark")
+            self.booked_ids.append(appointment.pk)
+
+        date_param = {"doctor": self.doctor.pk, "date": self.busy_date.isoformat()}
+        tomorrow = self.today + timedelta(days=1)
+        return {
+            "slots_over_range_14d": lambda: get_available_slots_over_range(self.doctor, tomorrow, 14),
+            "slots_single_day": lambda: get_available_slots_for_doctor_and_date(self.doctor, self.busy_date),
+            "slot_summary_calendar": lambda: get_slot_summary_calendar(self.doctor, tomorrow, 14),
+            "earliest_slots": lambda: find_earliest_available_slots(limit=10),
+            "booking": book,
+            "step1": page(patient_client, "scheduling:new_appointment_step1"),
+            "step2": page(patient_client, "scheduling:new_appointment_step2", date_param),
+            "earliest_slots_page": page(patient_client, "scheduling:earliest_available_slots"),
+            "patient_dashboard": page(patient_client, "dashboard:patient_dashboard"),
+            "patient_appointments": page(patient_client, "scheduling:patient_appointments"),
+            "doctor_dashboard": page(doctor_client, "dashboard:doctor_dashboard"),
+            "doctor_appointments": page(doctor_client, "scheduling:doctor_appointments"),
+            "admin_dashboard": page(admin_client, "dashboard:admin_dashboard"),
+            "reports": page(admin_client, "dashboard:reports"),
+            "reports_export_csv": page(
+                admin_client, "dashboard:reports_export", {"doctor": self.doctor.pk},
+                args=["csv"], stream=True,
+            ),
+            "system_usage": page(admin_client, "dashboard:system_usage"),
+            "doctor_utilization": page(admin_client, "dashboard:doctor_utilization"),
+            "external_sync": page(admin_client, "dashboard:external_sync"),
+            "manage_users": page(admin_client, "dashboard:manage_users", {"q": SYNTH_PREFIX}),
+        }
+
+    def _run_cases(self, only, repeat):
+        results = {}
+        for name, run in self._cases().items():
+            if only and name not in only:
+                continue
+            # Una ejecución de calentamiento (cachés, plantillas) que no se mide,
+            # salvo en la reserva, donde cada ejecución consume un slot
+            if name != "booking":
+                run()
+            timings = []
+            queries = 0
+            for _ in range(repeat):
+                with CaptureQueriesContext(connection) as captured:
+                    started = time_module.perf_counter()
+                    run()
+                    timings.append((time_module.perf_counter() - started) * 1000)
+                queries = max(queries, len(captured.captured_queries))
+
+            timings.sort()
+            budget = QUERY_BUDGETS[name]
+            results[name] = {
+                "median_ms": round(statistics.median(timings), 3),
+                "p95_ms": round(timings[min(len(timings) - 1, int(0.95 * len(timings)))], 3),
+                "min_ms": round(timings[0], 3),
+                "max_ms": round(timings[-1], 3),
+                "queries": queries,
+                "budget": budget,
+                "within_budget": queries <= budget,
+            }
+        return results
+
+    # --- Informe -----------------------------------------------------------
+
+    def _print_table(self, results):
+        self.stdout.write(
+            f"{'Caso':<24} {'Mediana':>10} {'p95':>10} {'Máx.':>10} {'Consultas':>10} {'Presup.':>8}"
+        )
+        for name, case in results.items():
+            line = (
+                f"{name:<24} {case['median_ms']:>8.1f}ms {case['p95_ms']:>8.1f}ms "
+                f"{case['max_ms']:>8.1f}ms {case['queries']:>10} {case['budget']:>8}"
+            )
+            self.stdout.write(line if case["within_budget"] else self.style.ERROR(line))
+
+    def _compare(self, results, path, max_slowdown):
+        try:
+            with open(path, encoding="utf-8") as handle:
+                baseline = json.load(handle)["cases"]
+        except (OSError, ValueError, KeyError) as exc:
+            raise CommandError(f"No se pudo leer {path}: {exc}")
+
+        regressions = []
+        for name, case in results.items():
+            previous = baseline.get(name)
+            if previous is None:
+                continue
+            if case["queries"] > previous["queries"]:
+                regressions.append(
+                    f"{name}: {previous['queries']} → {case['queries']} consultas"
+                )
+            if previous["median_ms"] and case["median_ms"] > previous["median_ms"] * (1 + max_slowdown):
+                regressions.append(
+                    f"{name}: mediana {previous['median_ms']:.1f}ms → {case['median_ms']:.1f}ms"
+                )
+        return regressions
@@ -0,0 +1,254 @@
+import random
+import time as time_module
+from datetime import datetime, time, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from accounts.models import User
+from clinical.models import Consultation
+from dashboard.metrics import APPOINTMENTS, USERS, mark_metrics_dirty
+from scheduling.directory import bump_directory_version
+from scheduling.models import Appointment, DoctorAvailability, APPOINTMENT_SLOT_DELTA
+
+SYNTH_PREFIX = "synth_"
+CLEANUP_DOCTOR_CHUNK = 20
+
+# Franjas típicas (inicio, fin) entre las que se reparte la disponibilidad de cada médico
+AVAILABILITY_BLOCKS = (
+    (time(7, 0), time(11, 0)),
+    (time(8, 0), time(12, 0)),
+    (time(9, 0), time(13, 0)),
+    (time(14, 0), time(18, 0)),
+    (time(15, 0), time(19, 0)),
+    (time(18, 0), time(21, 0)),
+)
+
+REASONS = (
+    "Consulta de control",
+    "Dolor de cabeza persistente",
+    "Renovación de fórmula",
+    "Revisión de exámenes",
+    "Malestar general",
+    "Seguimiento de tratamiento",
+    "Dolor lumbar",
+    "Chequeo anual",
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Genera datos sintéticos a gran escala para pruebas de rendimiento: "
+        "médicos con disponibilidad variada, pacientes y citas en todos los "
+        "estados, con su consulta cuando la cita está completada."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--doctors", type=int, default=2000)
+        parser.add_argument("--patients", type=int, default=20000)
+        parser.add_argument("--appointments", type=int, default=1_000_000)
+        parser.add_argument(
+            "--past-days",
+            type=int,
+            default=365,
+            help="Días hacia atrás sobre los que se reparten las citas.",
+        )
+        parser.add_argument(
+            "--future-days",
+            type=int,
+            default=60,
+            help="Días hacia delante sobre los que se reparten las citas.",
+        )
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument(
+            "--clear",
+            action="store_true",
+            help="Solo borra los datos sintéticos existentes.",
+        )
+
+    def handle(self, *args, **options):
+        self._cleanup()
+        if options["clear"]:
+            self.stdout.write(self.style.SUCCESS("Datos sintéticos eliminados."))
+            return
+        if options["doctors"] < 1 or options["patients"] < 1:
+            raise CommandError("Se necesita al menos un médico y un paciente.")
+
+        rng = random.Random(options["seed"])
+        batch_size = options["batch_size"]
+        started = time_module.perf_counter()
+
+        doctor_ids = self._create_users(User.Roles.DOCTOR, "doctor", options["doctors"], batch_size)
+        patient_ids = self._create_users(User.Roles.PATIENT, "patient", options["patients"], batch_size)
+        self.stdout.write(f"Usuarios: {len(doctor_ids)} médicos, {len(patient_ids)} pacientes")
+
+        windows = self._create_availabilities(rng, doctor_ids, batch_size)
+        self.stdout.write(f"Disponibilidades: {sum(len(w) for w in windows.values())}")
+
+        appointments, consultations = self._create_appointments(rng, windows, patient_ids, options)
+        elapsed = time_module.perf_counter() - started
+
+        # bulk_create no dispara señales: invalidamos métricas y directorio a mano
+        mark_metrics_dirty(USERS)
+        mark_metrics_dirty(APPOINTMENTS)
+        bump_directory_version()
+        self.stdout.write(self.style.SUCCESS(
+            f"Citas: {appointments} | Consultas: {consultations} | {elapsed:.1f}s"
+        ))
+        self.stdout.write(
+            "Los resúmenes de slots de los médicos sintéticos no se calculan aquí; "
+            "usa rebuild_slot_summaries si los necesitas."
+        )
+
+    def _create_users(self, role, label, count, batch_size):
+        for offset in range(0, count, batch_size):
+            User.objects.bulk_create(
+                User(
+                    username=f"{SYNTH_PREFIX}{label}{index}",
+                    email=f"{SYNTH_PREFIX}{label}{index}@example.com",
+                    first_name=label.capitalize(),
+                    last_name=str(index),
+                    role=role,
+                    # Contraseña no utilizable: evita hashear miles de contraseñas
+                    password="!",
+                )
+                for index in range(offset, min(offset + batch_size, count))
+            )
+        return list(
+            User.objects
+            .filter(username__startswith=f"{SYNTH_PREFIX}{label}", role=role)
+            .order_by("id")
+            .values_list("id", flat=True)
+        )
+
+    def _create_availabilities(self, rng, doctor_ids, batch_size):
+        """
+        Cada médico atiende entre 2 y 6 días por semana, con una o dos franjas
+        por día. Devuelve {doctor_id: {weekday: [(inicio, fin), ...]}}.
+        """
+        windows = {}
+        rows = []
+        for doctor_id in doctor_ids:
+            by_weekday = {}
+            for weekday in sorted(rng.sample(range(7), rng.randint(2, 6))):
+                blocks = rng.sample(AVAILABILITY_BLOCKS, rng.choice((1, 1, 2)))
+                # Dos franjas solapadas se quedan en una sola
+                blocks.sort()
+                if len(blocks) == 2 and blocks[1][0] < blocks[0][1]:
+                    blocks = [blocks[0]]
+                by_weekday[weekday] = blocks
+                rows.extend(
+                    DoctorAvailability(
+                        doctor_id=doctor_id,
+                        weekday=weekday,
+                        start_time=start,
+                        end_time=end,
+                    )
+                    for start, end in blocks
+                )
+            windows[doctor_id] = by_weekday
+        DoctorAvailability.objects.bulk_create(rows, batch_size=batch_size)
+        return windows
+
+    def _slot_starts(self, by_weekday, first_day, days):
+        tz = timezone.get_current_timezone()
+        for offset in range(days):
+            day = first_day + timedelta(days=offset)
+            for start, end in by_weekday.get(day.weekday(), ()):
+                current = timezone.make_aware(datetime.combine(day, start), tz)
+                limit = timezone.make_aware(datetime.combine(day, end), tz)
+                while current + APPOINTMENT_SLOT_DELTA <= limit:
+                    yield current
+                    current += APPOINTMENT_SLOT_DELTA
+
+    def _pick_status(self, rng, slot_start, now):
+        roll = rng.random()
+        if slot_start < now:
+            if roll < 0.75:
+                return Appointment.Status.COMPLETED
+            if roll < 0.92:
+                return Appointment.Status.CANCELED
+            return Appointment.Status.CONFIRMED
+        if roll < 0.45:
+            return Appointment.Status.PENDING
+        if roll < 0.85:
+            return Appointment.Status.CONFIRMED
+        return Appointment.Status.CANCELED
+
+    def _create_appointments(self, rng, windows, patient_ids, options):
+        """
+        Recorre los slots de cada médico y se queda con cada uno con la
+        probabilidad necesaria para llegar al total pedido. Así no hay dos citas
+        en el mismo slot de un médico y no hace falta recordar los ya usados.
+        """
+        now = timezone.now()
+        days = options["past_days"] + options["future_days"]
+        first_day = timezone.localdate() - timedelta(days=options["past_days"])
+        per_doctor = options["appointments"] / len(windows)
+        batch_size = options["batch_size"]
+
+        created = 0
+        consultations = 0
+        batch = []
+
+        def flush():
+            nonlocal created, consultations
+            with transaction.atomic():
+                Appointment.objects.bulk_create(batch)
+                completed = [a for a in batch if a.status == Appointment.Status.COMPLETED]
+                Consultation.objects.bulk_create(
+                    Consultation(
+                        appointment=appointment,
+                        doctor_notes="Paciente estable. Se revisan síntomas y antecedentes.",
+                        recommendations="Control en tres meses.",
+                    )
+                    for appointment in completed
+                )
+            created += len(batch)
+            consultations += len(completed)
+            batch.clear()
+            self.stdout.write(f"  {created} citas...")
+
+        for doctor_id, by_weekday in windows.items():
+            slots_per_week = sum(
+                (datetime.combine(first_day, end) - datetime.combine(first_day, start))
+                // APPOINTMENT_SLOT_DELTA
+                for blocks in by_weekday.values()
+                for start, end in blocks
+            )
+            capacity = slots_per_week * days / 7
+            probability = min(1.0, per_doctor / capacity) if capacity else 0
+
+            for slot_start in self._slot_starts(by_weekday, first_day, days):
+                if rng.random() >= probability:
+                    continue
+                status = self._pick_status(rng, slot_start, now)
+                batch.append(Appointment(
+                    patient_id=rng.choice(patient_ids),
+                    doctor_id=doctor_id,
+                    scheduled_datetime=slot_start,
+                    reason=rng.choice(REASONS),
+                    status=status,
+                    canceled_at=slot_start - timedelta(days=1)
+                    if status == Appointment.Status.CANCELED else None,
+                ))
+                if len(batch) >= batch_size:
+                    flush()
+        if batch:
+            flush()
+        return created, consultations
+
+    def _cleanup(self):
+        # Por tandas de médicos: un único delete en cascada cargaría millones de citas en memoria
+        doctor_ids = list(
+            User.objects
+            .filter(username__startswith=SYNTH_PREFIX, role=User.Roles.DOCTOR)
+            .values_list("id", flat=True)
+        )
+        for offset in range(0, len(doctor_ids), CLEANUP_DOCTOR_CHUNK):
+            Appointment.objects.filter(
+                doctor_id__in=doctor_ids[offset:offset + CLEANUP_DOCTOR_CHUNK]
+            ).delete()
+        User.objects.filter(username__startswith=SYNTH_PREFIX).delete()
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from dashboard.metrics import refresh_metrics
+
+
+class Command(BaseCommand):
+    help = "Recalcula los snapshots de métricas del panel del administrador."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Recalcula de forma continua en lugar de una sola vez.",
+        )
+        parser.add_argument("--interval", type=float, default=300.0)
+
+    def handle(self, *args, **options):
+        while True:
+            for key, snapshot in refresh_metrics().items():
+                self.stdout.write(f"{key}: {snapshot.data} ({snapshot.computed_at:%H:%M:%S})")
+            if not options["loop"]:
+                return
+            time.sleep(options["interval"])
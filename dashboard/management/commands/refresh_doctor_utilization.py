@@ -0,0 +1,47 @@
+import time as time_module
+
+from django.core.management.base import BaseCommand
+
+from dashboard.utilization import (
+    UTILIZATION_DAYS_AHEAD,
+    UTILIZATION_DAYS_BACK,
+    refresh_utilization_window,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula la ocupación diaria de los médicos (slots ofrecidos y citas "
+        "reservadas, completadas y canceladas). Pensado para ejecutarse cada noche."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days-back",
+            type=int,
+            default=UTILIZATION_DAYS_BACK,
+            help="Días pasados que se recalculan.",
+        )
+        parser.add_argument(
+            "--days-ahead",
+            type=int,
+            default=UTILIZATION_DAYS_AHEAD,
+            help="Días futuros que se recalculan.",
+        )
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="Recalcula desde la primera cita registrada.",
+        )
+
+    def handle(self, *args, **options):
+        started = time_module.perf_counter()
+        start, end, written = refresh_utilization_window(
+            days_back=options["days_back"],
+            days_ahead=options["days_ahead"],
+            full=options["full"],
+        )
+        elapsed = time_module.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Ocupación recalculada del {start} al {end}: {written} filas en {elapsed:.1f}s"
+        ))
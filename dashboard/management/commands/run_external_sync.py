@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from dashboard.external_sync import claim_run, run_sync
+
+
+class Command(BaseCommand):
+    help = (
+        "Worker de la sincronización externa: procesa las ejecuciones solicitadas "
+        "desde el panel y envía los cambios pendientes al sistema externo."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Ejecuta una sincronización ahora y termina (útil para cron).",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=5.0,
+            help="Segundos de espera cuando no hay ejecuciones solicitadas.",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            run = claim_run(create=options["once"])
+            if run is not None:
+                run = run_sync(run)
+                message = (
+                    f"Sincronización {run.pk}: {run.get_status_display()} | "
+                    f"{run.records_sent}/{run.total_pending} registros en {run.chunks_sent} lotes"
+                )
+                if run.last_error:
+                    self.stdout.write(self.style.ERROR(f"{message} | {run.last_error}"))
+                else:
+                    self.stdout.write(self.style.SUCCESS(message))
+            elif options["once"]:
+                self.stdout.write("Otra sincronización está en curso.")
+            if options["once"]:
+                return
+            if run is None:
+                time.sleep(options["interval"])
@@ -0,0 +1,54 @@
+import sqlite3
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from SaludConectada.db_routing import REPLICA_DB_ALIAS, replica_configured
+
+
+class Command(BaseCommand):
+    help = (
+        "Copia la base SQLite principal sobre la réplica local (SQLITE_REPLICA_PATH) "
+        "con la API de backup de SQLite. Sirve para probar el enrutado de lecturas "
+        "sin un servidor de réplica; con PostgreSQL la réplica se mantiene por replicación."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=0.0,
+            help="Segundos entre copias; 0 copia una vez y termina.",
+        )
+
+    def handle(self, *args, **options):
+        if not replica_configured():
+            raise CommandError("No hay réplica configurada: define SQLITE_REPLICA_PATH.")
+        if {connections[alias].vendor for alias in (DEFAULT_DB_ALIAS, REPLICA_DB_ALIAS)} != {"sqlite"}:
+            raise CommandError("sync_local_replica solo funciona con SQLite en principal y réplica.")
+
+        while True:
+            started = time.perf_counter()
+            pages = self._copy()
+            self.stdout.write(
+                f"Réplica actualizada: {pages} páginas en {time.perf_counter() - started:.2f}s"
+            )
+            if not options["interval"]:
+                return
+            time.sleep(options["interval"])
+
+    def _copy(self):
+        source = connections[DEFAULT_DB_ALIAS]
+        source.ensure_connection()
+        replica_path = connections[REPLICA_DB_ALIAS].settings_dict["NAME"]
+        # La copia se hace por una conexión propia: la de Django a la réplica solo lee
+        connections[REPLICA_DB_ALIAS].close()
+        target = sqlite3.connect(replica_path)
+        try:
+            # Instantánea consistente de la principal; los lectores de la réplica
+            # siguen viendo la versión anterior hasta que termina
+            source.connection.backup(target)
+            return target.execute("PRAGMA page_count").fetchone()[0]
+        finally:
+            target.close()
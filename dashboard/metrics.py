@@ -0,0 +1,107 @@
+# dashboard/metrics.py
+"""
+Métricas del panel del administrador.
+
+Cada grupo se calcula con una sola consulta de agregación condicional y se
+guarda como MetricSnapshot. El panel lee los snapshots; un grupo se recalcula:
+- si no existe o tiene más de METRICS_MAX_AGE (refresco periódico, también
+  desde el comando `refresh_dashboard_metrics`),
+- o si una señal lo marcó como sucio y tiene más de METRICS_MIN_REFRESH_SECONDS
+  (así una ráfaga de cambios no provoca un recálculo por visita).
+"""
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from accounts.models import User
+from SaludConectada.db_routing import pin_primary
+from scheduling.models import Appointment, ArchivedAppointment
+
+from .models import MetricSnapshot
+
+METRICS_MAX_AGE = timedelta(minutes=15)
+METRICS_MIN_REFRESH_SECONDS = 30
+
+USERS = "users"
+APPOINTMENTS = "appointments"
+
+_DIRTY_KEY = "dashboard:metrics:dirty:{key}"
+
+
+def _compute_users():
+    return User.objects.aggregate(
+        total=Count("id"),
+        **{
+            role.lower(): Count("id", filter=Q(role=role))
+            for role in User.Roles.values
+        },
+    )
+
+
+def _compute_appointments():
+    # Incluye las citas archivadas: archivar no cambia los totales del panel
+    aggregates = {
+        "total": Count("id"),
+        **{
+            status.lower(): Count("id", filter=Q(status=status))
+            for status in Appointment.Status.values
+        },
+    }
+    hot = Appointment.objects.aggregate(**aggregates)
+    archived = ArchivedAppointment.objects.aggregate(**aggregates)
+    return {key: hot[key] + archived[key] for key in aggregates}
+
+
+METRIC_GROUPS = {
+    USERS: _compute_users,
+    APPOINTMENTS: _compute_appointments,
+}
+
+
+def mark_metrics_dirty(key):
+    cache.set(_DIRTY_KEY.format(key=key), True, timeout=None)
+
+
+@pin_primary()
+def refresh_metrics(keys=None):
+    """
+    Recalcula y guarda los grupos indicados (todos por defecto).
+    Devuelve {grupo: MetricSnapshot}. Cuenta siempre en la base principal:
+    con la réplica se perderían los cambios que marcaron el grupo como sucio.
+    """
+    snapshots = {}
+    for key in keys or METRIC_GROUPS:
+        # Se limpia antes de calcular para no perder cambios que lleguen durante la consulta
+        cache.delete(_DIRTY_KEY.format(key=key))
+        snapshot, _ = MetricSnapshot.objects.update_or_create(
+            key=key,
+            defaults={"data": METRIC_GROUPS[key](), "computed_at": timezone.now()},
+        )
+        snapshots[key] = snapshot
+    return snapshots
+
+
+def _needs_refresh(snapshot, now):
+    age = now - snapshot.computed_at
+    if age >= METRICS_MAX_AGE:
+        return True
+    dirty = cache.get(_DIRTY_KEY.format(key=snapshot.key))
+    return bool(dirty) and age.total_seconds() >= METRICS_MIN_REFRESH_SECONDS
+
+
+def get_dashboard_metrics():
+    """
+    Devuelve {grupo: MetricSnapshot} con una lectura de la tabla de snapshots,
+    recalculando solo los grupos ausentes, caducados o invalidados.
+    """
+    now = timezone.now()
+    snapshots = {s.key: s for s in MetricSnapshot.objects.filter(key__in=METRIC_GROUPS)}
+    stale = [
+        key for key in METRIC_GROUPS
+        if key not in snapshots or _needs_refresh(snapshots[key], now)
+    ]
+    if stale:
+        snapshots.update(refresh_metrics(stale))
+    return snapshots
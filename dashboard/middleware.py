@@ -0,0 +1,50 @@
+# dashboard/middleware.py
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.signals import request_finished
+from django.db import close_old_connections, connections
+
+from .request_metrics import QueryTimer, collector
+
+
+def flush_metrics_if_due(**kwargs):
+    """
+    Vuelca el colector al terminar la petición (request_finished), con la
+    respuesta ya enviada: el volcado no suma latencia a ninguna petición medida.
+    """
+    if getattr(settings, "REQUEST_METRICS_ENABLED", True) and collector.should_flush():
+        collector.flush()
+        # request_finished ya cerró las conexiones caducadas antes de este volcado
+        close_old_connections()
+
+
+class RequestMetricsMiddleware:
+    """
+    Mide latencia, número de consultas y tiempo SQL de cada petición y los
+    registra por nombre de URL (ver dashboard.request_metrics).
+    Se desactiva con REQUEST_METRICS_ENABLED = False.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, "REQUEST_METRICS_ENABLED", True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        request_finished.connect(flush_metrics_if_due, dispatch_uid="dashboard.request_metrics.flush")
+
+    def __call__(self, request):
+        timer = QueryTimer()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            # Todos los alias configurados, réplica incluida (ver db_routing)
+            for conn in connections.all():
+                stack.enter_context(conn.execute_wrapper(timer))
+            response = self.get_response(request)
+        latency_ms = (time.perf_counter() - started) * 1000
+
+        match = request.resolver_match
+        if match is not None and match.view_name:
+            collector.record(match.view_name, latency_ms, timer.count, timer.sql_ms)
+        return response
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.9 on 2026-10-18 12:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MetricSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=50, unique=True, verbose_name='Grupo de métricas')),
+                ('data', models.JSONField(default=dict, verbose_name='Valores')),
+                ('computed_at', models.DateTimeField(verbose_name='Calculado el')),
+            ],
+            options={
+                'verbose_name': 'Snapshot de métricas',
+                'verbose_name_plural': 'Snapshots de métricas',
+            },
+        ),
+    ]
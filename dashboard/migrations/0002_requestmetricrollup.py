@@ -0,0 +1,43 @@
+# Generated by Django 5.2.9 on 2026-10-18 12:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RequestMetricRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket_start', models.DateTimeField(verbose_name='Inicio del periodo')),
+                ('view_name', models.CharField(max_length=200, verbose_name='Vista')),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='Peticiones')),
+                ('latency_sum_ms', models.FloatField(default=0)),
+                ('latency_max_ms', models.FloatField(default=0)),
+                ('queries_sum', models.PositiveBigIntegerField(default=0)),
+                ('queries_max', models.PositiveIntegerField(default=0)),
+                ('sql_ms_sum', models.FloatField(default=0)),
+                ('le_5', models.PositiveIntegerField(default=0)),
+                ('le_10', models.PositiveIntegerField(default=0)),
+                ('le_25', models.PositiveIntegerField(default=0)),
+                ('le_50', models.PositiveIntegerField(default=0)),
+                ('le_100', models.PositiveIntegerField(default=0)),
+                ('le_250', models.PositiveIntegerField(default=0)),
+                ('le_500', models.PositiveIntegerField(default=0)),
+                ('le_1000', models.PositiveIntegerField(default=0)),
+                ('le_2500', models.PositiveIntegerField(default=0)),
+                ('le_5000', models.PositiveIntegerField(default=0)),
+                ('le_inf', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Métrica de peticiones',
+                'verbose_name_plural': 'Métricas de peticiones',
+                'indexes': [models.Index(fields=['bucket_start', 'view_name'], name='requestmetric_bucket_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.9 on 2026-10-18 12:36
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0002_requestmetricrollup'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DoctorUtilizationDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Fecha')),
+                ('offered_slots', models.PositiveIntegerField(default=0, verbose_name='Slots ofrecidos')),
+                ('booked', models.PositiveIntegerField(default=0, verbose_name='Citas reservadas')),
+                ('completed', models.PositiveIntegerField(default=0, verbose_name='Citas completadas')),
+                ('canceled', models.PositiveIntegerField(default=0, verbose_name='Citas canceladas')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='utilization_days', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Ocupación diaria de médico',
+                'verbose_name_plural': 'Ocupación diaria de médicos',
+                'indexes': [models.Index(fields=['date'], name='utilization_date_idx')],
+                'constraints': [models.UniqueConstraint(fields=('doctor', 'date'), name='unique_utilization_per_doctor_date')],
+            },
+        ),
+    ]
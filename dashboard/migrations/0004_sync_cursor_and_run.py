@@ -0,0 +1,53 @@
+# Generated by Django 5.2.9 on 2026-10-18 12:39
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0003_doctorutilizationday'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncCursor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entity', models.CharField(max_length=50, unique=True, verbose_name='Entidad')),
+                ('last_updated_at', models.DateTimeField(blank=True, null=True, verbose_name='Último updated_at enviado')),
+                ('last_id', models.BigIntegerField(default=0, verbose_name='Último id enviado')),
+                ('last_synced_at', models.DateTimeField(blank=True, null=True, verbose_name='Último envío confirmado')),
+            ],
+            options={
+                'verbose_name': 'Cursor de sincronización',
+                'verbose_name_plural': 'Cursores de sincronización',
+            },
+        ),
+        migrations.CreateModel(
+            name='SyncRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('PENDING', 'Solicitada'), ('RUNNING', 'En curso'), ('SUCCEEDED', 'Completada'), ('FAILED', 'Fallida')], default='PENDING', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('heartbeat_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('total_pending', models.PositiveIntegerField(default=0, verbose_name='Registros pendientes al empezar')),
+                ('records_sent', models.PositiveIntegerField(default=0, verbose_name='Registros enviados')),
+                ('chunks_sent', models.PositiveIntegerField(default=0, verbose_name='Lotes enviados')),
+                ('bytes_raw', models.PositiveBigIntegerField(default=0, verbose_name='Bytes sin comprimir')),
+                ('bytes_sent', models.PositiveBigIntegerField(default=0, verbose_name='Bytes enviados')),
+                ('last_error', models.TextField(blank=True, verbose_name='Último error')),
+                ('requested_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Ejecución de sincronización',
+                'verbose_name_plural': 'Ejecuciones de sincronización',
+                'ordering': ('-created_at',),
+            },
+        ),
+    ]
@@ -1,3 +1,177 @@
+from django.conf import settings
 from django.db import models
 
-# Create your models here.
+
+class MetricSnapshot(models.Model):
+    """
+    Métricas precalculadas del panel del administrador, un registro por grupo
+    (usuarios, citas). Se mantienen desde dashboard.metrics.
+    """
+    key = models.CharField("Grupo de métricas", max_length=50, unique=True)
+    data = models.JSONField("Valores", default=dict)
+    computed_at = models.DateTimeField("Calculado el")
+
+    class Meta:
+        verbose_name = "Snapshot de métricas"
+        verbose_name_plural = "Snapshots de métricas"
+
+    def __str__(self):
+        return f"{self.key} ({self.computed_at:%Y-%m-%d %H:%M})"
+
+
+class RequestMetricRollup(models.Model):
+    """
+    Agregado de peticiones por vista y periodo de volcado, escrito por
+    dashboard.request_metrics. Las columnas le_* son el histograma de latencia
+    (peticiones con latencia <= N ms, sin acumular) para poder sumarlo en SQL.
+    """
+    bucket_start = models.DateTimeField("Inicio del periodo")
+    view_name = models.CharField("Vista", max_length=200)
+    count = models.PositiveIntegerField("Peticiones", default=0)
+    latency_sum_ms = models.FloatField(default=0)
+    latency_max_ms = models.FloatField(default=0)
+    queries_sum = models.PositiveBigIntegerField(default=0)
+    queries_max = models.PositiveIntegerField(default=0)
+    sql_ms_sum = models.FloatField(default=0)
+
+    le_5 = models.PositiveIntegerField(default=0)
+    le_10 = models.PositiveIntegerField(default=0)
+    le_25 = models.PositiveIntegerField(default=0)
+    le_50 = models.PositiveIntegerField(default=0)
+    le_100 = models.PositiveIntegerField(default=0)
+    le_250 = models.PositiveIntegerField(default=0)
+    le_500 = models.PositiveIntegerField(default=0)
+    le_1000 = models.PositiveIntegerField(default=0)
+    le_2500 = models.PositiveIntegerField(default=0)
+    le_5000 = models.PositiveIntegerField(default=0)
+    le_inf = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Métrica de peticiones"
+        verbose_name_plural = "Métricas de peticiones"
+        indexes = [
+            models.Index(fields=["bucket_start", "view_name"], name="requestmetric_bucket_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.view_name} @ {self.bucket_start:%Y-%m-%d %H:%M}: {self.count}"
+
+
+class DoctorUtilizationDay(models.Model):
+    """
+    Ocupación de la agenda de un médico en un día: slots ofrecidos según su
+    disponibilidad y citas reservadas, completadas y canceladas.
+    Se recalcula por rangos de fechas desde dashboard.utilization.
+    """
+    doctor = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="utilization_days",
+    )
+    date = models.DateField("Fecha")
+    offered_slots = models.PositiveIntegerField("Slots ofrecidos", default=0)
+    booked = models.PositiveIntegerField("Citas reservadas", default=0)
+    completed = models.PositiveIntegerField("Citas completadas", default=0)
+    canceled = models.PositiveIntegerField("Citas canceladas", default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Ocupación diaria de médico"
+        verbose_name_plural = "Ocupación diaria de médicos"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["doctor", "date"],
+                name="unique_utilization_per_doctor_date",
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["date"], name="utilization_date_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.doctor} - {self.date}: {self.booked}/{self.offered_slots}"
+
+
+class SyncCursor(models.Model):
+    """
+    Marca de agua de la sincronización externa para una entidad: el último
+    (updated_at, id) confirmado por el sistema externo (ver dashboard.external_sync).
+    """
+    entity = models.CharField("Entidad", max_length=50, unique=True)
+    last_updated_at = models.DateTimeField("Último updated_at enviado", null=True, blank=True)
+    last_id = models.BigIntegerField("Último id enviado", default=0)
+    last_synced_at = models.DateTimeField("Último envío confirmado", null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Cursor de sincronización"
+        verbose_name_plural = "Cursores de sincronización"
+
+    def __str__(self):
+        return f"{self.entity}: {self.last_updated_at} / {self.last_id}"
+
+
+class SyncRun(models.Model):
+    """
+    Una ejecución de la sincronización externa, con su progreso.
+    """
+    class Status(models.TextChoices):
+        PENDING = "PENDING", "Solicitada"
+        RUNNING = "RUNNING", "En curso"
+        SUCCEEDED = "SUCCEEDED", "Completada"
+        FAILED = "FAILED", "Fallida"
+
+    status = models.CharField(
+        max_length=20,
+        choices=Status.choices,
+        default=Status.PENDING,
+    )
+    requested_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+",
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    total_pending = models.PositiveIntegerField("Registros pendientes al empezar", default=0)
+    records_sent = models.PositiveIntegerField("Registros enviados", default=0)
+    chunks_sent = models.PositiveIntegerField("Lotes enviados", default=0)
+    bytes_raw = models.PositiveBigIntegerField("Bytes sin comprimir", default=0)
+    bytes_sent = models.PositiveBigIntegerField("Bytes enviados", default=0)
+    last_error = models.TextField("Último error", blank=True)
+
+    class Meta:
+        verbose_name = "Ejecución de sincronización"
+        verbose_name_plural = "Ejecuciones de sincronización"
+        ordering = ("-created_at",)
+
+    def __str__(self):
+        return f"Sincronización {self.pk} ({self.get_status_display()})"
+
+    @property
+    def elapsed_seconds(self):
+        if not self.started_at:
+            return None
+        end = self.finished_at or self.heartbeat_at or self.started_at
+        return (end - self.started_at).total_seconds()
+
+    @property
+    def throughput(self):
+        """
+        Registros por segundo desde el inicio de la ejecución.
+        """
+        elapsed = self.elapsed_seconds
+        return self.records_sent / elapsed if elapsed else None
+
+    @property
+    def progress_percent(self):
+        if not self.total_pending:
+            return 100 if self.status == self.Status.SUCCEEDED else 0
+        return min(100, self.records_sent * 100 / self.total_pending)
+
+    @property
+    def compression_ratio(self):
+        return self.bytes_raw / self.bytes_sent if self.bytes_sent else None
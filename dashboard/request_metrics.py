@@ -0,0 +1,215 @@
+# dashboard/request_metrics.py
+"""
+Métricas de peticiones por vista: latencia, número de consultas y tiempo SQL.
+
+RequestMetricsMiddleware mide cada petición (las consultas con el
+execute_wrapper de cada alias de base de datos) y la registra en el colector
+del proceso:
+- un histograma de latencia por vista con cubetas fijas (coste O(1) por petición),
+- un buffer circular con las últimas peticiones, para ver las más lentas recientes.
+
+Cada REQUEST_METRICS_FLUSH_SECONDS el colector vuelca los agregados, ya
+enviada la respuesta (request_finished), en RequestMetricRollup (una fila por
+vista y periodo) y el panel de uso del sistema calcula p50/p95/p99 sumando los histogramas de la ventana elegida.
+"""
+import logging
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError
+from django.db.models import Max, Sum
+from django.utils import timezone
+
+from .models import RequestMetricRollup
+
+logger = logging.getLogger(__name__)
+
+# Límites superiores (ms) de las cubetas del histograma; la última es +inf
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+BUCKET_FIELDS = tuple(f"le_{bound}" for bound in LATENCY_BUCKETS_MS) + ("le_inf",)
+
+REQUEST_METRICS_RING_SIZE = 500
+REQUEST_METRICS_RETENTION = timedelta(days=30)
+
+METRIC_WINDOWS = {
+    "1h": ("Última hora", timedelta(hours=1)),
+    "24h": ("Últimas 24 horas", timedelta(hours=24)),
+    "7d": ("Últimos 7 días", timedelta(days=7)),
+    "30d": ("Últimos 30 días", timedelta(days=30)),
+}
+DEFAULT_METRIC_WINDOW = "24h"
+
+
+def get_flush_interval():
+    return getattr(settings, "REQUEST_METRICS_FLUSH_SECONDS", 60)
+
+
+class QueryTimer:
+    """
+    execute_wrapper que cuenta las consultas de la petición y suma su duración.
+    """
+    __slots__ = ("count", "sql_ms")
+
+    def __init__(self):
+        self.count = 0
+        self.sql_ms = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.sql_ms += (time.perf_counter() - started) * 1000
+
+
+class _ViewStats:
+    __slots__ = ("count", "latency_sum_ms", "latency_max_ms", "queries_sum",
+                 "queries_max", "sql_ms_sum", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.latency_sum_ms = 0.0
+        self.latency_max_ms = 0.0
+        self.queries_sum = 0
+        self.queries_max = 0
+        self.sql_ms_sum = 0.0
+        self.buckets = [0] * len(BUCKET_FIELDS)
+
+
+class RequestMetricsCollector:
+    def __init__(self, ring_size=REQUEST_METRICS_RING_SIZE):
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._period_start = timezone.now()
+        self._last_flush = time.monotonic()
+        self.recent = deque(maxlen=ring_size)
+
+    def record(self, view_name, latency_ms, queries, sql_ms):
+        bucket = bisect_left(LATENCY_BUCKETS_MS, latency_ms)
+        with self._lock:
+            stats = self._stats.get(view_name)
+            if stats is None:
+                stats = self._stats[view_name] = _ViewStats()
+            stats.count += 1
+            stats.latency_sum_ms += latency_ms
+            stats.latency_max_ms = max(stats.latency_max_ms, latency_ms)
+            stats.queries_sum += queries
+            stats.queries_max = max(stats.queries_max, queries)
+            stats.sql_ms_sum += sql_ms
+            stats.buckets[bucket] += 1
+            self.recent.append((time.time(), view_name, latency_ms, queries, sql_ms))
+
+    def should_flush(self):
+        return time.monotonic() - self._last_flush >= get_flush_interval()
+
+    def flush(self):
+        """
+        Vuelca los agregados pendientes en RequestMetricRollup y borra las
+        filas más antiguas que la retención. Devuelve el número de filas escritas.
+        """
+        now = timezone.now()
+        with self._lock:
+            stats, self._stats = self._stats, {}
+            period_start, self._period_start = self._period_start, now
+            self._last_flush = time.monotonic()
+
+        rows = [
+            RequestMetricRollup(
+                bucket_start=period_start,
+                view_name=view_name,
+                count=item.count,
+                latency_sum_ms=item.latency_sum_ms,
+                latency_max_ms=item.latency_max_ms,
+                queries_sum=item.queries_sum,
+                queries_max=item.queries_max,
+                sql_ms_sum=item.sql_ms_sum,
+                **dict(zip(BUCKET_FIELDS, item.buckets)),
+            )
+            for view_name, item in stats.items()
+        ]
+        try:
+            RequestMetricRollup.objects.bulk_create(rows)
+            RequestMetricRollup.objects.filter(bucket_start__lt=now - REQUEST_METRICS_RETENTION).delete()
+        except DatabaseError:
+            # Las métricas nunca deben tumbar una petición
+            logger.exception("No se pudieron guardar las métricas de peticiones.")
+            return 0
+        return len(rows)
+
+    def slowest_recent(self, limit=10):
+        with self._lock:
+            samples = list(self.recent)
+        return sorted(samples, key=lambda sample: sample[2], reverse=True)[:limit]
+
+
+collector = RequestMetricsCollector()
+
+
+def histogram_percentile(counts, percentile, max_value):
+    """
+    Percentil aproximado a partir de las cubetas, interpolando dentro de la cubeta.
+    La última cubeta (sin límite superior) usa la latencia máxima observada.
+    """
+    total = sum(counts)
+    if not total:
+        return None
+    rank = percentile * total
+    cumulative = 0
+    lower = 0.0
+    for upper, count in zip(LATENCY_BUCKETS_MS + (None,), counts):
+        if count and cumulative + count >= rank:
+            upper = max_value if upper is None else min(upper, max_value)
+            upper = max(upper, lower)
+            return lower + (upper - lower) * (rank - cumulative) / count
+        cumulative += count
+        if upper is not None:
+            lower = float(upper)
+    return max_value
+
+
+def _summarize(row):
+    counts = [row[field] or 0 for field in BUCKET_FIELDS]
+    requests = row["requests"] or 0
+    return {
+        "view_name": row.get("view_name"),
+        "requests": requests,
+        "p50_ms": histogram_percentile(counts, 0.50, row["latency_max"]),
+        "p95_ms": histogram_percentile(counts, 0.95, row["latency_max"]),
+        "p99_ms": histogram_percentile(counts, 0.99, row["latency_max"]),
+        "avg_ms": row["latency_sum"] / requests if requests else None,
+        "max_ms": row["latency_max"],
+        "total_s": (row["latency_sum"] or 0) / 1000,
+        "avg_queries": row["queries_sum"] / requests if requests else None,
+        "max_queries": row["queries_max"],
+        "avg_sql_ms": row["sql_ms_sum"] / requests if requests else None,
+    }
+
+
+def get_view_metrics(window):
+    """
+    Devuelve (resumen global, [resumen por vista ordenado por p95 desc])
+    para la ventana dada (timedelta). Una consulta agregada por lista.
+    """
+    aggregates = {
+        "requests": Sum("count"),
+        "latency_sum": Sum("latency_sum_ms"),
+        "latency_max": Max("latency_max_ms"),
+        "queries_sum": Sum("queries_sum"),
+        "queries_max": Max("queries_max"),
+        "sql_ms_sum": Sum("sql_ms_sum"),
+        **{field: Sum(field) for field in BUCKET_FIELDS},
+    }
+    queryset = RequestMetricRollup.objects.filter(bucket_start__gte=timezone.now() - window)
+
+    overall = _summarize(queryset.aggregate(**aggregates))
+    per_view = [
+        _summarize(row)
+        for row in queryset.values("view_name").annotate(**aggregates).order_by()
+    ]
+    per_view.sort(key=lambda item: item["p95_ms"] or 0, reverse=True)
+    return overall, per_view
@@ -0,0 +1,113 @@
+# dashboard/roles.py
+"""
+Cambio de rol de uno o varios usuarios desde la gestión de usuarios.
+
+Las comprobaciones se hacen para todo el lote con una consulta cada una, en
+la misma transacción que el cambio y con las filas de los usuarios bloqueadas:
+- ningún médico degradado puede tener citas futuras activas,
+- los nuevos médicos sin disponibilidad reciben la franja por defecto
+  (bulk_create de todas las filas a la vez).
+"""
+from datetime import time
+
+from django.db import transaction
+from django.utils import timezone
+
+from accounts.models import User
+from accounts.user_cache import invalidate_cached_users
+from scheduling.directory import bump_directory_version
+from scheduling.models import Appointment, DoctorAvailability
+from scheduling.schedule_index import bump_doctor_version
+from scheduling.summaries import refresh_slot_summaries
+
+from .metrics import USERS, mark_metrics_dirty
+
+DEFAULT_AVAILABILITY_WEEKDAYS = (
+    DoctorAvailability.Weekday.MONDAY,
+    DoctorAvailability.Weekday.TUESDAY,
+    DoctorAvailability.Weekday.WEDNESDAY,
+    DoctorAvailability.Weekday.THURSDAY,
+    DoctorAvailability.Weekday.FRIDAY,
+)
+DEFAULT_AVAILABILITY_START = time(8, 0)
+DEFAULT_AVAILABILITY_END = time(12, 0)
+
+
+class RoleChangeError(Exception):
+    """
+    El cambio de rol no se puede aplicar; no se modificó ningún usuario.
+    """
+
+
+def change_user_roles(acting_user, users, new_role):
+    """
+    Aplica `new_role` a los usuarios dados (todo o nada).
+    Devuelve (usuarios cambiados, médicos que recibieron disponibilidad por defecto).
+    """
+    if new_role != User.Roles.ADMIN and any(user.pk == acting_user.pk for user in users):
+        raise RoleChangeError("No puedes cambiar tu propio rol a uno distinto de Administrador.")
+
+    with transaction.atomic():
+        # Las comprobaciones se hacen con los usuarios bloqueados: una reserva que
+        # inserta una cita para uno de estos médicos espera a que termine el cambio
+        # (la clave foránea bloquea su fila), y una que ya confirmó se ve aquí
+        users = list(
+            User.objects
+            .select_for_update()
+            .filter(pk__in=[user.pk for user in users])
+            .exclude(role=new_role)
+            .order_by("pk")
+        )
+        if not users:
+            return [], []
+
+        demoted_ids = [user.pk for user in users if user.role == User.Roles.DOCTOR]
+        if demoted_ids:
+            conflicting_ids = set(
+                Appointment.objects
+                .filter(doctor_id__in=demoted_ids, scheduled_datetime__gte=timezone.now())
+                .exclude(status=Appointment.Status.CANCELED)
+                .values_list("doctor_id", flat=True)
+                .distinct()
+            )
+            if conflicting_ids:
+                names = ", ".join(sorted(user.username for user in users if user.pk in conflicting_ids))
+                raise RoleChangeError(
+                    f"No puedes cambiar el rol de {names} porque tiene(n) citas futuras asignadas. "
+                    "Cancela o reasigna esas citas antes de cambiar su rol."
+                )
+
+        new_doctors = []
+        if new_role == User.Roles.DOCTOR:
+            with_availability = set(
+                DoctorAvailability.objects
+                .filter(doctor__in=users, is_active=True)
+                .values_list("doctor_id", flat=True)
+                .distinct()
+            )
+            new_doctors = [user for user in users if user.pk not in with_availability]
+
+        User.objects.filter(pk__in=[user.pk for user in users]).update(role=new_role)
+        DoctorAvailability.objects.bulk_create(
+            DoctorAvailability(
+                doctor=doctor,
+                weekday=weekday,
+                start_time=DEFAULT_AVAILABILITY_START,
+                end_time=DEFAULT_AVAILABILITY_END,
+                is_active=True,
+            )
+            for doctor in new_doctors
+            for weekday in DEFAULT_AVAILABILITY_WEEKDAYS
+        )
+
+    for user in users:
+        user.role = new_role
+    # update() y bulk_create() no disparan señales: invalidamos a mano
+    mark_metrics_dirty(USERS)
+    invalidate_cached_users(*(user.pk for user in users))
+    if new_role == User.Roles.DOCTOR or demoted_ids:
+        bump_directory_version()
+    for doctor in new_doctors:
+        bump_doctor_version(doctor.pk)
+        refresh_slot_summaries(doctor)
+    return users, new_doctors
@@ -0,0 +1,41 @@
+# dashboard/signals.py
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from accounts.models import User
+from clinical.models import Consultation
+from scheduling.models import Appointment
+
+from .agenda import AGENDA_IGNORED_FIELDS, invalidate_agendas
+from .metrics import APPOINTMENTS, USERS, mark_metrics_dirty
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_metrics(sender, instance, update_fields=None, **kwargs):
+    # El inicio de sesión solo toca last_login: no cambia los conteos
+    if update_fields and set(update_fields) <= {"last_login"}:
+        return
+    mark_metrics_dirty(USERS)
+
+
+@receiver(post_save, sender=Appointment)
+@receiver(post_delete, sender=Appointment)
+def invalidate_appointment_metrics(sender, instance, **kwargs):
+    mark_metrics_dirty(APPOINTMENTS)
+
+
+@receiver(post_save, sender=Appointment)
+@receiver(post_delete, sender=Appointment)
+def invalidate_appointment_agendas(sender, instance, update_fields=None, **kwargs):
+    # La reserva de la sala de vídeo solo toca campos que el panel no muestra
+    if update_fields and set(update_fields) <= AGENDA_IGNORED_FIELDS:
+        return
+    invalidate_agendas(instance.patient_id, instance.doctor_id)
+
+
+@receiver(post_save, sender=Consultation)
+@receiver(post_delete, sender=Consultation)
+def invalidate_consultation_agenda(sender, instance, **kwargs):
+    # Solo el panel del paciente muestra su última consulta
+    invalidate_agendas(instance.appointment.patient_id)
@@ -1,3 +1,1032 @@
-from django.test import TestCase
+import csv
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+from datetime import datetime, time, timedelta
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.signals import request_finished
+from django.db import DEFAULT_DB_ALIAS, close_old_connections, connection, connections, transaction
+from django.db.models import Sum
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import User
+from clinical.models import Consultation
+from SaludConectada.database import (
+    DB_CONN_MAX_AGE,
+    SQLITE_BUSY_TIMEOUT_MS,
+    SQLITE_CACHE_SIZE_KIB,
+    database_from_env,
+    sqlite_init_command,
+)
+from SaludConectada.db_routing import (
+    _PRIMARY,
+    REPLICA_DB_ALIAS,
+    _read_target,
+    pin_primary,
+    replica_configured,
+    use_replica,
+)
+from scheduling.booking import SlotUnavailableError, book_appointment
+from scheduling.directory import build_availability_directory
+from scheduling.models import Appointment, ArchivedAppointment, DoctorAvailability
+from scheduling.room_cleanup import expired_room_appointments
+from scheduling.summaries import get_slot_summary_calendar
+from scheduling.utils import find_earliest_available_slots, get_available_slots_over_range
+
+from .agenda import build_doctor_agenda, build_patient_agenda, get_doctor_agenda, get_patient_agenda
+from .exports import stream_csv
+from .external_sync import EXTERNAL_SYNC_SETTLE_SECONDS, claim_run, pending_counts, run_sync
+from .fake_his import FakeHealthRecordServer
+from .management.commands.benchmark_suite import QUERY_BUDGETS
+from .management.commands.generate_synthetic_data import SYNTH_PREFIX
+from .management.commands.benchmark_suite import Command as BenchmarkSuiteCommand
+from .metrics import (
+    APPOINTMENTS,
+    METRIC_GROUPS,
+    METRICS_MAX_AGE,
+    METRICS_MIN_REFRESH_SECONDS,
+    USERS,
+    get_dashboard_metrics,
+    refresh_metrics,
+)
+from .middleware import RequestMetricsMiddleware
+from .models import DoctorUtilizationDay, MetricSnapshot, RequestMetricRollup, SyncRun
+from .request_metrics import BUCKET_FIELDS, RequestMetricsCollector, histogram_percentile
+from .roles import DEFAULT_AVAILABILITY_WEEKDAYS, RoleChangeError, change_user_roles
+from .utilization import ACTIVE_STATUSES, appointment_counts, refresh_utilization, refresh_utilization_window
+
+
+def make_user(name, role, **extra):
+    return User.objects.create_user(
+        username=name, email=f"{name}@example.com", role=role, **extra,
+    )
+
+
+class ReadTargetDecoratorTests(SimpleTestCase):
+    def test_decorator_is_safe_across_threads(self):
+        # Todos los hilos entran antes de que ninguno salga: con el token guardado
+        # en la instancia compartida, cada salida restauraba el de otro hilo
+        threads_count = 4
+        barrier = threading.Barrier(threads_count)
+        errors = []
+        targets = []
+
+        @pin_primary()
+        def locked_path():
+            barrier.wait(timeout=5)
+            targets.append(_read_target.get())
+
+        def worker():
+            try:
+                with use_replica():
+                    locked_path()
+            except Exception as exc:  # noqa: BLE001 - el test recoge cualquier fallo del hilo
+                errors.append(exc)
+
+        threads = [threading.Thread(target=worker) for _ in range(threads_count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(targets, [_PRIMARY] * threads_count)
+
+    def test_decorator_restores_previous_target(self):
+        @pin_primary()
+        def locked_path():
+            return _read_target.get()
+
+        with use_replica():
+            self.assertEqual(locked_path(), _PRIMARY)
+            self.assertEqual(locked_path(), _PRIMARY)
+            self.assertEqual(_read_target.get(), "replica")
+        self.assertIsNone(_read_target.get())
+
+
+@skipUnless(connection.vendor == "sqlite", "la réplica local se copia con sync_local_replica (solo SQLite)")
+@override_settings(REQUEST_METRICS_ENABLED=False)
+class ReplicaRoutingTests(TransactionTestCase):
+    """
+    Enrutado con una réplica desfasada: un segundo alias SQLite que solo se
+    actualiza con sync_local_replica. Las lecturas opt-in van a la réplica; las
+    escrituras, transacciones, sesiones y rutas de reserva, a la principal.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # El alias se registra después de preparar la clase, así el runner no
+        # crea una base de tests para él: sync_local_replica lo rellena copiando la principal
+        cls._replica_dir = tempfile.TemporaryDirectory()
+        connections.settings[REPLICA_DB_ALIAS] = {
+            **connections[DEFAULT_DB_ALIAS].settings_dict,
+            "NAME": os.path.join(cls._replica_dir.name, "replica.sqlite3"),
+        }
+        cls.databases = cls.databases | {REPLICA_DB_ALIAS}
+
+    @classmethod
+    def tearDownClass(cls):
+        connections[REPLICA_DB_ALIAS].close()
+        del connections[REPLICA_DB_ALIAS]
+        del connections.settings[REPLICA_DB_ALIAS]
+        cls._replica_dir.cleanup()
+        cls.databases = cls.databases - {REPLICA_DB_ALIAS}
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self._sync()
+        # Creados después de copiar: la réplica aún no los tiene
+        self.admin = make_user("replica_admin", User.Roles.ADMIN)
+        self.doctor = make_user("replica_doctor", User.Roles.DOCTOR)
+        self.patient = make_user("replica_patient", User.Roles.PATIENT)
+        DoctorAvailability.objects.bulk_create(
+            DoctorAvailability(doctor=self.doctor, weekday=weekday, start_time=time(8), end_time=time(12))
+            for weekday in range(7)
+        )
+
+    def _sync(self):
+        call_command("sync_local_replica", stdout=StringIO())
+
+    def _admin_exists(self):
+        return User.objects.filter(pk=self.admin.pk).exists()
+
+    def test_opt_in_reads_go_to_replica(self):
+        self.assertTrue(replica_configured())
+        with use_replica():
+            self.assertFalse(self._admin_exists())
+        self.assertTrue(self._admin_exists())
+
+    def test_pin_primary_inside_use_replica(self):
+        with use_replica(), pin_primary(), use_replica():
+            self.assertTrue(self._admin_exists())
+
+    def test_open_transaction_reads_primary(self):
+        with use_replica(), transaction.atomic():
+            self.assertTrue(self._admin_exists())
+
+    def test_writes_go_to_primary(self):
+        with use_replica():
+            written = make_user("replica_written", User.Roles.PATIENT)
+        self.assertTrue(User.objects.using(DEFAULT_DB_ALIAS).filter(pk=written.pk).exists())
+
+    def test_booking_and_cancel_use_primary(self):
+        tomorrow = timezone.localdate() + timedelta(days=1)
+        slot = timezone.make_aware(datetime.combine(tomorrow, time(8)))
+        # El médico y el paciente solo existen en la principal
+        with use_replica():
+            appointment = book_appointment(self.patient, self.doctor, slot, reason="Réplica")
+            appointment.cancel()
+        appointment.refresh_from_db()
+        self.assertEqual(appointment.status, Appointment.Status.CANCELED)
+
+    def test_reports_view_reads_replica(self):
+        # La sesión y el usuario se resuelven en la principal aunque la réplica no los tenga
+        self.client.force_login(self.admin)
+        with CaptureQueriesContext(connections[REPLICA_DB_ALIAS]) as replica_queries:
+            response = self.client.get(reverse("dashboard:reports"))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(replica_queries)
+
+    def test_streaming_export_reads_replica(self):
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse("dashboard:reports_export", args=["csv"]))
+        self.assertEqual(response.status_code, 200)
+        with CaptureQueriesContext(connections[REPLICA_DB_ALIAS]) as replica_queries:
+            b"".join(response.streaming_content)
+        self.assertTrue(replica_queries)
+
+    def test_replica_after_sync(self):
+        self._sync()
+        with use_replica():
+            self.assertTrue(self._admin_exists())
+
+    def test_request_metrics_count_replica_queries(self):
+        metrics = RequestMetricsCollector()
+        with self.settings(REQUEST_METRICS_ENABLED=True), \
+                mock.patch("dashboard.middleware.collector", metrics):
+            client = self.client_class()
+            client.force_login(self.admin)
+            with CaptureQueriesContext(connections[DEFAULT_DB_ALIAS]) as primary_queries, \
+                    CaptureQueriesContext(connections[REPLICA_DB_ALIAS]) as replica_queries:
+                client.get(reverse("dashboard:reports"))
+        self.assertTrue(replica_queries)
+        _, view_name, _, queries, _ = metrics.recent[-1]
+        self.assertEqual(view_name, "dashboard:reports")
+        self.assertEqual(queries, len(primary_queries) + len(replica_queries))
+
+
+class DatabaseSettingsTests(SimpleTestCase):
+    """
+    DATABASES a partir de variables de entorno (SaludConectada.database).
+    """
+
+    def test_sqlite_defaults(self):
+        database = database_from_env("/srv/db.sqlite3", env={})
+        self.assertEqual(database["OPTIONS"]["transaction_mode"], "IMMEDIATE")
+        self.assertEqual(database["OPTIONS"]["init_command"], sqlite_init_command())
+        self.assertIn("PRAGMA journal_mode=WAL", database["OPTIONS"]["init_command"])
+        self.assertEqual(database["CONN_MAX_AGE"], DB_CONN_MAX_AGE)
+        self.assertEqual(database["TEST"], {"NAME": "/srv/test_db.sqlite3"})
+
+    def test_sqlite_env_overrides(self):
+        database = database_from_env("/srv/db.sqlite3", env={
+            "SQLITE_PATH": "/data/app.sqlite3", "SQLITE_BUSY_TIMEOUT_MS": "500", "DB_CONN_MAX_AGE": "0",
+        })
+        self.assertEqual(str(database["NAME"]), "/data/app.sqlite3")
+        self.assertIn("PRAGMA busy_timeout=500", database["OPTIONS"]["init_command"])
+        self.assertEqual(database["CONN_MAX_AGE"], 0)
+
+    def test_postgresql_pool(self):
+        database = database_from_env("/srv/db.sqlite3", env={"DB_ENGINE": "postgresql", "DB_POOL_MIN_SIZE": "50"})
+        self.assertEqual(database["CONN_MAX_AGE"], 0)
+        self.assertEqual(database["OPTIONS"]["pool"]["min_size"], database["OPTIONS"]["pool"]["max_size"])
+        without_pool = database_from_env("", env={"DB_ENGINE": "postgresql", "DB_POOL_MAX_SIZE": "0"})
+        self.assertNotIn("pool", without_pool["OPTIONS"])
+        with self.assertRaises(ValueError):
+            database_from_env("", env={"DB_ENGINE": "mysql"})
+
+
+@skipUnless(connection.vendor == "sqlite", "PRAGMAs y transacciones IMMEDIATE solo en SQLite")
+@override_settings(REQUEST_METRICS_ENABLED=False)
+class SQLiteConnectionTests(TransactionTestCase):
+    """
+    Cada conexión SQLite nueva aplica los PRAGMAs de init_command y las
+    transacciones toman el bloqueo de escritura desde el BEGIN.
+    """
+
+    def _pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f"PRAGMA {name}")
+            return cursor.fetchone()[0]
+
+    def test_new_connections_apply_pragmas(self):
+        connection.close()
+        self.assertEqual(self._pragma("journal_mode"), "wal")
+        self.assertEqual(self._pragma("busy_timeout"), SQLITE_BUSY_TIMEOUT_MS)
+        self.assertEqual(self._pragma("synchronous"), 1)  # NORMAL
+        self.assertEqual(self._pragma("cache_size"), -SQLITE_CACHE_SIZE_KIB)
+        self.assertEqual(self._pragma("temp_store"), 2)  # MEMORY
+
+    def test_transactions_take_the_write_lock_at_begin(self):
+        other = sqlite3.connect(connection.settings_dict["NAME"], timeout=0)
+        self.addCleanup(other.close)
+        with transaction.atomic():
+            # Solo lecturas: con DEFERRED otra conexión aún podría empezar a escribir
+            User.objects.exists()
+            with self.assertRaisesRegex(sqlite3.OperationalError, "locked"):
+                other.execute("BEGIN IMMEDIATE")
+        other.execute("BEGIN IMMEDIATE")
+        other.rollback()
+
+
+class StreamCsvTests(SimpleTestCase):
+    def test_formula_cells_are_escaped(self):
+        rows = [(7, "=HYPERLINK(\"http://example.com\")", "+34 600", "-1", "@SUM(A1)", "\tx", "Control")]
+        lines = "".join(stream_csv(rows)).splitlines()
+        self.assertEqual(
+            next(csv.reader(lines[1:])),
+            ["7", "'=HYPERLINK(\"http://example.com\")", "'+34 600", "'-1", "'@SUM(A1)", "'\tx", "Control"],
+        )
+
+# Tablas grandes: ninguna consulta caliente debe recorrerlas enteras
+WATCHED_TABLES = (
+    "scheduling_appointment",
+    "scheduling_archivedappointment",
+    "scheduling_doctoravailability",
+    "scheduling_dailyslotsummary",
+    "clinical_consultation",
+    "dashboard_doctorutilizationday",
+    "accounts_user",
+)
+
+# Índices que cada caso debe usar: si el planificador vuelve a uno más amplio
+# (p. ej. todo el historial del paciente en lugar de las próximas citas) es una regresión
+EXPECTED_INDEXES = {
+    "slots_over_range": {"availability_active_idx", "appointment_doctor_sched_idx"},
+    "patient_dashboard": {"appointment_patient_next_idx"},
+    "doctor_dashboard": {"appointment_doctor_next_idx"},
+    "patient_appointments": {"appointment_patient_sched_idx"},
+    "patient_appointments_past": {"appointment_patient_sched_idx", "archived_patient_sched_idx"},
+    "doctor_appointments": {"appointment_doctor_sched_idx"},
+    "reports_by_date": {"appointment_sched_idx", "archived_sched_idx"},
+    "utilization_refresh": {"appointment_sched_idx", "archived_sched_idx"},
+    "external_sync_pending": {"appointment_updated_idx", "consultation_updated_idx"},
+    "room_cleanup": {"appointment_with_room_idx"},
+}
+
+# SQLite: "SCAN tabla" o "SCAN tabla USING [COVERING] INDEX x" recorren todo
+_SQLITE_SCAN = re.compile(r"\bSCAN (\w+)")
+# PostgreSQL (con enable_seqscan = off, un Seq Scan significa que no hay índice utilizable)
+_POSTGRES_SCAN = re.compile(r"Seq Scan on (\w+)")
+
+
+@skipUnless(connection.vendor in ("sqlite", "postgresql"), "EXPLAIN solo para SQLite y PostgreSQL")
+@override_settings(REQUEST_METRICS_ENABLED=False, SCHEDULING_SCHEDULE_INDEX=False)
+class QueryPlanTests(TestCase):
+    """
+    Ejecuta los caminos críticos, obtiene el plan (EXPLAIN) de cada consulta que
+    lanzan y comprueba que ninguna recorre entera una tabla grande y que cada
+    caso usa el índice previsto.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = make_user("plan_admin", User.Roles.ADMIN)
+        cls.doctor = make_user("plan_doctor", User.Roles.DOCTOR)
+        cls.patient = make_user("plan_patient", User.Roles.PATIENT)
+        DoctorAvailability.objects.bulk_create(
+            DoctorAvailability(doctor=cls.doctor, weekday=weekday, start_time=time(8), end_time=time(12))
+            for weekday in range(7)
+        )
+        now = timezone.now()
+        base = timezone.make_aware(datetime.combine(timezone.localdate(), time(8)))
+        for days, status in (
+            (-400, Appointment.Status.COMPLETED),
+            (-10, Appointment.Status.COMPLETED),
+            (-5, Appointment.Status.CANCELED),
+            (3, Appointment.Status.CONFIRMED),
+            (4, Appointment.Status.PENDING),
+        ):
+            appointment = Appointment.objects.create(
+                patient=cls.patient, doctor=cls.doctor, status=status,
+                scheduled_datetime=base + timedelta(days=days),
+                video_call_url="https://example.daily.co/plan" if days < 0 else None,
+            )
+            if status == Appointment.Status.COMPLETED:
+                Consultation.objects.create(appointment=appointment, doctor_notes="Plan.")
+        ArchivedAppointment.objects.create(
+            id=10_000_000, patient=cls.patient, doctor=cls.doctor,
+            scheduled_datetime=now - timedelta(days=800), status=Appointment.Status.COMPLETED,
+            created_at=now, updated_at=now,
+        )
+
+    def setUp(self):
+        self.today = timezone.localdate()
+
+    def _client(self, user):
+        client = self.client_class()
+        client.force_login(user)
+        return client
+
+    def _explain(self, sql):
+        with connection.cursor() as cursor:
+            if connection.vendor == "sqlite":
+                cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+                return [row[-1] for row in cursor.fetchall()]
+            with transaction.atomic():
+                cursor.execute("SET LOCAL enable_seqscan = off")
+                cursor.execute(f"EXPLAIN {sql}")
+                return [row[0] for row in cursor.fetchall()]
+
+    def _full_scans(self, plan):
+        pattern = _SQLITE_SCAN if connection.vendor == "sqlite" else _POSTGRES_SCAN
+        return {
+            match.group(1)
+            for line in plan
+            for match in pattern.finditer(line)
+            if match.group(1) in WATCHED_TABLES
+        }
+
+    def _cases(self):
+        """
+        {nombre: (función que ejecuta el camino crítico, tablas que puede recorrer enteras)}
+        """
+        patient_client = self._client(self.patient)
+        doctor_client = self._client(self.doctor)
+        admin_client = self._client(self.admin)
+
+        def page(client, url_name, params=None):
+            url = reverse(url_name)
+
+            def run():
+                response = client.get(url, params or {})
+                self.assertEqual(response.status_code, 200, url)
+            return run
+
+        tomorrow = self.today + timedelta(days=1)
+
+        def booking():
+            slots = get_available_slots_over_range(self.doctor, tomorrow, 28)
+            slot = next(slot for day_slots in slots.values() for slot in day_slots)
+            # La reserva se deshace: solo interesan sus consultas
+            with transaction.atomic():
+                try:
+                    book_appointment(self.patient, self.doctor, slot[0], reason="plan")
+                except SlotUnavailableError:
+                    pass
+                transaction.set_rollback(True)
+
+        def room_cleanup():
+            list(
+                expired_room_appointments()
+                .order_by("scheduled_datetime", "id")
+                .values_list("id", flat=True)[:100]
+            )
+
+        report_range = {
+            "date_from": (self.today - timedelta(days=30)).isoformat(),
+            "date_to": self.today.isoformat(),
+        }
+        return {
+            "slots_over_range": (
+                lambda: get_available_slots_over_range(self.doctor, tomorrow, 14), set(),
+            ),
+            # Lee todas las franjas activas de todos los médicos: el recorrido es inherente
+            "earliest_slots": (
+                lambda: find_earliest_available_slots(limit=10), {"scheduling_doctoravailability"},
+            ),
+            # Directorio del paso 1 (sin caché): todas las franjas activas de todos los médicos
+            "availability_directory": (
+                build_availability_directory, {"scheduling_doctoravailability"},
+            ),
+            "booking": (booking, set()),
+            "slot_summary_calendar": (
+                lambda: get_slot_summary_calendar(self.doctor, tomorrow, 14), set(),
+            ),
+            "patient_dashboard": (page(patient_client, "dashboard:patient_dashboard"), set()),
+            "doctor_dashboard": (page(doctor_client, "dashboard:doctor_dashboard"), set()),
+            "patient_appointments": (page(patient_client, "scheduling:patient_appointments"), set()),
+            "patient_appointments_past": (
+                page(patient_client, "scheduling:patient_appointments", {"scope": "past"}), set(),
+            ),
+            "doctor_appointments": (page(doctor_client, "scheduling:doctor_appointments"), set()),
+            "reports_by_date": (page(admin_client, "dashboard:reports", report_range), set()),
+            "reports_by_doctor": (
+                page(admin_client, "dashboard:reports", {"doctor": self.doctor.pk}), set(),
+            ),
+            "utilization_refresh": (
+                lambda: appointment_counts(self.today - timedelta(days=31), self.today), set(),
+            ),
+            "doctor_utilization": (page(admin_client, "dashboard:doctor_utilization"), set()),
+            "external_sync_pending": (
+                lambda: pending_counts(timezone.now() - timedelta(seconds=EXTERNAL_SYNC_SETTLE_SECONDS)),
+                set(),
+            ),
+            "room_cleanup": (room_cleanup, set()),
+            "manage_users_search": (
+                page(admin_client, "dashboard:manage_users", {"q": "plan_"}), set(),
+            ),
+        }
+
+    def test_hot_queries_use_their_indexes(self):
+        for name, (run, allowed) in self._cases().items():
+            with self.subTest(case=name):
+                # Sin agendas ni directorios cacheados: interesan las consultas que los construyen
+                cache.clear()
+                with CaptureQueriesContext(connection) as captured:
+                    run()
+                used = set()
+                for query in captured.captured_queries:
+                    sql = query["sql"]
+                    if not sql.lstrip().upper().startswith("SELECT"):
+                        continue
+                    plan = self._explain(sql)
+                    used.update(re.findall(r"\w+_idx\b", " ".join(plan)))
+                    scans = self._full_scans(plan) - allowed
+                    self.assertFalse(scans, f"{sql[:160]}\n" + "\n".join(plan))
+                missing = EXPECTED_INDEXES.get(name, set()) - used
+                self.assertFalse(missing, f"{name} no usa {', '.join(sorted(missing))}")
+
+
+@override_settings(ALLOWED_HOSTS=["*"], REQUEST_METRICS_ENABLED=False)
+class QueryBudgetTests(TransactionTestCase):
+    """
+    Los presupuestos de consultas de benchmark_suite, exactos: cada caso se
+    ejecuta una vez en caliente (como en el benchmark) y luego se cuenta.
+    Sin la transacción envolvente de TestCase, para contar también BEGIN y COMMIT
+    de las escrituras y ejecutar las tareas on_commit como en el benchmark.
+    """
+
+    def setUp(self):
+        cache.clear()
+        # A las 6:00 todos los slots de hoy siguen libres: los primeros salen del primer tramo
+        morning = timezone.make_aware(datetime.combine(timezone.localdate(), time(6)))
+        patcher = mock.patch("django.utils.timezone.now", return_value=morning)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        # Nombres sintéticos: el caso manage_users busca por SYNTH_PREFIX
+        doctors = [make_user(f"{SYNTH_PREFIX}budget_doctor_{i}", User.Roles.DOCTOR) for i in range(3)]
+        DoctorAvailability.objects.bulk_create(
+            DoctorAvailability(doctor=doctor, weekday=weekday, start_time=time(8), end_time=time(12))
+            for doctor in doctors
+            for weekday in range(7)
+        )
+        patient = make_user(f"{SYNTH_PREFIX}budget_patient", User.Roles.PATIENT)
+        Appointment.objects.bulk_create(
+            Appointment(
+                patient=patient, doctor=doctor, status=Appointment.Status.COMPLETED,
+                scheduled_datetime=morning - timedelta(days=days),
+            )
+            for doctor in doctors
+            for days in (3, 40)
+        )
+        refresh_utilization_window()
+
+    def test_cases_match_their_budgets(self):
+        command = BenchmarkSuiteCommand()
+        command._setup()
+        for name, run in command._cases().items():
+            with self.subTest(case=name):
+                if name != "booking":
+                    run()
+                with self.assertNumQueries(QUERY_BUDGETS[name]):
+                    run()
+        self.assertEqual(set(command._cases()), set(QUERY_BUDGETS))
+
+
+@override_settings(REQUEST_METRICS_ENABLED=False)
+class DashboardMetricsTests(TestCase):
+    """
+    Snapshots de métricas del panel: se leen con una consulta, las señales los
+    marcan como sucios y solo se recalculan pasado METRICS_MIN_REFRESH_SECONDS
+    o al caducar.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = make_user("metrics_doctor", User.Roles.DOCTOR)
+        cls.patient = make_user("metrics_patient", User.Roles.PATIENT)
+
+    def setUp(self):
+        cache.clear()
+        get_dashboard_metrics()
+
+    def _age(self, seconds):
+        MetricSnapshot.objects.update(computed_at=timezone.now() - timedelta(seconds=seconds))
+
+    def _book(self):
+        Appointment.objects.create(
+            patient=self.patient, doctor=self.doctor, scheduled_datetime=timezone.now() + timedelta(days=1),
+        )
+
+    def test_fresh_snapshots_use_one_query(self):
+        with self.assertNumQueries(1):
+            metrics = get_dashboard_metrics()
+        self.assertEqual(metrics[USERS].data["doctor"], 1)
+        self.assertEqual(metrics[APPOINTMENTS].data["total"], 0)
+
+    def test_dirty_group_waits_for_min_refresh(self):
+        self._book()
+        # Recién calculado: una ráfaga de cambios no recalcula en cada visita
+        with self.assertNumQueries(1):
+            self.assertEqual(get_dashboard_metrics()[APPOINTMENTS].data["total"], 0)
+
+        self._age(METRICS_MIN_REFRESH_SECONDS)
+        metrics = get_dashboard_metrics()
+        self.assertEqual(metrics[APPOINTMENTS].data["total"], 1)
+        self.assertEqual(metrics[APPOINTMENTS].data["pending"], 1)
+        # Solo el grupo sucio se recalculó; el flag queda limpio
+        self.assertLess(metrics[USERS].computed_at, metrics[APPOINTMENTS].computed_at)
+        with self.assertNumQueries(1):
+            get_dashboard_metrics()
+
+    def test_clean_group_refreshes_only_when_expired(self):
+        self._age(METRICS_MIN_REFRESH_SECONDS)
+        with self.assertNumQueries(1):
+            get_dashboard_metrics()
+        self._age(METRICS_MAX_AGE.total_seconds())
+        before = timezone.now()
+        metrics = get_dashboard_metrics()
+        self.assertTrue(all(snapshot.computed_at >= before for snapshot in metrics.values()))
+
+    def test_change_during_refresh_stays_dirty(self):
+        compute = METRIC_GROUPS[APPOINTMENTS]
+
+        def compute_and_book():
+            data = compute()
+            self._book()
+            return data
+
+        with mock.patch.dict(METRIC_GROUPS, {APPOINTMENTS: compute_and_book}):
+            refresh_metrics([APPOINTMENTS])
+        self._age(METRICS_MIN_REFRESH_SECONDS)
+        self.assertEqual(get_dashboard_metrics()[APPOINTMENTS].data["total"], 1)
+
+
+class UtilizationTests(TestCase):
+    """
+    refresh_utilization en tandas pequeñas: cada fila coincide con un conteo
+    directo del ORM por día local, también en los días a ambos lados del corte
+    entre tandas y con citas archivadas.
+    """
+    CHUNK_DAYS = 3
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctors = [make_user(f"utilization_doctor_{i}", User.Roles.DOCTOR) for i in range(2)]
+        patient = make_user("utilization_patient", User.Roles.PATIENT)
+        # Franjas solapadas (8-12 y 11-13): 15 slots, no 18
+        for start, end in ((time(8), time(12)), (time(11), time(13))):
+            DoctorAvailability.objects.bulk_create(
+                DoctorAvailability(doctor=cls.doctors[0], weekday=weekday, start_time=start, end_time=end)
+                for weekday in range(7)
+            )
+        cls.start = timezone.localdate() - timedelta(days=10)
+        boundary = cls.start + timedelta(days=cls.CHUNK_DAYS)
+        statuses = list(Appointment.Status.values)
+        moments = [
+            # Justo antes y justo después de la medianoche local del corte
+            (boundary - timedelta(days=1), time(23, 50)),
+            (boundary, time(0, 0)),
+            (boundary, time(0, 10)),
+            (boundary - timedelta(days=1), time(9)),
+            (cls.start, time(9)),
+            (cls.start + timedelta(days=7), time(15)),
+        ]
+        Appointment.objects.bulk_create(
+            Appointment(
+                patient=patient, doctor=doctor, status=statuses[(i + j) % len(statuses)],
+                scheduled_datetime=timezone.make_aware(datetime.combine(day, moment)),
+            )
+            for i, doctor in enumerate(cls.doctors)
+            for j, (day, moment) in enumerate(moments)
+        )
+        ArchivedAppointment.objects.create(
+            id=900_000, patient=patient, doctor=cls.doctors[1], status=Appointment.Status.COMPLETED,
+            scheduled_datetime=timezone.make_aware(datetime.combine(boundary, time(0, 5))),
+            created_at=timezone.now(), updated_at=timezone.now(),
+        )
+
+    def _orm_counts(self, doctor, day):
+        day_start = timezone.make_aware(datetime.combine(day, time.min))
+        counts = {"booked": 0, "completed": 0, "canceled": 0}
+        for model in (Appointment, ArchivedAppointment):
+            rows = model.objects.filter(
+                doctor=doctor, scheduled_datetime__gte=day_start,
+                scheduled_datetime__lt=day_start + timedelta(days=1),
+            )
+            counts["booked"] += rows.filter(status__in=ACTIVE_STATUSES).count()
+            counts["completed"] += rows.filter(status=Appointment.Status.COMPLETED).count()
+            counts["canceled"] += rows.filter(status=Appointment.Status.CANCELED).count()
+        return counts
+
+    def test_counts_match_orm_across_chunks(self):
+        end = self.start + timedelta(days=10)
+        written = refresh_utilization(self.start, end, chunk_days=self.CHUNK_DAYS)
+        self.assertEqual(written, DoctorUtilizationDay.objects.count())
+
+        rows = {(row.doctor_id, row.date): row for row in DoctorUtilizationDay.objects.all()}
+        for doctor in self.doctors:
+            for offset in range(10):
+                day = self.start + timedelta(days=offset)
+                with self.subTest(doctor=doctor.username, day=day):
+                    expected = self._orm_counts(doctor, day)
+                    row = rows.get((doctor.pk, day))
+                    if row is None:
+                        self.assertNotEqual(doctor, self.doctors[0])
+                        self.assertEqual(expected, {"booked": 0, "completed": 0, "canceled": 0})
+                        continue
+                    self.assertEqual(row.offered_slots, 15 if doctor == self.doctors[0] else 0)
+                    self.assertEqual(
+                        {"booked": row.booked, "completed": row.completed, "canceled": row.canceled},
+                        expected,
+                    )
+
+    def test_refresh_replaces_previous_rows(self):
+        end = self.start + timedelta(days=10)
+        refresh_utilization(self.start, end, chunk_days=self.CHUNK_DAYS)
+        Appointment.objects.filter(doctor=self.doctors[1]).update(status=Appointment.Status.CANCELED)
+        refresh_utilization(self.start, end, doctor_ids=[self.doctors[1].pk], chunk_days=self.CHUNK_DAYS)
+        totals = DoctorUtilizationDay.objects.filter(doctor=self.doctors[1]).aggregate(
+            booked=Sum("booked"), canceled=Sum("canceled"), completed=Sum("completed"),
+        )
+        # Solo queda activa la cita archivada
+        self.assertEqual(totals, {"booked": 1, "canceled": 6, "completed": 1})
+        self.assertTrue(DoctorUtilizationDay.objects.filter(doctor=self.doctors[0]).exists())
+
+
+@override_settings(REQUEST_METRICS_ENABLED=False)
+class AgendaCacheTests(TestCase):
+    """
+    Agenda cacheada de los paneles (dashboard.agenda): sin consultas con la
+    caché caliente, e invalidada solo para el paciente y el médico afectados.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = make_user("agenda_doctor", User.Roles.DOCTOR)
+        cls.patient = make_user("agenda_patient", User.Roles.PATIENT)
+        cls.other_patient = make_user("agenda_other", User.Roles.PATIENT)
+        DoctorAvailability.objects.bulk_create(
+            DoctorAvailability(doctor=cls.doctor, weekday=weekday, start_time=time(8), end_time=time(12))
+            for weekday in range(7)
+        )
+        tomorrow = timezone.localdate() + timedelta(days=1)
+        cls.slots = [
+            timezone.make_aware(datetime.combine(tomorrow, time(8)) + timedelta(minutes=20 * i))
+            for i in range(12)
+        ]
+        cls.appointment = book_appointment(cls.patient, cls.doctor, cls.slots[0], reason="Agenda")
+        book_appointment(cls.other_patient, cls.doctor, cls.slots[1], reason="Agenda")
+
+    def setUp(self):
+        cache.clear()
+
+    def _commit(self, write):
+        # Las invalidaciones se aplican al confirmar la transacción
+        with self.captureOnCommitCallbacks(execute=True):
+            return write()
+
+    def _assert_fresh(self):
+        self.assertEqual(get_patient_agenda(self.patient), build_patient_agenda(self.patient.pk))
+        self.assertEqual(get_doctor_agenda(self.doctor), build_doctor_agenda(self.doctor.pk))
+
+    def _upcoming_ids(self, user):
+        return [appointment.id for appointment in get_patient_agenda(user).upcoming]
+
+    def test_warm_dashboard_runs_no_queries(self):
+        for user, url_name in (
+            (self.patient, "dashboard:patient_dashboard"),
+            (self.doctor, "dashboard:doctor_dashboard"),
+        ):
+            with self.subTest(url_name=url_name):
+                self.client.force_login(user)
+                url = reverse(url_name)
+                self.client.get(url)
+                with self.assertNumQueries(0):
+                    response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+
+    def test_booking_invalidates_patient_and_doctor(self):
+        get_patient_agenda(self.patient)
+        get_doctor_agenda(self.doctor)
+        booked = self._commit(
+            lambda: book_appointment(self.patient, self.doctor, self.slots[2], reason="Agenda")
+        )
+        self.assertIn(booked.id, self._upcoming_ids(self.patient))
+        self._assert_fresh()
+
+    def test_other_patients_keep_their_agenda(self):
+        get_patient_agenda(self.other_patient)
+        self._commit(lambda: book_appointment(self.patient, self.doctor, self.slots[3], reason="Agenda"))
+        with self.assertNumQueries(0):
+            get_patient_agenda(self.other_patient)
+
+    def test_status_change(self):
+        get_patient_agenda(self.patient)
+        self.appointment.status = Appointment.Status.CONFIRMED
+        self._commit(self.appointment.save)
+        self._assert_fresh()
+
+    def test_video_room_fields_do_not_invalidate(self):
+        get_patient_agenda(self.patient)
+        self.appointment.video_call_url = "https://example.daily.co/agenda"
+        self._commit(lambda: self.appointment.save(update_fields=["video_call_url"]))
+        with self.assertNumQueries(0):
+            get_patient_agenda(self.patient)
+
+    def test_consultation_create_and_edit(self):
+        get_patient_agenda(self.patient)
+        consultation = self._commit(
+            lambda: Consultation.objects.create(appointment=self.appointment, doctor_notes="Primera nota.")
+        )
+        self.assertEqual(get_patient_agenda(self.patient).last_consultation.doctor_notes, "Primera nota.")
+        consultation.doctor_notes = "Nota corregida."
+        self._commit(consultation.save)
+        self.assertEqual(get_patient_agenda(self.patient).last_consultation.doctor_notes, "Nota corregida.")
+        self._assert_fresh()
+
+    def test_cancel(self):
+        get_patient_agenda(self.patient)
+        get_doctor_agenda(self.doctor)
+        self._commit(Appointment.objects.get(pk=self.appointment.pk).cancel)
+        self.assertNotIn(self.appointment.id, self._upcoming_ids(self.patient))
+        self._assert_fresh()
+
+    def test_rolled_back_booking_does_not_invalidate(self):
+        get_patient_agenda(self.patient)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with transaction.atomic():
+                book_appointment(self.patient, self.doctor, self.slots[4], reason="Agenda")
+                transaction.set_rollback(True)
+        self.assertEqual(callbacks, [])
+        with self.assertNumQueries(0):
+            get_patient_agenda(self.patient)
+
+
+@override_settings(REQUEST_METRICS_ENABLED=False, EXTERNAL_SYNC_TOKEN="fake")
+@mock.patch("dashboard.external_sync.EXTERNAL_SYNC_RETRY_BASE_SECONDS", 0)
+class ExternalSyncTests(TestCase):
+    """
+    Sincronización contra el sistema externo falso (dashboard.fake_his): todo
+    llega en su última versión, las ejecuciones fallidas se reanudan sin
+    reenvíos y los cambios posteriores se envían de forma incremental.
+    """
+    APPOINTMENTS = 120
+    CHUNK_SIZE = 25
+    MAX_RUNS = 50
+
+    @classmethod
+    def setUpTestData(cls):
+        doctor = make_user("sync_doctor", User.Roles.DOCTOR)
+        patient = make_user("sync_patient", User.Roles.PATIENT)
+        start = timezone.now().replace(second=0, microsecond=0) - timedelta(days=365)
+        cls.appointments = Appointment.objects.bulk_create(
+            Appointment(
+                patient=patient, doctor=doctor, reason="Consulta de control",
+                scheduled_datetime=start + timedelta(minutes=20 * i),
+                status=Appointment.Status.COMPLETED,
+            )
+            for i in range(cls.APPOINTMENTS)
+        )
+        Consultation.objects.bulk_create(
+            Consultation(appointment=appointment, doctor_notes="Sin novedades.")
+            for appointment in cls.appointments[::2]
+        )
+
+    def setUp(self):
+        self.server = FakeHealthRecordServer().start()
+        self.addCleanup(self.server.stop)
+        url_override = override_settings(EXTERNAL_SYNC_URL=self.server.base_url)
+        url_override.enable()
+        self.addCleanup(url_override.disable)
+
+    def _sync_until_done(self):
+        runs = []
+        while len(runs) < self.MAX_RUNS:
+            run = claim_run(create=True)
+            self.assertIsNotNone(run, "otra sincronización quedó en curso")
+            run = run_sync(run, settle_seconds=0, chunk_size=self.CHUNK_SIZE)
+            runs.append(run)
+            if run.status == SyncRun.Status.SUCCEEDED:
+                return runs
+        self.fail(f"la sincronización no terminó tras {len(runs)} ejecuciones")
+
+    def _assert_received_latest(self):
+        received = self.server.records.get("appointments", {})
+        encoder = DjangoJSONEncoder()
+        for appointment in Appointment.objects.all():
+            record = received.get(appointment.pk, {})
+            self.assertEqual(record.get("updated_at"), encoder.default(appointment.updated_at))
+            self.assertEqual(record.get("status"), appointment.status)
+        self.assertEqual(
+            set(self.server.records.get("consultations", {})),
+            set(Consultation.objects.values_list("pk", flat=True)),
+        )
+
+    def test_failed_runs_resume_without_resending(self):
+        self.server.failure_rate = 0.5
+        runs = self._sync_until_done()
+        self._assert_received_latest()
+        # Cada tanda confirmada se envió una sola vez
+        expected = self.APPOINTMENTS + Consultation.objects.count()
+        self.assertEqual(sum(run.records_sent for run in runs), expected)
+        self.assertEqual(
+            [run.status for run in runs[:-1]], [SyncRun.Status.FAILED] * (len(runs) - 1),
+        )
+
+    def test_incremental_sync_sends_only_changes(self):
+        self._sync_until_done()
+        changed = self.appointments[::10]
+        for appointment in changed:
+            appointment.status = Appointment.Status.CANCELED
+            appointment.canceled_at = timezone.now()
+            appointment.save(update_fields=["status", "canceled_at", "updated_at"])
+
+        runs = self._sync_until_done()
+        self.assertEqual(sum(run.records_sent for run in runs), len(changed))
+        self._assert_received_latest()
+
+    def test_unexpected_error_marks_run_failed(self):
+        run = claim_run(create=True)
+        with mock.patch("dashboard.external_sync.SyncClient.send", side_effect=RuntimeError("sin respuesta")), \
+                self.assertLogs("dashboard.external_sync", "ERROR"):
+            run = run_sync(run, settle_seconds=0, chunk_size=self.CHUNK_SIZE)
+        self.assertEqual(run.status, SyncRun.Status.FAILED)
+        self.assertEqual(run.last_error, "RuntimeError: sin respuesta")
+        self.assertIsNotNone(run.finished_at)
+        # La ejecución no queda activa: la siguiente se puede reclamar
+        self.assertIsNotNone(claim_run(create=True))
+
+
+class RoleChangeTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = make_user("roles_admin", User.Roles.ADMIN)
+        cls.busy_doctor = make_user("roles_busy", User.Roles.DOCTOR)
+        cls.idle_doctor = make_user("roles_idle", User.Roles.DOCTOR)
+        cls.patient = make_user("roles_patient", User.Roles.PATIENT)
+        Appointment.objects.create(
+            patient=cls.patient, doctor=cls.busy_doctor,
+            scheduled_datetime=timezone.now() + timedelta(days=2),
+        )
+
+    def _roles(self, *users):
+        return list(User.objects.filter(pk__in=[u.pk for u in users]).order_by("pk").values_list("role", flat=True))
+
+    def test_demotion_is_all_or_nothing(self):
+        with self.assertRaisesMessage(RoleChangeError, "roles_busy"):
+            change_user_roles(self.admin, [self.idle_doctor, self.busy_doctor], User.Roles.PATIENT)
+        self.assertEqual(self._roles(self.busy_doctor, self.idle_doctor), [User.Roles.DOCTOR] * 2)
+
+        changed, _ = change_user_roles(self.admin, [self.idle_doctor], User.Roles.PATIENT)
+        self.assertEqual([user.pk for user in changed], [self.idle_doctor.pk])
+        self.assertEqual(self._roles(self.idle_doctor), [User.Roles.PATIENT])
+
+    def test_canceled_appointments_do_not_block_demotion(self):
+        Appointment.objects.filter(doctor=self.busy_doctor).update(status=Appointment.Status.CANCELED)
+        change_user_roles(self.admin, [self.busy_doctor], User.Roles.PATIENT)
+        self.assertEqual(self._roles(self.busy_doctor), [User.Roles.PATIENT])
+
+    def test_admin_cannot_demote_themselves(self):
+        with self.assertRaises(RoleChangeError):
+            change_user_roles(self.admin, [self.admin, self.patient], User.Roles.DOCTOR)
+        self.assertEqual(self._roles(self.admin, self.patient), [User.Roles.ADMIN, User.Roles.PATIENT])
+        # Seguir siendo administrador no es un cambio
+        self.assertEqual(change_user_roles(self.admin, [self.admin], User.Roles.ADMIN), ([], []))
+
+    def test_new_doctors_get_default_availability(self):
+        former_doctor = make_user("roles_former", User.Roles.PATIENT)
+        DoctorAvailability.objects.create(
+            doctor=former_doctor, weekday=DoctorAvailability.Weekday.SATURDAY,
+            start_time=time(9), end_time=time(11),
+        )
+        changed, new_doctors = change_user_roles(self.admin, [self.patient, former_doctor], User.Roles.DOCTOR)
+        self.assertEqual(len(changed), 2)
+        self.assertEqual([user.pk for user in new_doctors], [self.patient.pk])
+        self.assertEqual(
+            sorted(DoctorAvailability.objects.filter(doctor=self.patient).values_list("weekday", "start_time", "end_time")),
+            [(weekday, time(8), time(12)) for weekday in DEFAULT_AVAILABILITY_WEEKDAYS],
+        )
+        self.assertEqual(DoctorAvailability.objects.filter(doctor=former_doctor).count(), 1)
+
+
+class RequestMetricsTests(TestCase):
+    """
+    Colector de métricas de peticiones: percentiles a partir del histograma,
+    volcado en RequestMetricRollup y volcado fuera de la petición medida.
+    """
+
+    def _counts(self, **buckets):
+        return [buckets.get(field, 0) for field in BUCKET_FIELDS]
+
+    def test_percentile_of_empty_histogram(self):
+        self.assertIsNone(histogram_percentile(self._counts(), 0.5, 0))
+
+    def test_percentile_interpolates_within_bucket(self):
+        # 4 peticiones en (5, 10] y 4 en (10, 25]: se interpola dentro de cada cubeta
+        counts = self._counts(le_10=4, le_25=4)
+        self.assertEqual(histogram_percentile(counts, 0.5, 20), 10)
+        self.assertEqual(histogram_percentile(counts, 0.75, 25), 17.5)
+        # La cubeta se recorta a la latencia máxima observada
+        self.assertEqual(histogram_percentile(counts, 1.0, 20), 20)
+
+    def test_percentile_of_last_bucket_uses_max(self):
+        counts = self._counts(le_5=1, le_inf=1)
+        self.assertEqual(histogram_percentile(counts, 1.0, 9000), 9000)
+        self.assertEqual(histogram_percentile(counts, 0.75, 9000), 7000)
+
+    def test_flush_writes_rollups(self):
+        metrics = RequestMetricsCollector()
+        metrics.record("dashboard:reports", 3, 2, 1.5)
+        metrics.record("dashboard:reports", 30, 6, 4.5)
+        metrics.record("dashboard:manage_users", 7000, 1, 0.5)
+        self.assertEqual(metrics.flush(), 2)
+
+        reports = RequestMetricRollup.objects.get(view_name="dashboard:reports")
+        self.assertEqual(
+            (reports.count, reports.latency_sum_ms, reports.latency_max_ms,
+             reports.queries_sum, reports.queries_max, reports.sql_ms_sum),
+            (2, 33, 30, 8, 6, 6),
+        )
+        self.assertEqual([getattr(reports, field) for field in BUCKET_FIELDS], self._counts(le_5=1, le_50=1))
+        self.assertEqual(RequestMetricRollup.objects.get(view_name="dashboard:manage_users").le_inf, 1)
+        # Los agregados se vacían al volcar
+        self.assertEqual(metrics.flush(), 0)
+        self.assertEqual(RequestMetricRollup.objects.count(), 2)
+
+    @override_settings(REQUEST_METRICS_ENABLED=True, REQUEST_METRICS_FLUSH_SECONDS=0)
+    def test_flush_runs_after_the_response(self):
+        metrics = RequestMetricsCollector()
+
+        def view(request):
+            request.resolver_match = mock.Mock(view_name="dashboard:reports")
+            User.objects.count()
+            return HttpResponse()
+
+        with mock.patch("dashboard.middleware.collector", metrics), \
+                mock.patch("dashboard.middleware.close_old_connections"):
+            RequestMetricsMiddleware(view)(RequestFactory().get("/"))
+            self.assertFalse(RequestMetricRollup.objects.exists())
+            # Como el cliente de tests: sin cerrar la conexión de la transacción del test
+            request_finished.disconnect(close_old_connections)
+            try:
+                request_finished.send(sender=self.__class__)
+            finally:
+                request_finished.connect(close_old_connections)
+        rollup = RequestMetricRollup.objects.get()
+        self.assertEqual((rollup.view_name, rollup.count, rollup.queries_sum), ("dashboard:reports", 1, 1))
@@ -11,7 +11,13 @@ urlpatterns = [
 
     # Placeholders
     path("sistema/uso/", views.system_usage_placeholder, name="system_usage"),
+    path("sistema/ocupacion/", views.doctor_utilization, name="doctor_utilization"),
     path("sistema/sincronizacion-externa/", views.external_sync_placeholder, name="external_sync"),
     path("sistema/reportes/", views.reports_placeholder, name="reports"),
+    path(
+        "sistema/reportes/exportar/<str:export_format>/",
+        views.reports_export,
+        name="reports_export",
+    ),
     path("usuarios/", views.manage_users, name="manage_users")
 ]
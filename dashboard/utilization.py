@@ -0,0 +1,287 @@
+# dashboard/utilization.py
+"""
+Ocupación de la agenda de cada médico (DoctorUtilizationDay).
+
+Calcularla en vivo exigiría ejecutar el motor de slots para cada médico y día.
+En su lugar se materializa por rangos de fechas:
+- slots ofrecidos: a partir de las franjas activas de DoctorAvailability
+  (slots por médico y día de la semana, sin recorrer los días uno a uno),
+- citas reservadas/completadas/canceladas: un GROUP BY (médico, día) sobre
+  Appointment con agregación condicional.
+
+El comando nocturno `refresh_doctor_utilization` recalcula una ventana móvil
+(los últimos días y el horizonte futuro); los días anteriores no se vuelven a
+tocar, así que conservan los slots ofrecidos que tenían cuando se calcularon.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Count, F, Max, Q, Sum
+from django.db.models.functions import NullIf, TruncDate
+from django.utils import timezone
+
+from accounts.models import User
+from scheduling.models import Appointment, ArchivedAppointment, DoctorAvailability, APPOINTMENT_SLOT_DELTA
+
+from .models import DoctorUtilizationDay
+
+UTILIZATION_DAYS_BACK = 7
+UTILIZATION_DAYS_AHEAD = 60
+# Días que se recalculan en cada tanda (acota las filas en memoria)
+UTILIZATION_CHUNK_DAYS = 31
+
+UTILIZATION_PERIODS = {
+    "past30": ("Últimos 30 días", -30, 0),
+    "past90": ("Últimos 90 días", -90, 0),
+    "next14": ("Próximos 14 días", 0, 14),
+}
+DEFAULT_UTILIZATION_PERIOD = "past30"
+
+ACTIVE_STATUSES = (
+    Appointment.Status.PENDING,
+    Appointment.Status.CONFIRMED,
+    Appointment.Status.IN_PROGRESS,
+    Appointment.Status.COMPLETED,
+)
+
+
+def _slot_count(blocks):
+    """
+    Slots de 20 minutos en una lista de franjas (inicio, fin), fusionando las
+    que se solapan para no contar dos veces el mismo horario.
+    """
+    day = datetime(2000, 1, 1)
+    total = 0
+    current_start = current_end = None
+    for start, end in sorted(blocks):
+        start, end = datetime.combine(day, start), datetime.combine(day, end)
+        if current_end is not None and start < current_end:
+            current_end = max(current_end, end)
+            continue
+        if current_end is not None:
+            total += (current_end - current_start) // APPOINTMENT_SLOT_DELTA
+        current_start, current_end = start, end
+    if current_end is not None:
+        total += (current_end - current_start) // APPOINTMENT_SLOT_DELTA
+    return total
+
+
+def offered_slots_by_weekday(doctor_ids=None):
+    """
+    {doctor_id: {weekday: slots ofrecidos}} según las franjas activas.
+    """
+    availabilities = DoctorAvailability.objects.filter(
+        is_active=True,
+        doctor__role=User.Roles.DOCTOR,
+    )
+    if doctor_ids is not None:
+        availabilities = availabilities.filter(doctor_id__in=doctor_ids)
+
+    blocks = defaultdict(lambda: defaultdict(list))
+    for doctor_id, weekday, start, end in availabilities.values_list(
+        "doctor_id", "weekday", "start_time", "end_time"
+    ):
+        blocks[doctor_id][weekday].append((start, end))
+    return {
+        doctor_id: {weekday: _slot_count(day_blocks) for weekday, day_blocks in by_weekday.items()}
+        for doctor_id, by_weekday in blocks.items()
+    }
+
+
+def appointment_counts(start_date, end_date, doctor_ids=None):
+    """
+    {(doctor_id, fecha): {"booked", "completed", "canceled"}} para [start_date, end_date),
+    agrupando en la base de datos por médico y día local. Suma las citas vivas y
+    las archivadas, así un refresco completo no pierde los días ya archivados.
+    """
+    counts = defaultdict(lambda: {"booked": 0, "completed": 0, "canceled": 0})
+    for model in (Appointment, ArchivedAppointment):
+        for key, values in _appointment_counts(model, start_date, end_date, doctor_ids).items():
+            for name, value in values.items():
+                counts[key][name] += value
+    return dict(counts)
+
+
+def _appointment_counts(model, start_date, end_date, doctor_ids):
+    tz = timezone.get_current_timezone()
+    appointments = model.objects.filter(
+        scheduled_datetime__gte=timezone.make_aware(datetime.combine(start_date, time.min), tz),
+        scheduled_datetime__lt=timezone.make_aware(datetime.combine(end_date, time.min), tz),
+    )
+    if doctor_ids is not None:
+        appointments = appointments.filter(doctor_id__in=doctor_ids)
+
+    rows = (
+        appointments
+        .annotate(day=TruncDate("scheduled_datetime", tzinfo=tz))
+        .values("doctor_id", "day")
+        .annotate(
+            booked=Count("id", filter=Q(status__in=ACTIVE_STATUSES)),
+            completed=Count("id", filter=Q(status=Appointment.Status.COMPLETED)),
+            canceled=Count("id", filter=Q(status=Appointment.Status.CANCELED)),
+        )
+        .order_by()
+    )
+    return {
+        (row["doctor_id"], row["day"]): {
+            "booked": row["booked"],
+            "completed": row["completed"],
+            "canceled": row["canceled"],
+        }
+        for row in rows
+    }
+
+
+def refresh_utilization(start_date, end_date, doctor_ids=None, chunk_days=UTILIZATION_CHUNK_DAYS):
+    """
+    Recalcula DoctorUtilizationDay para [start_date, end_date) (todos los
+    médicos o solo `doctor_ids`). Cada tanda de días se reemplaza dentro de
+    una transacción. Devuelve el número de filas escritas.
+    """
+    offered = offered_slots_by_weekday(doctor_ids)
+    written = 0
+    chunk_start = start_date
+    while chunk_start < end_date:
+        chunk_end = min(chunk_start + timedelta(days=chunk_days), end_date)
+        counts = appointment_counts(chunk_start, chunk_end, doctor_ids)
+
+        rows = {}
+        for offset in range((chunk_end - chunk_start).days):
+            day = chunk_start + timedelta(days=offset)
+            weekday = day.weekday()
+            for doctor_id, by_weekday in offered.items():
+                slots = by_weekday.get(weekday)
+                if slots:
+                    rows[doctor_id, day] = DoctorUtilizationDay(
+                        doctor_id=doctor_id, date=day, offered_slots=slots,
+                    )
+        for (doctor_id, day), values in counts.items():
+            row = rows.get((doctor_id, day))
+            if row is None:
+                row = rows[doctor_id, day] = DoctorUtilizationDay(doctor_id=doctor_id, date=day)
+            row.booked = values["booked"]
+            row.completed = values["completed"]
+            row.canceled = values["canceled"]
+
+        stale = DoctorUtilizationDay.objects.filter(date__gte=chunk_start, date__lt=chunk_end)
+        if doctor_ids is not None:
+            stale = stale.filter(doctor_id__in=doctor_ids)
+        with transaction.atomic():
+            stale.delete()
+            DoctorUtilizationDay.objects.bulk_create(rows.values(), batch_size=5000)
+        written += len(rows)
+        chunk_start = chunk_end
+    return written
+
+
+def refresh_utilization_window(days_back=UTILIZATION_DAYS_BACK, days_ahead=UTILIZATION_DAYS_AHEAD,
+                               full=False):
+    """
+    Refresco nocturno: la ventana [hoy - days_back, hoy + days_ahead).
+    Con `full` (o si la tabla está vacía) empieza en la primera cita registrada,
+    viva o archivada.
+    Devuelve (fecha inicial, fecha final, filas escritas).
+    """
+    today = timezone.localdate()
+    start = today - timedelta(days=days_back)
+    end = today + timedelta(days=days_ahead)
+    if full or not DoctorUtilizationDay.objects.exists():
+        firsts = [
+            model.objects.order_by("scheduled_datetime").values_list("scheduled_datetime", flat=True).first()
+            for model in (Appointment, ArchivedAppointment)
+        ]
+        firsts = [first for first in firsts if first is not None]
+        if firsts:
+            start = min(start, timezone.localtime(min(firsts)).date())
+    return start, end, refresh_utilization(start, end)
+
+
+# --- Lectura para el panel ------------------------------------------------
+
+_TOTALS = {
+    "offered_total": Sum("offered_slots"),
+    "booked_total": Sum("booked"),
+    "completed_total": Sum("completed"),
+    "canceled_total": Sum("canceled"),
+}
+
+
+def _rate(part, whole):
+    return part * 100 / whole if whole else None
+
+
+def period_bounds(period_key):
+    _, start_offset, end_offset = UTILIZATION_PERIODS[period_key]
+    today = timezone.localdate()
+    return today + timedelta(days=start_offset), today + timedelta(days=end_offset)
+
+
+def _summarize(values):
+    offered = values["offered_total"] or 0
+    booked = values["booked_total"] or 0
+    completed = values["completed_total"] or 0
+    canceled = values["canceled_total"] or 0
+    return {
+        "offered": offered,
+        "booked": booked,
+        "completed": completed,
+        "canceled": canceled,
+        "utilization": _rate(booked, offered),
+        "completion_rate": _rate(completed, booked),
+        "cancellation_rate": _rate(canceled, booked + canceled),
+    }
+
+
+def utilization_totals(start_date, end_date):
+    """
+    Totales del periodo y fecha del último refresco, en una consulta.
+    """
+    values = DoctorUtilizationDay.objects.filter(
+        date__gte=start_date, date__lt=end_date,
+    ).aggregate(refreshed_at=Max("updated_at"), **_TOTALS)
+    summary = _summarize(values)
+    summary["refreshed_at"] = values["refreshed_at"]
+    return summary
+
+
+def utilization_by_day(start_date, end_date):
+    rows = (
+        DoctorUtilizationDay.objects
+        .filter(date__gte=start_date, date__lt=end_date)
+        .values("date")
+        .annotate(**_TOTALS)
+        .order_by("date")
+    )
+    return [{"date": row["date"], **_summarize(row)} for row in rows]
+
+
+def utilization_by_doctor(start_date, end_date):
+    """
+    QuerySet de filas por médico ordenado por ocupación (mayor primero),
+    pensado para paginarse.
+    """
+    return (
+        DoctorUtilizationDay.objects
+        .filter(date__gte=start_date, date__lt=end_date)
+        .values("doctor_id", "doctor__username", "doctor__first_name", "doctor__last_name")
+        .annotate(
+            **_TOTALS,
+            utilization=F("booked_total") * 100.0 / NullIf(F("offered_total"), 0),
+        )
+        .order_by(F("utilization").desc(nulls_last=True), "doctor_id")
+    )
+
+
+def utilization_for_doctors(doctor_ids, start_date, end_date):
+    """
+    {doctor_id: ocupación %} en el periodo para los médicos dados (p. ej. el periodo anterior).
+    """
+    rows = (
+        DoctorUtilizationDay.objects
+        .filter(doctor_id__in=doctor_ids, date__gte=start_date, date__lt=end_date)
+        .values("doctor_id")
+        .annotate(**_TOTALS)
+        .order_by()
+    )
+    return {row["doctor_id"]: _summarize(row)["utilization"] for row in rows}
@@ -1,13 +1,38 @@
 
 from django.contrib import messages
-from .forms import UserRoleForm
+from .agenda import get_doctor_agenda, get_patient_agenda
+from .exports import EXPORT_FORMATS, export_rows, filtered_appointment_sources, latest_appointments
+from .external_sync import get_sync_overview, request_sync
+from .forms import BulkRoleChangeForm, ReportFilterForm, UserRoleForm, UserSearchForm
+from .request_metrics import (
+    DEFAULT_METRIC_WINDOW,
+    METRIC_WINDOWS,
+    collector as request_metrics_collector,
+    get_flush_interval,
+    get_view_metrics,
+)
+from .roles import RoleChangeError, change_user_roles
+from .utilization import (
+    DEFAULT_UTILIZATION_PERIOD,
+    UTILIZATION_PERIODS,
+    period_bounds,
+    utilization_by_day,
+    utilization_by_doctor,
+    utilization_for_doctors,
+    utilization_totals,
+)
+from .metrics import APPOINTMENTS, USERS, get_dashboard_metrics
 from accounts.decorators import role_required
+from SaludConectada.db_routing import replica_view
 from accounts.models import User
-from clinical.models import Consultation
 from scheduling.models import Appointment
-from django.shortcuts import get_object_or_404, redirect, render
-from scheduling.models import DoctorAvailability, Appointment 
-from datetime import time
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.http import Http404, StreamingHttpResponse
+from django.shortcuts import redirect, render
+from scheduling.daily_client import get_daily_metrics
+from scheduling.room_pool import get_pool_metrics
+from datetime import datetime, timedelta, timezone as dt_timezone
 from django.utils import timezone 
 
 @role_required(User.Roles.PATIENT)
@@ -17,27 +42,12 @@ def patient_dashboard(request):
     - Próximas citas.
     - Acceso rápido a historial y videollamadas.
     """
-    upcoming_appointments = (
-        Appointment.objects
-        .filter(patient=request.user, status__in=[
-            Appointment.Status.PENDING,
-            Appointment.Status.CONFIRMED,
-            Appointment.Status.IN_PROGRESS,
-        ])
-        .order_by("scheduled_datetime")[:5]
-    )
-
-    # Última consulta (para simular la idea de seguimiento)
-    last_consultation = (
-        Consultation.objects
-        .filter(appointment__patient=request.user)
-        .order_by("-created_at")
-        .first()
-    )
+    # Próximas citas y última consulta, cacheadas por usuario (dashboard.agenda)
+    agenda = get_patient_agenda(request.user)
 
     context = {
-        "upcoming_appointments": upcoming_appointments,
-        "last_consultation": last_consultation,
+        "upcoming_appointments": agenda.upcoming,
+        "last_consultation": agenda.last_consultation,
     }
     return render(request, "dashboard/patient_dashboard.html", context)
 
@@ -49,47 +59,43 @@ def doctor_dashboard(request):
     - Próximas citas asignadas.
     - Link a citas y a futuros módulos de disponibilidad.
     """
-    upcoming_appointments = (
-        Appointment.objects
-        .filter(doctor=request.user, status__in=[
-            Appointment.Status.PENDING,
-            Appointment.Status.CONFIRMED,
-            Appointment.Status.IN_PROGRESS,
-        ])
-        .order_by("scheduled_datetime")[:10]
-    )
+    agenda = get_doctor_agenda(request.user)
 
     context = {
-        "upcoming_appointments": upcoming_appointments,
+        "upcoming_appointments": agenda.upcoming,
     }
     return render(request, "dashboard/doctor_dashboard.html", context)
 
 
 @role_required(User.Roles.ADMIN)
+@replica_view
 def admin_dashboard(request):
     """
     Panel del administrador:
     - Métricas básicas de uso.
     - Placeholders para supervisar uso, sincronización externa y reportes.
     """
-    total_users = User.objects.count()
-    patients_count = User.objects.filter(role=User.Roles.PATIENT).count()
-    doctors_count = User.objects.filter(role=User.Roles.DOCTOR).count()
-    admins_count = User.objects.filter(role=User.Roles.ADMIN).count()
+    # Snapshots precalculados (dashboard.metrics): una lectura, sin conteos por tabla
+    metrics = get_dashboard_metrics()
+    users = metrics[USERS]
+    appointments = metrics[APPOINTMENTS]
 
-    total_appointments = Appointment.objects.count()
     appointments_by_status = {
-        status_label: Appointment.objects.filter(status=status_value).count()
+        status_label: appointments.data.get(status_value.lower(), 0)
         for status_value, status_label in Appointment.Status.choices
     }
 
     context = {
-        "total_users": total_users,
-        "patients_count": patients_count,
-        "doctors_count": doctors_count,
-        "admins_count": admins_count,
-        "total_appointments": total_appointments,
+        "total_users": users.data["total"],
+        "patients_count": users.data.get("patient", 0),
+        "doctors_count": users.data.get("doctor", 0),
+        "admins_count": users.data.get("admin", 0),
+        "users_computed_at": users.computed_at,
+        "total_appointments": appointments.data["total"],
         "appointments_by_status": appointments_by_status,
+        "appointments_computed_at": appointments.computed_at,
+        "daily_metrics": get_daily_metrics(),
+        "room_pool_metrics": get_pool_metrics(),
     }
     return render(request, "dashboard/admin_dashboard.html", context)
 
@@ -98,134 +104,228 @@ def admin_dashboard(request):
 
 
 @role_required(User.Roles.ADMIN)
+@replica_view
 def system_usage_placeholder(request):
     """
-    Placeholder para 'Supervisar uso del sistema'.
-    En el futuro aquí podríamos mostrar gráficas reales, logs, etc.
+    Supervisión del uso del sistema: latencia (p50/p95/p99), consultas y tiempo
+    SQL por vista en la ventana elegida, a partir de RequestMetricRollup, más
+    las peticiones más lentas recientes de este proceso.
+    """
+    window_key = request.GET.get("window")
+    if window_key not in METRIC_WINDOWS:
+        window_key = DEFAULT_METRIC_WINDOW
+    window_label, window = METRIC_WINDOWS[window_key]
+
+    overall, per_view = get_view_metrics(window)
+    context = {
+        "windows": [(key, label) for key, (label, _) in METRIC_WINDOWS.items()],
+        "window_key": window_key,
+        "window_label": window_label,
+        "overall": overall,
+        "per_view": per_view,
+        "worst_by_total_time": sorted(per_view, key=lambda item: item["total_s"], reverse=True)[:5],
+        "worst_by_queries": sorted(per_view, key=lambda item: item["avg_queries"] or 0, reverse=True)[:5],
+        "recent_slowest": [
+            {
+                "at": datetime.fromtimestamp(at, tz=dt_timezone.utc),
+                "view_name": view_name,
+                "latency_ms": latency_ms,
+                "queries": queries,
+                "sql_ms": sql_ms,
+            }
+            for at, view_name, latency_ms, queries, sql_ms in request_metrics_collector.slowest_recent()
+        ],
+        "flush_interval": get_flush_interval(),
+    }
+    return render(request, "dashboard/system_usage.html", context)
+
+
+UTILIZATION_PAGE_SIZE = 50
+
+
+@role_required(User.Roles.ADMIN)
+@replica_view
+def doctor_utilization(request):
+    """
+    Ocupación de la agenda por médico en el periodo elegido, leída del rollup
+    DoctorUtilizationDay (ver dashboard.utilization), con la variación
+    respecto al periodo anterior de la misma duración.
     """
-    # TODO: integrar métricas reales (p. ej. número de logins por día, etc.)
-    return render(request, "dashboard/system_usage.html")
+    period_key = request.GET.get("period")
+    if period_key not in UTILIZATION_PERIODS:
+        period_key = DEFAULT_UTILIZATION_PERIOD
+    start_date, end_date = period_bounds(period_key)
+    previous_start = start_date - (end_date - start_date)
+
+    totals = utilization_totals(start_date, end_date)
+    previous_totals = utilization_totals(previous_start, start_date)
+    page_obj = Paginator(
+        utilization_by_doctor(start_date, end_date), UTILIZATION_PAGE_SIZE
+    ).get_page(request.GET.get("page"))
+
+    previous_by_doctor = utilization_for_doctors(
+        [row["doctor_id"] for row in page_obj], previous_start, start_date
+    )
+    doctor_rows = []
+    for row in page_obj:
+        previous = previous_by_doctor.get(row["doctor_id"])
+        current = row["utilization"]
+        doctor_rows.append({
+            **row,
+            "trend": current - previous if current is not None and previous is not None else None,
+        })
+
+    utilization_change = None
+    if totals["utilization"] is not None and previous_totals["utilization"] is not None:
+        utilization_change = totals["utilization"] - previous_totals["utilization"]
+
+    context = {
+        "periods": [(key, label) for key, (label, _, _) in UTILIZATION_PERIODS.items()],
+        "period_key": period_key,
+        "period_label": UTILIZATION_PERIODS[period_key][0],
+        "start_date": start_date,
+        "end_date": end_date - timedelta(days=1),
+        "totals": totals,
+        "utilization_change": utilization_change,
+        "daily": utilization_by_day(start_date, end_date),
+        "page_obj": page_obj,
+        "doctor_rows": doctor_rows,
+    }
+    return render(request, "dashboard/doctor_utilization.html", context)
 
 
 @role_required(User.Roles.ADMIN)
 def external_sync_placeholder(request):
     """
-    Placeholder para 'Sincronizar con sistemas externos'.
-    Por ahora solo mostramos un mensaje.
+    Sincronización con el sistema de información de salud regional:
+    pendiente por entidad, progreso y throughput de la ejecución activa e
+    historial. El botón solicita una ejecución que procesa el worker
+    `run_external_sync` (ver dashboard.external_sync).
     """
     if request.method == "POST":
-        # Aquí en el futuro se llamaría a un servicio real de integración
-        messages.info(
-            request,
-            "Simulación: se habría iniciado la sincronización con el sistema externo.",
-        )
+        run, created = request_sync(request.user)
+        if created:
+            messages.success(request, "Sincronización solicitada. Empezará en cuanto el worker la tome.")
+        else:
+            messages.info(request, "Ya hay una sincronización solicitada o en curso.")
+        return redirect("dashboard:external_sync")
 
-    return render(request, "dashboard/external_sync.html")
+    return render(request, "dashboard/external_sync.html", get_sync_overview())
 
 
 @role_required(User.Roles.ADMIN)
+@replica_view
 def reports_placeholder(request):
     """
-    Placeholder para generación/descarga de reportes.
-    Más adelante: generar PDF/Excel.
+    Reportes de citas (vivas y archivadas): las últimas 20 que cumplen los
+    filtros y la exportación completa en CSV/Excel (ver reports_export).
     """
-    # Aquí podríamos construir un dataset simple para mostrar en pantalla
-    appointments = (
-        Appointment.objects
-        .select_related("patient", "doctor")
-        .order_by("-scheduled_datetime")[:20]
-    )
+    form = ReportFilterForm(request.GET or None)
+    filters = form.cleaned_data if form.is_bound and form.is_valid() else {}
+
+    appointments = latest_appointments(filters, 20)
 
     context = {
+        "form": form,
         "appointments": appointments,
+        "export_query": request.GET.urlencode(),
     }
     return render(request, "dashboard/reports.html", context)
 
+
 @role_required(User.Roles.ADMIN)
-def manage_users(request):
-    users = User.objects.all().order_by("id")
+@replica_view
+def reports_export(request, export_format):
+    """
+    Descarga todas las citas que cumplen los filtros, en streaming:
+    la memoria del proceso no crece con el tamaño del reporte.
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise Http404("Formato de exportación no soportado.")
+
+    form = ReportFilterForm(request.GET)
+    if not form.is_valid():
+        messages.error(request, "Revisa los filtros del reporte.")
+        return redirect("dashboard:reports")
 
-    # Construimos (user, form) para el GET
-    user_forms = [
-        (user, UserRoleForm(initial={"role": user.role}))
-        for user in users
-    ]
+    stream, content_type, extension = EXPORT_FORMATS[export_format]
+    rows = export_rows(filtered_appointment_sources(form.cleaned_data))
+    response = StreamingHttpResponse(stream(rows), content_type=content_type)
+    filename = f"citas_{timezone.localdate():%Y%m%d}.{extension}"
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+MANAGE_USERS_PAGE_SIZE = 50
+
+
+def _prefix_range(field, prefix):
+    """
+    Búsqueda por prefijo como rango (prefix <= campo < prefix + máx), que
+    aprovecha el índice único del campo en cualquier base de datos.
+    """
+    return Q(**{f"{field}__gte": prefix, f"{field}__lt": prefix + "\U0010ffff"})
 
+
+@role_required(User.Roles.ADMIN)
+def manage_users(request):
+    """
+    Gestión de usuarios: listado paginado con búsqueda por prefijo de usuario
+    o correo, filtro por rol y cambio de rol individual o masivo.
+    """
     if request.method == "POST":
-        user_id = request.POST.get("user_id")
-        target_user = get_object_or_404(User, pk=user_id)
-
-        form = UserRoleForm(request.POST)
-        if form.is_valid():
-            new_role = form.cleaned_data["role"]
-            now = timezone.now()
-
-            # 1) Evitar que un admin se auto-degrade
-            if target_user == request.user and new_role != User.Roles.ADMIN:
-                messages.error(
-                    request,
-                    "No puedes cambiar tu propio rol a uno distinto de Administrador."
-                )
-                return redirect("dashboard:manage_users")
-
-            # 2) Bloquear cambiar a otro rol a un MÉDICO con citas futuras
-            if target_user.role == User.Roles.DOCTOR and new_role != User.Roles.DOCTOR:
-                has_future_appts = Appointment.objects.filter(
-                    doctor=target_user,
-                    scheduled_datetime__gte=now,
-                ).exclude(status=Appointment.Status.CANCELED).exists()
-
-                if has_future_appts:
-                    messages.error(
-                        request,
-                        "No puedes cambiar el rol de este médico porque tiene citas futuras asignadas. "
-                        "Cancela o reasigna esas citas antes de cambiar su rol."
-                    )
-                    return redirect("dashboard:manage_users")
-
-            # 3) Si lo estamos convirtiendo en MÉDICO, asegurar disponibilidad mínima
-            if new_role == User.Roles.DOCTOR and target_user.role != User.Roles.DOCTOR:
-                has_active_avail = DoctorAvailability.objects.filter(
-                    doctor=target_user,
-                    is_active=True,
-                ).exists()
-
-                if not has_active_avail:
-                    default_days = [
-                        DoctorAvailability.Weekday.MONDAY,
-                        DoctorAvailability.Weekday.TUESDAY,
-                        DoctorAvailability.Weekday.WEDNESDAY,
-                        DoctorAvailability.Weekday.THURSDAY,
-                        DoctorAvailability.Weekday.FRIDAY,
-                    ]
-                    for day in default_days:
-                        DoctorAvailability.objects.create(
-                            doctor=target_user,
-                            weekday=day,
-                            start_time=time(8, 0),
-                            end_time=time(12, 0),
-                            is_active=True,
-                        )
-                    messages.info(
-                        request,
-                        "El usuario ahora es Médico. "
-                        "Se ha creado una disponibilidad básica de Lunes a Viernes, 08:00–12:00. "
-                        "El médico podrá ajustarla luego en su panel."
-                    )
-
-            # 4) Aplicar cambio de rol
-            target_user.role = new_role
-            target_user.save()
+        form = BulkRoleChangeForm(request.POST)
+        if not form.is_valid():
+            messages.error(request, "El formulario enviado no es válido.")
+            return redirect(request.get_full_path())
+
+        try:
+            changed, new_doctors = change_user_roles(
+                request.user,
+                list(form.cleaned_data["users"]),
+                form.cleaned_data["role"],
+            )
+        except RoleChangeError as exc:
+            messages.error(request, str(exc))
+            return redirect(request.get_full_path())
+
+        if new_doctors:
+            messages.info(
+                request,
+                f"{len(new_doctors)} usuario(s) ahora son Médicos. "
+                "Se ha creado una disponibilidad básica de Lunes a Viernes, 08:00–12:00. "
+                "Cada médico podrá ajustarla luego en su panel."
+            )
+        if len(changed) == 1:
             messages.success(request, "Rol actualizado correctamente.")
-            return redirect("dashboard:manage_users")
-
-        messages.error(request, "El formulario enviado no es válido.")
-        return redirect("dashboard:manage_users")
+        else:
+            messages.success(request, f"Rol actualizado para {len(changed)} usuarios.")
+        return redirect(request.get_full_path())
+
+    search_form = UserSearchForm(request.GET)
+    users = User.objects.order_by("id")
+    if search_form.is_valid():
+        term = search_form.cleaned_data["q"].strip()
+        if term:
+            # Tal cual y en minúsculas: los rangos son sensibles a mayúsculas
+            condition = Q()
+            for prefix in {term, term.lower()}:
+                condition |= _prefix_range("username", prefix) | _prefix_range("email", prefix)
+            users = users.filter(condition)
+        if search_form.cleaned_data["role"]:
+            users = users.filter(role=search_form.cleaned_data["role"])
+
+    page_obj = Paginator(users, MANAGE_USERS_PAGE_SIZE).get_page(request.GET.get("page"))
+    query = request.GET.copy()
+    query.pop("page", None)
 
     context = {
-        "user_forms": user_forms,
+        "search_form": search_form,
+        "bulk_form": BulkRoleChangeForm(),
+        "page_obj": page_obj,
+        "user_forms": [
+            (user, UserRoleForm(initial={"role": user.role}))
+            for user in page_obj
+        ],
+        "filter_query": query.urlencode(),
     }
     return render(request, "dashboard/manage_users.html", context)
-
-
-
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Appointment, DoctorAvailability
+from .models import Appointment, ArchivedAppointment, DailySlotSummary, DoctorAvailability, PooledVideoRoom, VideoRoomTask
 
 
 @admin.register(Appointment)
@@ -16,7 +16,33 @@ class AppointmentAdmin(admin.ModelAdmin):
     list_filter = ("status", "doctor")
     search_fields = ("patient__username", "doctor__username")
 
+@admin.register(ArchivedAppointment)
+class ArchivedAppointmentAdmin(admin.ModelAdmin):
+    list_display = ("id", "patient", "doctor", "scheduled_datetime", "status", "archived_at")
+    list_filter = ("status",)
+    search_fields = ("patient__username", "doctor__username")
+
 @admin.register(DoctorAvailability)
 class DoctorAvailabilityAdmin(admin.ModelAdmin):
     list_display = ("doctor", "weekday", "start_time", "end_time", "is_active")
-    list_filter = ("doctor", "weekday", "is_active")
\ No newline at end of file
+    list_filter = ("doctor", "weekday", "is_active")
+
+@admin.register(DailySlotSummary)
+class DailySlotSummaryAdmin(admin.ModelAdmin):
+    list_display = ("doctor", "date", "free_slot_count", "first_free_start", "updated_at")
+    list_filter = ("doctor",)
+    date_hierarchy = "date"
+
+
+@admin.register(VideoRoomTask)
+class VideoRoomTaskAdmin(admin.ModelAdmin):
+    list_display = ("appointment", "status", "attempts", "next_attempt_at", "updated_at")
+    list_filter = ("status",)
+    search_fields = ("appointment__id",)
+
+
+@admin.register(PooledVideoRoom)
+class PooledVideoRoomAdmin(admin.ModelAdmin):
+    list_display = ("name", "status", "appointment", "expiry_synced", "created_at", "claimed_at")
+    list_filter = ("status", "expiry_synced")
+    search_fields = ("name",)
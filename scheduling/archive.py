@@ -0,0 +1,145 @@
+# scheduling/archive.py
+"""
+Archivo de citas antiguas (tabla caliente / tabla fría).
+
+- Las citas completadas o canceladas con más de ARCHIVE_AFTER_DAYS días se
+  mueven, con su consulta, a ArchivedAppointment / ArchivedConsultation,
+  conservando los ids. Así la tabla de citas que consultan la generación de
+  slots, los paneles y los filtros solo crece con la actividad reciente.
+- Cada tanda (copiar y borrar) va en su propia transacción: interrumpir el
+  comando `archive_appointments` nunca deja una cita a medias, y al relanzarlo
+  continúa por donde iba (las tandas salen siempre de la misma consulta).
+- Las tareas del outbox de salas (VideoRoomTask) no se archivan: se borran con
+  la cita. Son de citas que ya pasaron, y al restaurar no hacen falta porque
+  request_video_room() no encola salas de citas caducadas.
+- Lectura transparente: `appointment_sources()` devuelve la tabla viva y la
+  archivada con los mismos filtros, y `merge_by_schedule()` las mezcla por
+  (scheduled_datetime, id). El historial paginado y las exportaciones leen así
+  de ambas, cada una por su propio índice.
+"""
+import heapq
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from clinical.models import ArchivedConsultation, Consultation
+
+from .models import Appointment, ArchivedAppointment, VideoRoomTask
+from .schedule_index import bump_doctor_version
+
+ARCHIVE_AFTER_DAYS = 365
+ARCHIVE_BATCH_SIZE = 500
+ARCHIVABLE_STATUSES = (Appointment.Status.COMPLETED, Appointment.Status.CANCELED)
+
+APPOINTMENT_FIELDS = (
+    "id", "patient_id", "doctor_id", "scheduled_datetime", "reason", "status",
+    "created_at", "updated_at", "canceled_at", "video_call_url",
+)
+CONSULTATION_FIELDS = (
+    "id", "appointment_id", "doctor_notes", "recommendations", "created_at", "updated_at",
+)
+
+
+def archive_cutoff(days=ARCHIVE_AFTER_DAYS):
+    return timezone.now() - timedelta(days=days)
+
+
+def archivable_appointments(cutoff):
+    return Appointment.objects.filter(
+        status__in=ARCHIVABLE_STATUSES,
+        scheduled_datetime__lt=cutoff,
+    )
+
+
+def archive_batch(cutoff, batch_size=ARCHIVE_BATCH_SIZE):
+    """
+    Mueve al archivo las `batch_size` citas archivables más antiguas y sus consultas.
+    Devuelve (citas, consultas) movidas; (0, 0) cuando ya no queda nada.
+    """
+    with transaction.atomic():
+        rows = list(
+            archivable_appointments(cutoff)
+            .order_by("scheduled_datetime", "id")
+            .values(*APPOINTMENT_FIELDS)[:batch_size]
+        )
+        if not rows:
+            return 0, 0
+        ids = [row["id"] for row in rows]
+        consultations = Consultation.objects.filter(appointment_id__in=ids)
+        consultation_rows = list(consultations.values(*CONSULTATION_FIELDS))
+
+        ArchivedAppointment.objects.bulk_create(ArchivedAppointment(**row) for row in rows)
+        ArchivedConsultation.objects.bulk_create(
+            ArchivedConsultation(**row) for row in consultation_rows
+        )
+        consultations.delete()
+        VideoRoomTask.objects.filter(appointment_id__in=ids).delete()
+        # Con señales: invalida el índice de agenda de cada médico afectado
+        Appointment.objects.filter(id__in=ids).delete()
+    return len(rows), len(consultation_rows)
+
+
+def _copy_rows(source_model, target_model, fields, ids):
+    """
+    INSERT ... SELECT con los mismos ids: evita que auto_now/auto_now_add
+    reescriban las fechas originales al devolver filas a la tabla viva.
+    """
+    quote = connection.ops.quote_name
+    columns = ", ".join(quote(source_model._meta.get_field(name).column) for name in fields)
+    placeholders = ", ".join(["%s"] * len(ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {quote(target_model._meta.db_table)} ({columns}) "
+            f"SELECT {columns} FROM {quote(source_model._meta.db_table)} "
+            f"WHERE {quote(source_model._meta.pk.column)} IN ({placeholders})",
+            ids,
+        )
+
+
+def restore_batch(batch_size=ARCHIVE_BATCH_SIZE):
+    """
+    Devuelve a la tabla viva las `batch_size` citas archivadas más recientes
+    (y sus consultas). Devuelve (citas, consultas) restauradas.
+    """
+    with transaction.atomic():
+        rows = list(
+            ArchivedAppointment.objects
+            .order_by("-scheduled_datetime", "-id")
+            .values_list("id", "doctor_id")[:batch_size]
+        )
+        if not rows:
+            return 0, 0
+        ids = [appointment_id for appointment_id, _ in rows]
+        consultation_ids = list(
+            ArchivedConsultation.objects.filter(appointment_id__in=ids).values_list("id", flat=True)
+        )
+        _copy_rows(ArchivedAppointment, Appointment, APPOINTMENT_FIELDS, ids)
+        if consultation_ids:
+            _copy_rows(ArchivedConsultation, Consultation, CONSULTATION_FIELDS, consultation_ids)
+        ArchivedAppointment.objects.filter(id__in=ids).delete()
+    for doctor_id in {doctor_id for _, doctor_id in rows}:
+        bump_doctor_version(doctor_id)
+    return len(ids), len(consultation_ids)
+
+
+def appointment_sources(**filters):
+    """
+    [citas vivas, citas archivadas] con los mismos filtros, para leer de ambas.
+    """
+    return [
+        Appointment.objects.filter(**filters),
+        ArchivedAppointment.objects.filter(**filters),
+    ]
+
+
+def _schedule_key(appointment):
+    return appointment.scheduled_datetime, appointment.pk
+
+
+def merge_by_schedule(iterables, descending=False):
+    """
+    Mezcla secuencias ya ordenadas por (scheduled_datetime, id) en un único
+    recorrido ordenado, sin cargarlas enteras.
+    """
+    return heapq.merge(*iterables, key=_schedule_key, reverse=descending)
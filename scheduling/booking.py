@@ -0,0 +1,114 @@
+# scheduling/booking.py
+from datetime import datetime
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from SaludConectada.db_routing import pin_primary
+
+from .models import Appointment, DoctorAvailability, APPOINTMENT_SLOT_DELTA
+from .summaries import refresh_slot_summary_for_appointment
+
+
+class SlotUnavailableError(Exception):
+    """
+    El slot pedido no está dentro de la disponibilidad del médico
+    o ya fue tomado por otra cita.
+    """
+
+
+def _seconds_since_midnight(value):
+    return value.hour * 3600 + value.minute * 60 + value.second
+
+
+def is_slot_within_availability(doctor, slot_start):
+    """
+    Comprueba un único slot con una sola consulta indexada:
+    - No está en el pasado.
+    - Cae completo dentro de una franja activa del médico ese día de la semana.
+    - Está alineado con la rejilla de slots de esa franja (como los genera el motor).
+    """
+    if slot_start < timezone.now():
+        return False
+
+    local_start = timezone.localtime(slot_start)
+    local_end = timezone.localtime(slot_start + APPOINTMENT_SLOT_DELTA)
+    if local_end.date() != local_start.date():
+        # Los slots nunca cruzan la medianoche
+        return False
+
+    window_starts = (
+        DoctorAvailability.objects
+        .filter(
+            doctor=doctor,
+            is_active=True,
+            weekday=local_start.weekday(),
+            start_time__lte=local_start.time(),
+            end_time__gte=local_end.time(),
+        )
+        .values_list("start_time", flat=True)
+    )
+    slot_seconds = APPOINTMENT_SLOT_DELTA.total_seconds()
+    start_seconds = _seconds_since_midnight(local_start)
+    return any(
+        (start_seconds - _seconds_since_midnight(window_start)) % slot_seconds == 0
+        for window_start in window_starts
+    )
+
+
+@pin_primary()
+def book_appointment(patient, doctor, slot_start, reason=""):
+    """
+    Reserva un slot sin condiciones de carrera.
+
+    La comprobación previa solo descarta slots fuera de la disponibilidad; la
+    garantía contra dobles reservas la da la restricción única condicional
+    (doctor, scheduled_datetime) para citas no canceladas: si dos pacientes
+    insertan a la vez, uno recibe IntegrityError y se traduce a SlotUnavailableError.
+    """
+    if not is_slot_within_availability(doctor, slot_start):
+        raise SlotUnavailableError("El horario no está dentro de la disponibilidad del médico.")
+
+    try:
+        with transaction.atomic():
+            # Citas antiguas no alineadas que se solapen con el slot
+            overlapping = (
+                Appointment.objects
+                .filter(
+                    doctor=doctor,
+                    scheduled_datetime__gt=slot_start - APPOINTMENT_SLOT_DELTA,
+                    scheduled_datetime__lt=slot_start + APPOINTMENT_SLOT_DELTA,
+                )
+                .exclude(status=Appointment.Status.CANCELED)
+                .exists()
+            )
+            if overlapping:
+                raise SlotUnavailableError("El horario ya está ocupado.")
+
+            appointment = Appointment.objects.create(
+                patient=patient,
+                doctor=doctor,
+                scheduled_datetime=slot_start,
+                reason=reason,
+            )
+            # La sala se crea fuera de la petición (outbox en la misma transacción)
+            appointment.request_video_room()
+    except IntegrityError as exc:
+        raise SlotUnavailableError("El horario ya está ocupado.") from exc
+
+    refresh_slot_summary_for_appointment(appointment)
+    return appointment
+
+
+def parse_slot_value(value):
+    """
+    Convierte el valor ISO enviado por el formulario en un datetime aware.
+    Devuelve None si no es válido.
+    """
+    try:
+        slot_start = datetime.fromisoformat(value or "")
+    except ValueError:
+        return None
+    if timezone.is_naive(slot_start):
+        slot_start = timezone.make_aware(slot_start, timezone.get_current_timezone())
+    return slot_start
@@ -0,0 +1,275 @@
+# scheduling/daily_client.py
+"""
+Cliente único para la API REST de Daily.
+
+- Reutiliza una sesión HTTP con keep-alive y un pool de conexiones
+  (una conexión TCP/TLS se reaprovecha entre llamadas).
+- Timeouts acotados de conexión y lectura en todas las llamadas.
+- Reintentos con backoff exponencial y jitter solo para llamadas idempotentes.
+- Circuit breaker: tras varios fallos seguidos deja de llamar a Daily durante
+  un tiempo y falla de inmediato, para que los hilos no se acumulen esperando
+  a un servicio caído.
+- Contadores de llamadas, errores y tiempo total por operación en la caché de
+  Django (cache.add/cache.incr, sin perder incrementos entre procesos) y las
+  últimas latencias en un buffer acotado de cada proceso, para el panel del
+  administrador.
+
+La configuración (DAILY_API_KEY, DAILY_DOMAIN, DAILY_API_BASE_URL) se lee en
+cada llamada para poder apuntar a un servidor falso en pruebas.
+"""
+import random
+import threading
+import time
+from collections import deque
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from requests.adapters import HTTPAdapter
+
+# (conexión, lectura) en segundos
+DAILY_API_TIMEOUT = (3.05, 10)
+DAILY_API_MAX_RETRIES = 2
+DAILY_API_RETRY_BASE_SECONDS = 0.2
+DAILY_API_POOL_MAXSIZE = 20
+
+DAILY_BREAKER_FAILURE_THRESHOLD = 5
+DAILY_BREAKER_RESET_SECONDS = 30
+
+# Respuestas que vale la pena reintentar en una llamada idempotente
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+_METRICS_KEY = "scheduling:daily_client:metrics:{operation}:{counter}"
+METRIC_OPERATIONS = ("create_room", "update_room", "delete_room", "list_rooms")
+_METRIC_COUNTERS = ("calls", "errors", "total_us")
+_MAX_LATENCY_SAMPLES = 200
+
+# Últimas latencias de este proceso por operación
+_latency_samples = {operation: deque(maxlen=_MAX_LATENCY_SAMPLES) for operation in METRIC_OPERATIONS}
+_latency_samples_lock = threading.Lock()
+
+
+class DailyUnavailableError(requests.RequestException):
+    """
+    El circuit breaker está abierto: no se llama a Daily hasta que pase el enfriamiento.
+    Hereda de RequestException para que los llamadores existentes la traten como
+    cualquier error de red.
+    """
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=DAILY_BREAKER_FAILURE_THRESHOLD,
+                 reset_seconds=DAILY_BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._failures = 0
+        self._opened_at = None
+        self._half_open_probe = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self._opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self._opened_at >= self.reset_seconds:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow_request(self):
+        """
+        Cerrado: siempre. Abierto: nunca. Semiabierto: deja pasar una sola
+        llamada de prueba; si sale bien el circuito se cierra.
+        """
+        with self._lock:
+            state = self._state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._half_open_probe:
+                self._half_open_probe = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._half_open_probe = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._half_open_probe or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._half_open_probe = False
+
+
+def _incr(key, delta):
+    if not cache.add(key, delta, timeout=None):
+        try:
+            cache.incr(key, delta)
+        except ValueError:
+            # La clave se desalojó entre add e incr
+            cache.set(key, delta, timeout=None)
+
+
+def _record_metrics(operation, elapsed_ms, error):
+    _incr(_METRICS_KEY.format(operation=operation, counter="calls"), 1)
+    if error:
+        _incr(_METRICS_KEY.format(operation=operation, counter="errors"), 1)
+    # incr solo admite enteros: el tiempo total se acumula en microsegundos
+    _incr(_METRICS_KEY.format(operation=operation, counter="total_us"), round(elapsed_ms * 1000))
+    with _latency_samples_lock:
+        _latency_samples[operation].append(elapsed_ms)
+
+
+def get_daily_metrics():
+    """
+    Devuelve [(operación, {calls, errors, avg_ms, max_ms})] más el estado del breaker.
+    calls, errors y avg_ms suman todos los procesos; max_ms, las últimas
+    llamadas de este proceso.
+    """
+    keys = {
+        (operation, counter): _METRICS_KEY.format(operation=operation, counter=counter)
+        for operation in METRIC_OPERATIONS
+        for counter in _METRIC_COUNTERS
+    }
+    values = cache.get_many(keys.values())
+    rows = []
+    for operation in METRIC_OPERATIONS:
+        calls = values.get(keys[operation, "calls"], 0)
+        if not calls:
+            continue
+        with _latency_samples_lock:
+            samples = list(_latency_samples[operation])
+        rows.append((
+            operation,
+            {
+                "calls": calls,
+                "errors": values.get(keys[operation, "errors"], 0),
+                "avg_ms": values.get(keys[operation, "total_us"], 0) / calls / 1000,
+                "max_ms": max(samples, default=0.0),
+            },
+        ))
+    return {"operations": rows, "breaker_state": daily_client.breaker.state}
+
+
+class DailyClient:
+    def __init__(self):
+        self.breaker = CircuitBreaker()
+        self._session = None
+        self._session_lock = threading.Lock()
+
+    @property
+    def session(self):
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    session = requests.Session()
+                    adapter = HTTPAdapter(
+                        pool_connections=1,
+                        pool_maxsize=DAILY_API_POOL_MAXSIZE,
+                        max_retries=0,  # los reintentos los gestionamos nosotros
+                    )
+                    session.mount("https://", adapter)
+                    session.mount("http://", adapter)
+                    self._session = session
+        return self._session
+
+    @staticmethod
+    def is_configured():
+        return bool(getattr(settings, "DAILY_API_KEY", "") and getattr(settings, "DAILY_DOMAIN", ""))
+
+    @staticmethod
+    def _url(path):
+        base_url = getattr(settings, "DAILY_API_BASE_URL", "https://api.daily.co/v1")
+        return f"{base_url.rstrip('/')}/{path.lstrip('/')}"
+
+    @staticmethod
+    def _headers():
+        return {
+            "Authorization": f"Bearer {getattr(settings, 'DAILY_API_KEY', '')}",
+            "Content-Type": "application/json",
+        }
+
+    def request(self, operation, method, path, idempotent, **kwargs):
+        """
+        Llamada con timeout, reintentos (si es idempotente) y circuit breaker.
+        Devuelve la respuesta (puede ser 4xx); lanza RequestException si no hubo
+        respuesta utilizable o DailyUnavailableError si el circuito está abierto.
+        """
+        if not self.breaker.allow_request():
+            _record_metrics(operation, 0.0, error=True)
+            raise DailyUnavailableError("Daily no disponible (circuit breaker abierto).")
+
+        attempts = 1 + (DAILY_API_MAX_RETRIES if idempotent else 0)
+        for attempt in range(attempts):
+            started = time.perf_counter()
+            try:
+                response = self.session.request(
+                    method,
+                    self._url(path),
+                    headers=self._headers(),
+                    timeout=DAILY_API_TIMEOUT,
+                    **kwargs,
+                )
+                error = None
+            except requests.RequestException as exc:
+                response, error = None, exc
+
+            failed = error is not None or response.status_code in RETRYABLE_STATUS_CODES
+            _record_metrics(operation, (time.perf_counter() - started) * 1000, failed)
+
+            if not failed:
+                self.breaker.record_success()
+                return response
+            if attempt + 1 < attempts:
+                # Backoff exponencial con jitter completo
+                time.sleep(random.uniform(0, DAILY_API_RETRY_BASE_SECONDS * (2 ** attempt)))
+
+        self.breaker.record_failure()
+        if error is not None:
+            raise error
+        return response
+
+    def create_room(self, name, properties=None, privacy="public"):
+        """
+        Crea una sala. No se reintenta (no es idempotente). Devuelve el JSON o None.
+        """
+        response = self.request(
+            "create_room", "POST", "rooms", idempotent=False,
+            json={"name": name, "privacy": privacy, "properties": properties or {}},
+        )
+        if response.status_code not in (200, 201):
+            return None
+        return response.json()
+
+    def update_room(self, name, properties):
+        response = self.request(
+            "update_room", "POST", f"rooms/{name}", idempotent=True,
+            json={"properties": properties},
+        )
+        return response.status_code in (200, 201)
+
+    def delete_room(self, name):
+        """
+        Borra una sala. Devuelve True también si ya no existía (404).
+        """
+        response = self.request("delete_room", "DELETE", f"rooms/{name}", idempotent=True)
+        return response.status_code in (200, 204, 404)
+
+    def list_rooms(self, **params):
+        response = self.request("list_rooms", "GET", "rooms", idempotent=True, params=params)
+        if response.status_code != 200:
+            return None
+        return response.json()
+
+
+daily_client = DailyClient()
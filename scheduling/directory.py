@@ -0,0 +1,101 @@
+# scheduling/directory.py
+"""
+Directorio de disponibilidad semanal de los médicos (paso 1 de la reserva).
+
+Se construye con dos consultas, independientemente del número de médicos:
+los médicos y todas sus franjas activas, ya ordenadas, con un Prefetch
+filtrado. El resultado y el fragmento HTML renderizado se guardan juntos en
+la caché de Django bajo una versión global que se incrementa (al confirmarse
+la transacción) cuando cambia una franja de DoctorAvailability o un médico
+(alta, baja, nombre o rol; ver signals.py). Los cambios hechos con
+bulk_create() o QuerySet.update() llaman a bump_directory_version() a mano.
+"""
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Prefetch
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from accounts.models import User
+
+from .models import DoctorAvailability
+
+DIRECTORY_TIMEOUT = 60 * 60
+DIRECTORY_TEMPLATE = "scheduling/availability_directory.html"
+
+_ENTRY_KEY = "scheduling:availability_directory"
+_VERSION_KEY = "scheduling:availability_directory:version"
+
+
+def build_availability_directory():
+    """
+    [{"doctor_id", "name", "initial", "days": [{"day", "slots"}]}] por médico.
+    """
+    doctors = (
+        User.objects
+        .filter(role=User.Roles.DOCTOR)
+        .order_by("id")
+        .prefetch_related(Prefetch(
+            "availabilities",
+            queryset=DoctorAvailability.objects.filter(is_active=True).order_by("weekday", "start_time"),
+            to_attr="active_availabilities",
+        ))
+    )
+
+    directory = []
+    for doctor in doctors:
+        day_map = defaultdict(list)  # { "Lunes": ["08:00–12:00", ...], ... }
+        for avail in doctor.active_availabilities:
+            label = f"{avail.start_time.strftime('%H:%M')}–{avail.end_time.strftime('%H:%M')}"
+            day_map[avail.get_weekday_display()].append(label)
+
+        directory.append({
+            "doctor_id": doctor.pk,
+            "name": str(doctor),
+            "initial": doctor.get_full_name()[:1].upper(),
+            "days": [{"day": day, "slots": ranges} for day, ranges in day_map.items()],
+        })
+    return directory
+
+
+def get_availability_directory():
+    """
+    (directorio, fragmento HTML) desde la caché, reconstruyéndolos si la
+    versión cambió.
+    """
+    cached = cache.get_many([_ENTRY_KEY, _VERSION_KEY])
+    version = cached.get(_VERSION_KEY, 0)
+    entry = cached.get(_ENTRY_KEY)
+    if entry is None or entry["version"] != version:
+        directory = build_availability_directory()
+        entry = {
+            "version": version,
+            "directory": directory,
+            "doctor_ids": {item["doctor_id"] for item in directory},
+            "html": str(render_to_string(DIRECTORY_TEMPLATE, {"doctors_availability": directory})),
+        }
+        cache.set(_ENTRY_KEY, entry, DIRECTORY_TIMEOUT)
+    return entry["directory"], mark_safe(entry["html"])
+
+
+def is_listed_doctor(user_id):
+    """
+    True si el usuario aparece en el directorio cacheado: sirve para saber si
+    quien deja de ser médico estaba listado.
+    """
+    entry = cache.get(_ENTRY_KEY)
+    return entry is not None and user_id in entry["doctor_ids"]
+
+
+def _bump():
+    try:
+        cache.incr(_VERSION_KEY)
+    except ValueError:
+        cache.set(_VERSION_KEY, 1, timeout=None)
+    cache.delete(_ENTRY_KEY)
+
+
+def bump_directory_version():
+    transaction.on_commit(_bump)
@@ -0,0 +1,138 @@
+# scheduling/fake_daily.py
+"""
+Servidor HTTP local que imita el subconjunto de la API REST de Daily que usamos
+(/rooms). Sirve para probar el outbox, el pool de salas y la limpieza sin red:
+
+    python manage.py fake_daily_server --port 8765
+    DAILY_API_BASE_URL=http://127.0.0.1:8765/v1 DAILY_API_KEY=fake DAILY_DOMAIN=fake.daily.co ...
+
+También se puede levantar en un hilo desde código con FakeDailyServer().
+"""
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeDailyServer:
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, failure_rate=0.0,
+                 domain="fake.daily.co"):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.domain = domain
+        self.rooms = {}
+        self.request_count = 0
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self._httpd.serve_forever()
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status, body):
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _read_json(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                return json.loads(self.rfile.read(length) or b"{}")
+
+            def _guard(self):
+                with server._lock:
+                    server.request_count += 1
+                if server.latency:
+                    time.sleep(server.latency)
+                if not self.headers.get("Authorization", "").startswith("Bearer "):
+                    self._send(401, {"error": "authentication-error"})
+                    return False
+                if server.failure_rate and random.random() < server.failure_rate:
+                    self._send(503, {"error": "service-unavailable"})
+                    return False
+                return True
+
+            def do_POST(self):
+                body = self._read_json()
+                if not self._guard():
+                    return
+                prefix = "/v1/rooms/"
+                if self.path.startswith(prefix) and self.path[len(prefix):].strip("/"):
+                    # Actualizar la configuración de una sala existente
+                    name = self.path[len(prefix):].strip("/")
+                    with server._lock:
+                        room = server.rooms.get(name)
+                        if room is not None:
+                            room["config"].update(body.get("properties", {}))
+                    if room is None:
+                        return self._send(404, {"error": "not-found"})
+                    return self._send(200, room)
+                if self.path.rstrip("/") != "/v1/rooms":
+                    return self._send(404, {"error": "not-found"})
+                name = body.get("name") or f"room-{random.getrandbits(40):x}"
+                room = {
+                    "name": name,
+                    "url": f"https://{server.domain}/{name}",
+                    "privacy": body.get("privacy", "public"),
+                    "config": body.get("properties", {}),
+                }
+                with server._lock:
+                    if name in server.rooms:
+                        return self._send(400, {"error": "invalid-request-error"})
+                    server.rooms[name] = room
+                self._send(200, room)
+
+            def do_GET(self):
+                if not self._guard():
+                    return
+                if self.path.rstrip("/") == "/v1/rooms":
+                    with server._lock:
+                        data = list(server.rooms.values())
+                    return self._send(200, {"total_count": len(data), "data": data})
+                self._send(404, {"error": "not-found"})
+
+            def do_DELETE(self):
+                if not self._guard():
+                    return
+                prefix = "/v1/rooms/"
+                name = self.path[len(prefix):].strip("/") if self.path.startswith(prefix) else ""
+                with server._lock:
+                    existed = server.rooms.pop(name, None) is not None
+                if not existed:
+                    return self._send(404, {"error": "not-found"})
+                self._send(200, {"deleted": True, "name": name})
+
+        return Handler
@@ -173,3 +173,74 @@ class AppointmentSlotForm(forms.Form):
 
         self.fields["slot"].choices = choices
 
+
+
+class EarliestSlotSearchForm(forms.Form):
+    """
+    Búsqueda de los primeros horarios libres con cualquier médico
+    (o solo con los médicos seleccionados).
+    """
+    doctors = forms.ModelMultipleChoiceField(
+        queryset=User.objects.filter(role=User.Roles.DOCTOR),
+        label="Médicos (opcional)",
+        required=False,
+        widget=forms.CheckboxSelectMultiple,
+    )
+    start_date = forms.DateField(
+        label="Desde",
+        required=False,
+        widget=forms.DateInput(attrs={"type": "date"}),
+    )
+    days = forms.IntegerField(
+        label="Días a buscar",
+        min_value=1,
+        max_value=90,
+        initial=30,
+        required=False,
+    )
+    limit = forms.IntegerField(
+        label="Número de resultados",
+        min_value=1,
+        max_value=50,
+        initial=10,
+        required=False,
+    )
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        today = timezone.localdate()
+        self.fields["start_date"].widget.attrs["min"] = today.isoformat()
+
+    def clean_start_date(self):
+        start_date = self.cleaned_data.get("start_date")
+        today = timezone.localdate()
+        if not start_date or start_date < today:
+            return today
+        return start_date
+
+
+class AppointmentListFilterForm(forms.Form):
+    """
+    Filtros de las listas de citas del paciente y del médico (por GET).
+    """
+    SCOPE_UPCOMING = "upcoming"
+    SCOPE_PAST = "past"
+    SCOPE_ALL = "all"
+
+    scope = forms.ChoiceField(
+        label="Mostrar",
+        required=False,
+        choices=[
+            (SCOPE_UPCOMING, "Próximas"),
+            (SCOPE_PAST, "Pasadas"),
+            (SCOPE_ALL, "Todas"),
+        ],
+    )
+    status = forms.ChoiceField(
+        label="Estado",
+        required=False,
+        choices=[("", "Todos")] + list(Appointment.Status.choices),
+    )
+
+    def clean_scope(self):
+        return self.cleaned_data.get("scope") or self.SCOPE_UPCOMING
@@ -0,0 +1,99 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from scheduling.archive import (
+    ARCHIVE_AFTER_DAYS,
+    ARCHIVE_BATCH_SIZE,
+    archivable_appointments,
+    archive_batch,
+    archive_cutoff,
+    restore_batch,
+)
+from scheduling.models import ArchivedAppointment
+
+
+class Command(BaseCommand):
+    help = (
+        "Mueve al archivo las citas completadas o canceladas antiguas (con sus "
+        "consultas) en tandas transaccionales. Se puede interrumpir y relanzar: "
+        "continúa por donde iba. Con --restore las devuelve a la tabla viva."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than-days",
+            type=int,
+            default=ARCHIVE_AFTER_DAYS,
+            help="Archiva las citas programadas hace más de estos días (mínimo 1).",
+        )
+        parser.add_argument("--batch-size", type=int, default=ARCHIVE_BATCH_SIZE)
+        parser.add_argument(
+            "--max-batches",
+            type=int,
+            default=0,
+            help="Detenerse tras este número de tandas (0 = hasta terminar).",
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=0.0,
+            help="Pausa en segundos entre tandas, para dejar paso a las reservas.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Solo cuenta las citas que se archivarían.",
+        )
+        parser.add_argument(
+            "--restore",
+            action="store_true",
+            help="Devuelve las citas archivadas a la tabla viva (las más recientes primero).",
+        )
+
+    def handle(self, *args, **options):
+        if options["older_than_days"] < 1:
+            raise CommandError("--older-than-days debe ser al menos 1.")
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size debe ser positivo.")
+
+        if options["restore"]:
+            label = "restauradas"
+            pending = ArchivedAppointment.objects.count()
+
+            def move():
+                return restore_batch(options["batch_size"])
+        else:
+            label = "archivadas"
+            cutoff = archive_cutoff(options["older_than_days"])
+            pending = archivable_appointments(cutoff).count()
+
+            def move():
+                return archive_batch(cutoff, options["batch_size"])
+
+        self.stdout.write(f"Citas por mover: {pending}")
+        if options["dry_run"] or not pending:
+            return
+
+        started = time.perf_counter()
+        batches = appointments = consultations = 0
+        while not options["max_batches"] or batches < options["max_batches"]:
+            moved, moved_consultations = move()
+            if not moved:
+                break
+            batches += 1
+            appointments += moved
+            consultations += moved_consultations
+            if batches % 20 == 0:
+                elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f"  {appointments}/{pending} citas {label} ({appointments / elapsed:.0f}/s)"
+                )
+            if options["sleep"]:
+                time.sleep(options["sleep"])
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"{appointments} citas y {consultations} consultas {label} "
+            f"en {batches} tandas ({elapsed:.1f}s)."
+        ))
@@ -0,0 +1,173 @@
+import shutil
+import sqlite3
+import statistics
+import tempfile
+import time as time_module
+from contextlib import contextmanager
+from datetime import timedelta
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import Count, Q
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from accounts.models import User
+from dashboard.exports import latest_appointments
+from scheduling.archive import (
+    ARCHIVE_AFTER_DAYS,
+    ARCHIVE_BATCH_SIZE,
+    appointment_sources,
+    archive_batch,
+    archive_cutoff,
+    restore_batch,
+)
+from scheduling.models import UPCOMING_APPOINTMENT_STATUSES, Appointment
+from scheduling.pagination import keyset_paginate
+from scheduling.utils import get_available_slots_over_range
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide las consultas sobre la tabla de citas antes y después de archivar "
+        "las citas antiguas, y el coste de las lecturas que mezclan vivas y archivadas. "
+        "Trabaja sobre una copia temporal de la base SQLite: la base real no cambia."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than-days",
+            type=int,
+            default=ARCHIVE_AFTER_DAYS,
+            help="Antigüedad de las citas que se archivan durante el benchmark.",
+        )
+        parser.add_argument("--repeat", type=int, default=10)
+
+    def handle(self, *args, **options):
+        if options["older_than_days"] < 1:
+            raise CommandError("--older-than-days debe ser al menos 1.")
+        if connections[DEFAULT_DB_ALIAS].vendor != "sqlite":
+            raise CommandError(
+                "benchmark_archive solo funciona con SQLite (trabaja sobre una copia de la base). "
+                "Con PostgreSQL, mide el archivado en una base de staging."
+            )
+
+        with self._database_copy(), override_settings(SCHEDULING_SCHEDULE_INDEX=False):
+            # En la copia se puede partir de la tabla completa
+            while restore_batch(ARCHIVE_BATCH_SIZE)[0]:
+                pass
+            doctor, patient = self._pick_users()
+
+            hot_before = Appointment.objects.count()
+            before = self._measure(doctor, patient, options["repeat"])
+
+            cutoff = archive_cutoff(options["older_than_days"])
+            started = time_module.perf_counter()
+            archived = 0
+            while True:
+                moved, _ = archive_batch(cutoff, ARCHIVE_BATCH_SIZE)
+                if not moved:
+                    break
+                archived += moved
+            archive_seconds = time_module.perf_counter() - started
+
+            hot_after = Appointment.objects.count()
+            after = self._measure(doctor, patient, options["repeat"])
+
+        self.stdout.write(
+            f"Tabla viva: {hot_before} -> {hot_after} citas "
+            f"({archived} archivadas en {archive_seconds:.1f}s)"
+        )
+        self.stdout.write(f"{'Consulta':<26} {'Antes':>10} {'Después':>10} {'Mejora':>8}")
+        for name in before:
+            speedup = before[name] / after[name] if after[name] else 0
+            self.stdout.write(
+                f"{name:<26} {before[name]:>8.2f}ms {after[name]:>8.2f}ms {speedup:>7.1f}x"
+            )
+
+    @contextmanager
+    def _database_copy(self):
+        """
+        Apunta la conexión por defecto a una copia temporal de la base mientras
+        dura el benchmark. Archivar borra y reinserta citas: en la base real, una
+        reserva, cancelación o sincronización concurrente las vería desaparecer.
+        El archivado y las lecturas que se miden usan la conexión por defecto,
+        por eso se cambia su fichero en lugar de usar otro alias.
+        """
+        source = connections[DEFAULT_DB_ALIAS]
+        original_name = source.settings_dict["NAME"]
+        workdir = Path(tempfile.mkdtemp(prefix="saludconectada-archive-"))
+        copy_path = workdir / "copy.sqlite3"
+        source.ensure_connection()
+        target = sqlite3.connect(copy_path)
+        try:
+            # Instantánea consistente, como sync_local_replica
+            source.connection.backup(target)
+        finally:
+            target.close()
+        source.close()
+        source.settings_dict["NAME"] = str(copy_path)
+        try:
+            yield
+        finally:
+            source.close()
+            source.settings_dict["NAME"] = original_name
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    def _pick_users(self):
+        doctor = (
+            User.objects.filter(role=User.Roles.DOCTOR)
+            .annotate(total=Count("doctor_appointments"))
+            .order_by("-total").first()
+        )
+        patient = (
+            User.objects.filter(role=User.Roles.PATIENT)
+            .annotate(total=Count("patient_appointments"))
+            .order_by("-total").first()
+        )
+        if doctor is None or patient is None:
+            raise CommandError("Sin médicos o pacientes: genera datos con generate_synthetic_data.")
+        return doctor, patient
+
+    def _cases(self, doctor, patient):
+        tomorrow = timezone.localdate() + timedelta(days=1)
+        now = timezone.now()
+        return {
+            # Tabla viva: generación de slots, paneles y filtros del admin
+            "conteo_total": lambda: Appointment.objects.count(),
+            "conteo_por_estado": lambda: Appointment.objects.aggregate(
+                **{status: Count("id", filter=Q(status=status)) for status in Appointment.Status.values}
+            ),
+            "slots_medico_14d": lambda: get_available_slots_over_range(doctor, tomorrow, 14),
+            "proximas_paciente": lambda: list(
+                Appointment.objects
+                .filter(patient=patient, status__in=UPCOMING_APPOINTMENT_STATUSES)
+                .order_by("scheduled_datetime")[:5]
+            ),
+            "filtro_admin_estado": lambda: list(
+                Appointment.objects.filter(status=Appointment.Status.COMPLETED)
+                .order_by("-scheduled_datetime")[:20]
+            ),
+            # Lecturas transparentes (vivas + archivadas)
+            "historial_paciente": lambda: keyset_paginate(
+                [
+                    queryset.filter(scheduled_datetime__lt=now).select_related("doctor")
+                    for queryset in appointment_sources(patient=patient)
+                ],
+                descending=True,
+            ),
+            "reporte_ultimas_20": lambda: latest_appointments({}, 20),
+        }
+
+    def _measure(self, doctor, patient, repeat):
+        results = {}
+        for name, run in self._cases(doctor, patient).items():
+            run()
+            timings = []
+            for _ in range(repeat):
+                started = time_module.perf_counter()
+                run()
+                timings.append((time_module.perf_counter() - started) * 1000)
+            results[name] = statistics.median(timings)
+        return results
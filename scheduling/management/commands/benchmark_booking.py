@@ -0,0 +1,143 @@
+import threading
+import time as time_module
+from datetime import datetime, time, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, close_old_connections, connections
+from django.db.models import Count
+from django.utils import timezone
+
+from accounts.models import User
+from scheduling.booking import SlotUnavailableError, book_appointment
+from scheduling.models import Appointment, DoctorAvailability, APPOINTMENT_SLOT_DELTA
+
+BENCH_PREFIX = "bench_booking_"
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide el throughput de reservas cuando muchos clientes concurrentes "
+        "intentan reservar los mismos slots de un mismo médico."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--clients", type=int, default=8, help="Hilos concurrentes.")
+        parser.add_argument("--slots", type=int, default=30, help="Slots en disputa.")
+        parser.add_argument(
+            "--keep",
+            action="store_true",
+            help="No borrar los usuarios y citas de prueba al terminar.",
+        )
+
+    def handle(self, *args, **options):
+        clients = options["clients"]
+        slot_count = options["slots"]
+
+        doctor, patients, slots = self._setup(clients, slot_count)
+        results = {"booked": 0, "conflicts": 0, "locked": 0, "errors": 0}
+        first_errors = []
+        results_lock = threading.Lock()
+        barrier = threading.Barrier(clients)
+
+        def worker(patient):
+            close_old_connections()
+            barrier.wait()
+            try:
+                for slot_start in slots:
+                    try:
+                        book_appointment(patient, doctor, slot_start, reason="benchmark")
+                        outcome = "booked"
+                    except SlotUnavailableError:
+                        outcome = "conflicts"
+                    except OperationalError:
+                        # p. ej. "database is locked" en SQLite
+                        outcome = "locked"
+                    except Exception as exc:
+                        # Cualquier otro fallo cuenta como error: el hilo sigue con el siguiente slot
+                        outcome = "errors"
+                        with results_lock:
+                            first_errors.append(f"{type(exc).__name__}: {exc}")
+                    with results_lock:
+                        results[outcome] += 1
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=worker, args=(p,)) for p in patients]
+        started = time_module.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time_module.perf_counter() - started
+
+        duplicates = (
+            Appointment.objects
+            .filter(doctor=doctor)
+            .exclude(status=Appointment.Status.CANCELED)
+            .values("scheduled_datetime")
+            .annotate(total=Count("id"))
+            .filter(total__gt=1)
+            .count()
+        )
+
+        attempts = clients * slot_count
+        self.stdout.write(f"Clientes: {clients} | Slots en disputa: {slot_count}")
+        self.stdout.write(f"Intentos: {attempts} en {elapsed:.3f}s ({attempts / elapsed:.1f} intentos/s)")
+        self.stdout.write(
+            f"Reservadas: {results['booked']} ({results['booked'] / elapsed:.1f} reservas/s) | "
+            f"Rechazadas: {results['conflicts']} | Bloqueos de BD: {results['locked']} | "
+            f"Errores: {results['errors']}"
+        )
+
+        if not options["keep"]:
+            self._cleanup()
+
+        if duplicates:
+            raise CommandError(f"{duplicates} slots quedaron reservados dos veces.")
+        if results["errors"]:
+            raise CommandError(f"{results['errors']} intentos fallaron; el primero: {first_errors[0]}")
+        accounted = results["booked"] + results["conflicts"] + results["locked"]
+        if accounted != attempts:
+            raise CommandError(f"Solo se contabilizaron {accounted} de {attempts} intentos.")
+        self.stdout.write(self.style.SUCCESS("Sin dobles reservas."))
+
+    def _setup(self, clients, slot_count):
+        self._cleanup()
+        doctor = User.objects.create_user(
+            username=f"{BENCH_PREFIX}doctor",
+            email=f"{BENCH_PREFIX}doctor@example.com",
+            role=User.Roles.DOCTOR,
+        )
+        patients = [
+            User.objects.create_user(
+                username=f"{BENCH_PREFIX}patient{i}",
+                email=f"{BENCH_PREFIX}patient{i}@example.com",
+                role=User.Roles.PATIENT,
+            )
+            for i in range(clients)
+        ]
+        DoctorAvailability.objects.bulk_create(
+            DoctorAvailability(
+                doctor=doctor,
+                weekday=weekday,
+                start_time=time(0, 0),
+                end_time=time(23, 0),
+            )
+            for weekday in range(7)
+        )
+
+        # Slots consecutivos a partir de mañana a las 00:00
+        tomorrow = timezone.localdate() + timedelta(days=1)
+        first = timezone.make_aware(
+            datetime.combine(tomorrow, time.min), timezone.get_current_timezone()
+        )
+        slots = []
+        current = first
+        while len(slots) < slot_count:
+            if timezone.localtime(current).time() < time(23, 0):
+                slots.append(current)
+            current += APPOINTMENT_SLOT_DELTA
+        return doctor, patients, slots
+
+    def _cleanup(self):
+        User.objects.filter(username__startswith=BENCH_PREFIX).delete()
@@ -0,0 +1,66 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from scheduling.room_cleanup import (
+    ROOM_CLEANUP_BATCH_SIZE,
+    ROOM_CLEANUP_CONCURRENCY,
+    ROOM_CLEANUP_RATE_PER_SECOND,
+    cleanup_expired_rooms,
+    expired_room_appointments,
+)
+from scheduling.video_calls import is_daily_configured
+
+
+class Command(BaseCommand):
+    help = (
+        "Borra en Daily las salas de citas ya pasadas y limpia su URL. "
+        "Se puede interrumpir y volver a ejecutar."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=ROOM_CLEANUP_BATCH_SIZE)
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=ROOM_CLEANUP_CONCURRENCY,
+            help="Borrados simultáneos en Daily.",
+        )
+        parser.add_argument(
+            "--rate",
+            type=float,
+            default=ROOM_CLEANUP_RATE_PER_SECOND,
+            help="Máximo de borrados por segundo.",
+        )
+        parser.add_argument("--limit", type=int, default=None, help="Máximo de citas a procesar.")
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Solo contar las salas caducadas pendientes.",
+        )
+
+    def handle(self, *args, **options):
+        if options["dry_run"]:
+            self.stdout.write(f"Salas caducadas pendientes: {expired_room_appointments().count()}")
+            return
+        if not is_daily_configured():
+            raise CommandError("Daily no está configurado (DAILY_API_KEY / DAILY_DOMAIN).")
+
+        def progress(stats):
+            self.stdout.write(
+                f"Revisadas: {stats['scanned']} | Limpiadas: {stats['cleared']} | "
+                f"Fallidas: {stats['failed']}"
+            )
+
+        stats = cleanup_expired_rooms(
+            batch_size=options["batch_size"],
+            concurrency=options["concurrency"],
+            rate=options["rate"],
+            limit=options["limit"],
+            progress=progress,
+        )
+        if stats["stopped"]:
+            raise CommandError(
+                "Daily no está disponible (circuit breaker abierto); vuelve a ejecutar más tarde."
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f"Limpieza terminada: {stats['cleared']} salas borradas, {stats['failed']} fallidas."
+        ))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from scheduling.fake_daily import FakeDailyServer
+
+
+class Command(BaseCommand):
+    help = "Levanta un servidor local que imita la API de salas de Daily (solo para pruebas)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8765)
+        parser.add_argument("--latency", type=float, default=0.0, help="Segundos de espera por petición.")
+        parser.add_argument(
+            "--failure-rate",
+            type=float,
+            default=0.0,
+            help="Fracción de peticiones que responden 503.",
+        )
+
+    def handle(self, *args, **options):
+        server = FakeDailyServer(
+            host=options["host"],
+            port=options["port"],
+            latency=options["latency"],
+            failure_rate=options["failure_rate"],
+        )
+        self.stdout.write(f"API Daily falsa en {server.base_url} (Ctrl+C para salir)")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            server.stop()
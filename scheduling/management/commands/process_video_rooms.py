@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from scheduling.video_outbox import process_due_video_room_tasks
+
+
+class Command(BaseCommand):
+    help = (
+        "Worker del outbox de salas de videollamada: crea en Daily las salas "
+        "pendientes con reintentos y backoff."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Procesa un lote y termina (útil para cron).",
+        )
+        parser.add_argument("--batch-size", type=int, default=20)
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=2.0,
+            help="Segundos de espera cuando no hay tareas pendientes.",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            created, failed = process_due_video_room_tasks(options["batch_size"])
+            if created or failed:
+                self.stdout.write(f"Salas creadas: {created} | Reintentos programados: {failed}")
+            if options["once"]:
+                return
+            if not created and not failed:
+                time.sleep(options["interval"])
@@ -0,0 +1,78 @@
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+
+from accounts.models import User
+from scheduling.summaries import (
+    SLOT_SUMMARY_HORIZON_DAYS,
+    rebuild_slot_summaries,
+    roll_slot_summaries,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconstruye la tabla de resúmenes diarios de slots (o, con --roll, solo "
+        "avanza el horizonte; pensado para ejecutarse cada noche). --verify la "
+        "compara con el cálculo en vivo (ver verify_slot_summaries)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--verify",
+            action="store_true",
+            help="Solo compara la tabla con el cálculo en vivo, sin escribir.",
+        )
+        parser.add_argument(
+            "--roll",
+            action="store_true",
+            help="Borra los días pasados y materializa solo los días nuevos del horizonte.",
+        )
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Con --roll, avanza el horizonte de forma continua en lugar de una sola vez.",
+        )
+        parser.add_argument("--interval", type=float, default=3600.0)
+        parser.add_argument(
+            "--doctor",
+            type=int,
+            action="append",
+            dest="doctor_ids",
+            help="Id de médico a procesar (se puede repetir). Por defecto, todos.",
+        )
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=SLOT_SUMMARY_HORIZON_DAYS,
+            help="Días desde hoy a procesar (máximo el horizonte configurado).",
+        )
+
+    def handle(self, *args, **options):
+        if options["verify"]:
+            call_command(
+                "verify_slot_summaries",
+                doctor_ids=options["doctor_ids"],
+                days=options["days"],
+                stdout=self.stdout,
+            )
+            return
+
+        doctors = None
+        if options["doctor_ids"]:
+            doctors = User.objects.filter(
+                pk__in=options["doctor_ids"], role=User.Roles.DOCTOR
+            )
+
+        if not options["roll"]:
+            written = rebuild_slot_summaries(doctors, days=options["days"])
+            self.stdout.write(self.style.SUCCESS(f"{written} resúmenes reconstruidos."))
+            return
+
+        while True:
+            written = roll_slot_summaries(doctors)
+            self.stdout.write(self.style.SUCCESS(f"Horizonte avanzado: {written} resúmenes nuevos."))
+            if not options["loop"]:
+                return
+            time.sleep(options["interval"])
@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from scheduling.room_pool import (
+    VIDEO_ROOM_POOL_REFILL_BATCH,
+    get_pool_metrics,
+    refill_pool,
+)
+
+
+class Command(BaseCommand):
+    help = "Repone el pool de salas de Daily pre-creadas y muestra sus métricas."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Repone de forma continua en lugar de una sola vez.",
+        )
+        parser.add_argument("--interval", type=float, default=10.0)
+        parser.add_argument("--batch-size", type=int, default=VIDEO_ROOM_POOL_REFILL_BATCH)
+        parser.add_argument("--target", type=int, default=None, help="Tamaño objetivo del pool.")
+
+    def handle(self, *args, **options):
+        while True:
+            created = refill_pool(target=options["target"], batch_size=options["batch_size"])
+            metrics = get_pool_metrics()
+            self.stdout.write(
+                f"Creadas: {created} | Disponibles: {metrics['available']}/{metrics['target']} | "
+                f"Reclamos: {metrics['claim_hits']} ok, {metrics['claim_misses']} sin sala | "
+                f"Retraso de reposición: {metrics['refill_lag_seconds']:.0f}s"
+            )
+            if not options["loop"]:
+                return
+            time.sleep(options["interval"])
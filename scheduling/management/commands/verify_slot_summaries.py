@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.models import User
+from scheduling.summaries import SLOT_SUMMARY_HORIZON_DAYS, verify_slot_summaries
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara la tabla de resúmenes diarios de slots con el cálculo en vivo, "
+        "sin escribir. Termina con error si algún resumen no coincide."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--doctor",
+            type=int,
+            action="append",
+            dest="doctor_ids",
+            help="Id de médico a verificar (se puede repetir). Por defecto, todos.",
+        )
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=SLOT_SUMMARY_HORIZON_DAYS,
+            help="Días desde hoy a verificar (máximo el horizonte configurado).",
+        )
+
+    def handle(self, *args, **options):
+        doctors = None
+        if options["doctor_ids"]:
+            doctors = User.objects.filter(
+                pk__in=options["doctor_ids"], role=User.Roles.DOCTOR
+            )
+
+        mismatches = verify_slot_summaries(doctors, days=options["days"])
+        for doctor, day, stored, expected in mismatches:
+            self.stdout.write(
+                f"{doctor} {day}: guardado={stored} real={expected}"
+            )
+        if mismatches:
+            raise CommandError(
+                f"{len(mismatches)} resúmenes no coinciden con el cálculo en vivo."
+            )
+        self.stdout.write(self.style.SUCCESS("Los resúmenes coinciden."))
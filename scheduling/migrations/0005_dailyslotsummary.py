@@ -0,0 +1,33 @@
+# Generated by Django 5.2.9 on 2026-10-18 12:14
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduling', '0004_alter_appointment_video_call_url'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySlotSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Fecha')),
+                ('free_slot_count', models.PositiveIntegerField(default=0, verbose_name='Slots libres')),
+                ('first_free_start', models.DateTimeField(blank=True, null=True, verbose_name='Primer slot libre')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='slot_summaries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Resumen diario de slots',
+                'verbose_name_plural': 'Resúmenes diarios de slots',
+                'ordering': ('doctor', 'date'),
+                'constraints': [models.UniqueConstraint(fields=('doctor', 'date'), name='unique_slot_summary_per_doctor_date')],
+            },
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.9 on 2026-10-18 12:17
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Min
+from django.utils import timezone
+
+
+def cancel_duplicate_active_appointments(apps, schema_editor):
+    """
+    Antes de crear la restricción, cancela las dobles reservas que pudo dejar la
+    condición de carrera anterior: se conserva la cita creada primero.
+    """
+    Appointment = apps.get_model("scheduling", "Appointment")
+    active = Appointment.objects.exclude(status="CANCELED")
+    duplicated = (
+        active
+        .values("doctor_id", "scheduled_datetime")
+        .annotate(total=Count("id"), keep_id=Min("id"))
+        .filter(total__gt=1)
+    )
+    for row in duplicated:
+        (
+            active
+            .filter(doctor_id=row["doctor_id"], scheduled_datetime=row["scheduled_datetime"])
+            .exclude(pk=row["keep_id"])
+            .update(status="CANCELED", canceled_at=timezone.now())
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduling', '0005_dailyslotsummary'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(cancel_duplicate_active_appointments, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='appointment',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'CANCELED'), _negated=True), fields=('doctor', 'scheduled_datetime'), name='unique_active_appointment_per_doctor_slot'),
+        ),
+    ]
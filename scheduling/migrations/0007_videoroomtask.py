@@ -0,0 +1,33 @@
+# Generated by Django 5.2.9 on 2026-10-18 12:18
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduling', '0006_appointment_unique_active_slot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VideoRoomTask',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('PENDING', 'Pendiente'), ('DONE', 'Completada'), ('FAILED', 'Fallida')], default='PENDING', max_length=20)),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='Intentos')),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Próximo intento')),
+                ('last_error', models.TextField(blank=True, verbose_name='Último error')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('appointment', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='video_room_task', to='scheduling.appointment')),
+            ],
+            options={
+                'verbose_name': 'Tarea de sala de videollamada',
+                'verbose_name_plural': 'Tareas de salas de videollamada',
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='videoroomtask_due_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.9 on 2026-10-18 12:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduling', '0007_videoroomtask'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PooledVideoRoom',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=128, unique=True, verbose_name='Nombre de la sala')),
+                ('url', models.URLField(verbose_name='Enlace')),
+                ('status', models.CharField(choices=[('AVAILABLE', 'Disponible'), ('CLAIMED', 'Asignada')], default='AVAILABLE', max_length=20)),
+                ('expiry_synced', models.BooleanField(default=False, help_text='Indica si la caducidad de la cita ya se fijó en Daily.', verbose_name='Caducidad sincronizada')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('claimed_at', models.DateTimeField(blank=True, null=True)),
+                ('appointment', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='pooled_video_room', to='scheduling.appointment')),
+            ],
+            options={
+                'verbose_name': 'Sala de videollamada pre-creada',
+                'verbose_name_plural': 'Salas de videollamada pre-creadas',
+                'indexes': [models.Index(fields=['status', 'created_at'], name='pooledroom_status_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.9 on 2026-10-18 12:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduling', '0008_pooledvideoroom'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='appointment',
+            name='video_room_lock_until',
+            field=models.DateTimeField(blank=True, help_text='Lease de creación de la sala: mientras esté vigente, otra petición la está creando.', null=True),
+        ),
+    ]
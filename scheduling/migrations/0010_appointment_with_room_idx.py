@@ -0,0 +1,19 @@
+# Generated by Django 5.2.9 on 2026-10-18 12:24
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduling', '0009_appointment_video_room_lock_until'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(condition=models.Q(('video_call_url__isnull', False)), fields=['scheduled_datetime', 'id'], name='appointment_with_room_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.9 on 2026-10-18 12:44
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduling', '0012_appointment_updated_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(condition=models.Q(('status__in', ('PENDING', 'CONFIRMED', 'IN_PROGRESS'))), fields=['patient', 'scheduled_datetime'], name='appointment_patient_next_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(condition=models.Q(('status__in', ('PENDING', 'CONFIRMED', 'IN_PROGRESS'))), fields=['doctor', 'scheduled_datetime'], name='appointment_doctor_next_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['scheduled_datetime', 'id'], name='appointment_sched_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='doctoravailability',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['doctor', 'weekday', 'start_time'], name='availability_active_idx'),
+        ),
+    ]
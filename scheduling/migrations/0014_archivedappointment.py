@@ -0,0 +1,38 @@
+# Generated by Django 5.2.9 on 2026-10-18 12:50
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduling', '0013_hot_query_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedAppointment',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('scheduled_datetime', models.DateTimeField(verbose_name='Fecha y hora de la cita')),
+                ('reason', models.CharField(blank=True, max_length=255, verbose_name='Motivo de consulta')),
+                ('status', models.CharField(choices=[('PENDING', 'Pendiente'), ('CONFIRMED', 'Confirmada'), ('IN_PROGRESS', 'En curso'), ('COMPLETED', 'Completada'), ('CANCELED', 'Cancelada')], max_length=20)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('canceled_at', models.DateTimeField(blank=True, null=True)),
+                ('video_call_url', models.URLField(blank=True, null=True)),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Archivada')),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_doctor_appointments', to=settings.AUTH_USER_MODEL)),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_patient_appointments', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Cita archivada',
+                'verbose_name_plural': 'Citas archivadas',
+                'indexes': [models.Index(fields=['patient', 'scheduled_datetime', 'id'], name='archived_patient_sched_idx'), models.Index(fields=['doctor', 'scheduled_datetime', 'id'], name='archived_doctor_sched_idx'), models.Index(fields=['scheduled_datetime', 'id'], name='archived_sched_idx')],
+            },
+        ),
+    ]
@@ -5,13 +5,25 @@ from django.conf import settings
 from django.db import models
 from django.utils import timezone
 from datetime import timedelta
-from .video_calls import create_daily_room_for_appointment
+import time
+from SaludConectada.db_routing import pin_primary
+from .video_calls import VIDEO_ROOM_TTL, create_daily_room_for_appointment
 
 
 User = settings.AUTH_USER_MODEL
 APPOINTMENT_SLOT_MINUTES = 20
 APPOINTMENT_SLOT_DELTA = timedelta(minutes=APPOINTMENT_SLOT_MINUTES)
 
+# Creación de sala "single-flight": quien gana el lease crea la sala y el resto espera
+VIDEO_ROOM_CREATION_LEASE = timedelta(seconds=30)
+VIDEO_ROOM_WAIT_SECONDS = 5
+VIDEO_ROOM_POLL_SECONDS = 0.1
+
+# Estados de las citas por venir (paneles de paciente y médico). Los índices
+# parciales usan esta misma lista: los filtros deben usarla tal cual para que
+# el planificador reconozca el predicado del índice.
+UPCOMING_APPOINTMENT_STATUSES = ("PENDING", "CONFIRMED", "IN_PROGRESS")
+
 class Appointment(models.Model):
     class Status(models.TextChoices):
         PENDING = "PENDING", "Pendiente"
@@ -39,6 +51,7 @@ class Appointment(models.Model):
         default=Status.PENDING,
     )
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     canceled_at = models.DateTimeField(null=True, blank=True)
 
     video_call_url = models.URLField(
@@ -46,20 +59,145 @@ class Appointment(models.Model):
         null=True,
         help_text="Enlace a la sala de videollamada.",
     )
+    video_room_lock_until = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="Lease de creación de la sala: mientras esté vigente, otra petición la está creando.",
+    )
+
+    class Meta:
+        constraints = [
+            # Un médico no puede tener dos citas activas en el mismo slot
+            models.UniqueConstraint(
+                fields=["doctor", "scheduled_datetime"],
+                condition=~models.Q(status="CANCELED"),
+                name="unique_active_appointment_per_doctor_slot",
+            ),
+        ]
+        indexes = [
+            # Listas paginadas por cursor de paciente y médico
+            models.Index(
+                fields=["patient", "scheduled_datetime", "id"],
+                name="appointment_patient_sched_idx",
+            ),
+            models.Index(
+                fields=["doctor", "scheduled_datetime", "id"],
+                name="appointment_doctor_sched_idx",
+            ),
+            # Solo las citas con sala: la limpieza de salas caducadas recorre este índice
+            models.Index(
+                fields=["scheduled_datetime", "id"],
+                condition=models.Q(video_call_url__isnull=False),
+                name="appointment_with_room_idx",
+            ),
+            # Cursor de cambios de la sincronización externa (dashboard.external_sync)
+            models.Index(fields=["updated_at", "id"], name="appointment_updated_idx"),
+            # Próximas citas de los paneles: solo las no finalizadas, ya en orden
+            models.Index(
+                fields=["patient", "scheduled_datetime"],
+                condition=models.Q(status__in=UPCOMING_APPOINTMENT_STATUSES),
+                name="appointment_patient_next_idx",
+            ),
+            models.Index(
+                fields=["doctor", "scheduled_datetime"],
+                condition=models.Q(status__in=UPCOMING_APPOINTMENT_STATUSES),
+                name="appointment_doctor_next_idx",
+            ),
+            # Rangos de fechas sin médico ni paciente: reportes y ocupación diaria
+            models.Index(fields=["scheduled_datetime", "id"], name="appointment_sched_idx"),
+        ]
+
+    # Las citas movidas al archivo (ArchivedAppointment) responden True
+    is_archived = False
+
+    @property
+    def is_video_room_expired(self):
+        """
+        La sala de la cita ya caducó en Daily (o caducaría nada más crearse).
+        """
+        return self.scheduled_datetime + VIDEO_ROOM_TTL <= timezone.now()
 
-    def ensure_video_call_url(self, save=True):
+    def ensure_video_call_url(self, wait_seconds=VIDEO_ROOM_WAIT_SECONDS):
         """
         Asegura que la cita tiene una sala de videollamada asignada.
-        Ahora usa Daily para crearla si no existe.
+        Primero intenta reclamar una sala pre-creada del pool; si el pool está
+        vacío, crea la sala en Daily en ese momento.
+
+        Si varias peticiones llegan a la vez, solo la que gana el lease
+        (UPDATE condicional sobre video_room_lock_until) llama a Daily; las demás
+        esperan hasta `wait_seconds` a que aparezca la URL y devuelven None si no llega.
         """
-        if not self.video_call_url:
-            url = create_daily_room_for_appointment(self)
+        if self.video_call_url:
+            return self.video_call_url
+        if self.is_video_room_expired:
+            return None
+
+        now = timezone.now()
+        acquired = (
+            Appointment.objects
+            .filter(pk=self.pk)
+            .filter(models.Q(video_call_url__isnull=True) | models.Q(video_call_url=""))
+            .filter(models.Q(video_room_lock_until__isnull=True) | models.Q(video_room_lock_until__lt=now))
+            .update(video_room_lock_until=now + VIDEO_ROOM_CREATION_LEASE)
+        )
+        if not acquired:
+            return self._wait_for_video_call_url(wait_seconds)
+
+        # Import local para evitar el ciclo models -> room_pool -> models
+        from .room_pool import claim_pooled_room
+
+        url = None
+        try:
+            room = claim_pooled_room(self)
+            url = room.url if room else create_daily_room_for_appointment(self)
+        finally:
+            # Liberar el lease también si Daily falla, para que otro pueda reintentar
+            fields = {"video_room_lock_until": None}
             if url:
-                self.video_call_url = url
-                if save:
-                    self.save(update_fields=["video_call_url"])
+                fields["video_call_url"] = url
+            Appointment.objects.filter(pk=self.pk).update(**fields)
+
+        self.video_room_lock_until = None
+        if url:
+            self.video_call_url = url
         return self.video_call_url
 
+    def _wait_for_video_call_url(self, wait_seconds):
+        """
+        Espera a que la petición que tiene el lease guarde la URL.
+        Deja de esperar si el lease se libera sin URL (la creación falló).
+        """
+        deadline = time.monotonic() + wait_seconds
+        while True:
+            self.refresh_from_db(fields=["video_call_url", "video_room_lock_until"])
+            if self.video_call_url or self.video_room_lock_until is None:
+                return self.video_call_url or None
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(VIDEO_ROOM_POLL_SECONDS)
+
+    def request_video_room(self):
+        """
+        Encola la creación de la sala en el outbox (idempotente).
+        El worker `process_video_rooms` llamará a ensure_video_call_url.
+        Si la tarea agotó sus reintentos y la cita sigue en pie, quien abre la
+        videollamada la vuelve a poner en cola desde cero.
+        """
+        if self.video_call_url or self.is_video_room_expired:
+            return None
+        task, created = VideoRoomTask.objects.get_or_create(appointment=self)
+        if (
+            not created
+            and task.status == VideoRoomTask.Status.FAILED
+            and self.status != self.Status.CANCELED
+        ):
+            task.status = VideoRoomTask.Status.PENDING
+            task.attempts = 0
+            task.next_attempt_at = timezone.now()
+            task.save(update_fields=["status", "attempts", "next_attempt_at", "updated_at"])
+        return task
+
+    @pin_primary()
     def cancel(self):
         """
         Lógica central de cancelación.
@@ -72,11 +210,63 @@ class Appointment(models.Model):
             return
         self.status = self.Status.CANCELED
         self.canceled_at = timezone.now()
-        self.save()
+        self.save(update_fields=["status", "canceled_at", "updated_at"])
+
+        # Import local para evitar el ciclo models -> summaries -> utils -> models
+        from .summaries import refresh_slot_summary_for_appointment
+        refresh_slot_summary_for_appointment(self)
 
     def __str__(self):
         return f"Cita {self.id} - {self.patient} con {self.doctor} el {self.scheduled_datetime}"
 
+class ArchivedAppointment(models.Model):
+    """
+    Cita finalizada o cancelada hace más de un año, movida fuera de la tabla
+    caliente por scheduling.archive. Conserva el id original, así que las
+    listas de historial y las exportaciones la mezclan con las citas vivas.
+    """
+    Status = Appointment.Status
+    is_archived = True
+
+    id = models.BigIntegerField(primary_key=True)
+    patient = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="archived_patient_appointments",
+    )
+    doctor = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="archived_doctor_appointments",
+    )
+    scheduled_datetime = models.DateTimeField("Fecha y hora de la cita")
+    reason = models.CharField("Motivo de consulta", max_length=255, blank=True)
+    status = models.CharField(max_length=20, choices=Status.choices)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    canceled_at = models.DateTimeField(null=True, blank=True)
+    video_call_url = models.URLField(blank=True, null=True)
+    archived_at = models.DateTimeField("Archivada", default=timezone.now)
+
+    class Meta:
+        verbose_name = "Cita archivada"
+        verbose_name_plural = "Citas archivadas"
+        indexes = [
+            models.Index(
+                fields=["patient", "scheduled_datetime", "id"],
+                name="archived_patient_sched_idx",
+            ),
+            models.Index(
+                fields=["doctor", "scheduled_datetime", "id"],
+                name="archived_doctor_sched_idx",
+            ),
+            models.Index(fields=["scheduled_datetime", "id"], name="archived_sched_idx"),
+        ]
+
+    def __str__(self):
+        return f"Cita archivada {self.id} - {self.patient} con {self.doctor} el {self.scheduled_datetime}"
+
+
 class DoctorAvailability(models.Model):
     class Weekday(models.IntegerChoices):
         MONDAY = 0, "Lunes"
@@ -102,6 +292,122 @@ class DoctorAvailability(models.Model):
         verbose_name = "Disponibilidad de médico"
         verbose_name_plural = "Disponibilidades de médicos"
         ordering = ("doctor", "weekday", "start_time")
+        indexes = [
+            # Franjas activas de un médico por día de la semana, ya ordenadas
+            models.Index(
+                fields=["doctor", "weekday", "start_time"],
+                condition=models.Q(is_active=True),
+                name="availability_active_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.doctor} - {self.get_weekday_display()} {self.start_time}-{self.end_time}"
+
+class DailySlotSummary(models.Model):
+    """
+    Resumen materializado de slots libres por médico y día (horizonte móvil).
+    Se mantiene de forma incremental desde scheduling.summaries.
+    """
+    doctor = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="slot_summaries",
+    )
+    date = models.DateField("Fecha")
+    free_slot_count = models.PositiveIntegerField("Slots libres", default=0)
+    first_free_start = models.DateTimeField("Primer slot libre", null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Resumen diario de slots"
+        verbose_name_plural = "Resúmenes diarios de slots"
+        ordering = ("doctor", "date")
+        constraints = [
+            models.UniqueConstraint(
+                fields=["doctor", "date"],
+                name="unique_slot_summary_per_doctor_date",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.doctor} - {self.date}: {self.free_slot_count} slots"
+
+
+class VideoRoomTask(models.Model):
+    """
+    Outbox persistente para crear la sala de videollamada fuera de la petición.
+    La procesa el comando `process_video_rooms` (ver scheduling.video_outbox).
+    """
+    class Status(models.TextChoices):
+        PENDING = "PENDING", "Pendiente"
+        DONE = "DONE", "Completada"
+        FAILED = "FAILED", "Fallida"
+
+    appointment = models.OneToOneField(
+        Appointment,
+        on_delete=models.CASCADE,
+        related_name="video_room_task",
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=Status.choices,
+        default=Status.PENDING,
+    )
+    attempts = models.PositiveIntegerField("Intentos", default=0)
+    next_attempt_at = models.DateTimeField("Próximo intento", default=timezone.now)
+    last_error = models.TextField("Último error", blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Tarea de sala de videollamada"
+        verbose_name_plural = "Tareas de salas de videollamada"
+        indexes = [
+            models.Index(fields=["status", "next_attempt_at"], name="videoroomtask_due_idx"),
+        ]
+
+    def __str__(self):
+        return f"Sala para cita {self.appointment_id} ({self.get_status_display()})"
+
+
+class PooledVideoRoom(models.Model):
+    """
+    Sala de Daily creada por adelantado. Al reservar una cita se reclama una
+    sala disponible y solo se ajusta su caducidad (ver scheduling.room_pool).
+    """
+    class Status(models.TextChoices):
+        AVAILABLE = "AVAILABLE", "Disponible"
+        CLAIMED = "CLAIMED", "Asignada"
+
+    name = models.CharField("Nombre de la sala", max_length=128, unique=True)
+    url = models.URLField("Enlace")
+    status = models.CharField(
+        max_length=20,
+        choices=Status.choices,
+        default=Status.AVAILABLE,
+    )
+    appointment = models.OneToOneField(
+        Appointment,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="pooled_video_room",
+    )
+    expiry_synced = models.BooleanField(
+        "Caducidad sincronizada",
+        default=False,
+        help_text="Indica si la caducidad de la cita ya se fijó en Daily.",
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Sala de videollamada pre-creada"
+        verbose_name_plural = "Salas de videollamada pre-creadas"
+        indexes = [
+            models.Index(fields=["status", "created_at"], name="pooledroom_status_idx"),
+        ]
 
     def __str__(self):
-        return f"{self.doctor} - {self.get_weekday_display()} {self.start_time}-{self.end_time}"
\ No newline at end of file
+        return f"{self.name} ({self.get_status_display()})"
@@ -0,0 +1,96 @@
+# scheduling/pagination.py
+"""
+Paginación por cursor (keyset) sobre (scheduled_datetime, id).
+
+A diferencia de OFFSET, cada página es un rango del índice que empieza justo
+después de la última fila vista, así que cuesta lo mismo la página 1 que la 500.
+Con varias fuentes (citas vivas y archivadas) cada una se recorre por su índice
+y las filas se mezclan por el mismo orden.
+"""
+import base64
+from dataclasses import dataclass, field
+from datetime import datetime
+from itertools import islice
+
+from django.db.models import Q
+
+from .archive import merge_by_schedule
+
+APPOINTMENT_PAGE_SIZE = 20
+
+
+def encode_cursor(appointment):
+    raw = f"{appointment.scheduled_datetime.isoformat()}|{appointment.pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(value):
+    """
+    Devuelve (scheduled_datetime, id) o None si el cursor no es válido.
+    """
+    if not value:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(value + "=" * (-len(value) % 4)).decode()
+        moment, pk = raw.rsplit("|", 1)
+        return datetime.fromisoformat(moment), int(pk)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+@dataclass
+class KeysetPage:
+    items: list = field(default_factory=list)
+    next_cursor: str = None
+    previous_cursor: str = None
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+def _seek(queryset, cursor, lookup):
+    moment, pk = cursor
+    return queryset.filter(
+        Q(**{f"scheduled_datetime__{lookup}": moment})
+        | Q(scheduled_datetime=moment, **{f"id__{lookup}": pk})
+    )
+
+
+def keyset_paginate(queryset, descending=False, after=None, before=None,
+                    page_size=APPOINTMENT_PAGE_SIZE):
+    """
+    Devuelve la página que sigue al cursor `after` (o la que precede a `before`).
+    Sin cursores, devuelve la primera página. `queryset` puede ser una lista de
+    querysets (ver scheduling.archive.appointment_sources).
+    """
+    sources = queryset if isinstance(queryset, (list, tuple)) else [queryset]
+    forward = before is None or after is not None
+    cursor = after if forward else before
+    # Hacia delante se sigue el orden de la lista; hacia atrás, el inverso
+    reverse_scan = descending == forward
+    lookup = "lt" if reverse_scan else "gt"
+    ordering = ("-scheduled_datetime", "-id") if reverse_scan else ("scheduled_datetime", "id")
+
+    if cursor is not None:
+        sources = [_seek(source, cursor, lookup) for source in sources]
+    rows = [list(source.order_by(*ordering)[:page_size + 1]) for source in sources]
+    rows = list(islice(merge_by_schedule(rows, descending=reverse_scan), page_size + 1))
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if not forward:
+        rows.reverse()
+
+    page = KeysetPage(items=rows)
+    if rows:
+        if forward:
+            page.next_cursor = encode_cursor(rows[-1]) if has_more else None
+            page.previous_cursor = encode_cursor(rows[0]) if cursor is not None else None
+        else:
+            page.previous_cursor = encode_cursor(rows[0]) if has_more else None
+            page.next_cursor = encode_cursor(rows[-1])
+    return page
@@ -0,0 +1,149 @@
+# scheduling/room_cleanup.py
+"""
+Limpieza de salas de Daily caducadas.
+
+Las salas se crean con `exp` = hora de la cita + VIDEO_ROOM_TTL, pero siguen
+apareciendo en el listado de Daily y la cita conserva la URL. Este módulo recorre
+las citas pasadas con sala (índice parcial `appointment_with_room_idx`), borra las
+salas en Daily con un pool acotado de workers asyncio y un límite de peticiones
+por segundo, y limpia `video_call_url` en lotes con un único UPDATE.
+
+Es reanudable: una cita solo sale del índice cuando su sala se borró (o ya no
+existía), así que si el proceso se interrumpe basta con volver a ejecutarlo.
+"""
+import asyncio
+import time
+
+import requests
+from django.db.models import Q
+from django.utils import timezone
+
+from .daily_client import DailyUnavailableError
+from .models import Appointment, PooledVideoRoom
+from .video_calls import VIDEO_ROOM_TTL, delete_daily_room, is_daily_configured, room_name_from_url
+
+ROOM_CLEANUP_BATCH_SIZE = 200
+ROOM_CLEANUP_CONCURRENCY = 8
+# Por debajo del límite de la API REST de Daily
+ROOM_CLEANUP_RATE_PER_SECOND = 10
+
+
+def expired_room_appointments(now=None):
+    """
+    Citas cuya sala ya caducó y que aún guardan la URL.
+    """
+    now = now or timezone.now()
+    return Appointment.objects.filter(
+        video_call_url__isnull=False,
+        scheduled_datetime__lt=now - VIDEO_ROOM_TTL,
+    )
+
+
+class _RateLimiter:
+    """
+    Reparte las llamadas a intervalos regulares de 1/rate segundos.
+    """
+
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate else 0
+        self._next_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next_at - now
+            self._next_at = max(now, self._next_at) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+async def _delete_rooms(names, concurrency, rate):
+    """
+    Borra las salas en Daily con `concurrency` workers y devuelve
+    (nombres borrados, circuito abierto).
+    """
+    queue = asyncio.Queue()
+    for name in names:
+        queue.put_nowait(name)
+    limiter = _RateLimiter(rate)
+    deleted = set()
+    state = {"unavailable": False}
+
+    async def worker():
+        while not state["unavailable"]:
+            try:
+                name = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            await limiter.wait()
+            try:
+                # El cliente de Daily es síncrono: cada borrado va a un hilo
+                if await asyncio.to_thread(delete_daily_room, name):
+                    deleted.add(name)
+            except DailyUnavailableError:
+                state["unavailable"] = True
+            except requests.RequestException:
+                pass
+
+    await asyncio.gather(*(worker() for _ in range(max(1, min(concurrency, len(names))))))
+    return deleted, state["unavailable"]
+
+
+def cleanup_expired_rooms(batch_size=ROOM_CLEANUP_BATCH_SIZE, concurrency=ROOM_CLEANUP_CONCURRENCY,
+                          rate=ROOM_CLEANUP_RATE_PER_SECOND, limit=None, progress=None):
+    """
+    Borra las salas caducadas por lotes. Devuelve un dict con
+    scanned / cleared / failed / stopped (circuito de Daily abierto).
+
+    Dentro de una ejecución se avanza con un cursor (scheduled_datetime, id)
+    para no reintentar en bucle las salas que fallaron; en la siguiente
+    ejecución se vuelven a intentar.
+    """
+    stats = {"scanned": 0, "cleared": 0, "failed": 0, "stopped": False}
+    if not is_daily_configured():
+        return stats
+
+    now = timezone.now()
+    cursor = None
+    while limit is None or stats["scanned"] < limit:
+        queryset = expired_room_appointments(now)
+        if cursor is not None:
+            queryset = queryset.filter(
+                Q(scheduled_datetime__gt=cursor[0])
+                | Q(scheduled_datetime=cursor[0], id__gt=cursor[1])
+            )
+        size = batch_size if limit is None else min(batch_size, limit - stats["scanned"])
+        rows = list(
+            queryset
+            .order_by("scheduled_datetime", "id")
+            .values_list("id", "scheduled_datetime", "video_call_url")[:size]
+        )
+        if not rows:
+            break
+        cursor = (rows[-1][1], rows[-1][0])
+
+        names = {pk: room_name_from_url(url) for pk, _, url in rows}
+        deleted, unavailable = asyncio.run(
+            _delete_rooms({name for name in names.values() if name}, concurrency, rate)
+        )
+
+        # URLs vacías o sin nombre de sala: no hay nada que borrar en Daily
+        cleared_ids = [pk for pk, name in names.items() if not name or name in deleted]
+        if cleared_ids:
+            # update() no aplica auto_now: updated_at a mano para que la
+            # sincronización externa (dashboard.external_sync) vea el cambio
+            Appointment.objects.filter(pk__in=cleared_ids).update(
+                video_call_url=None, updated_at=timezone.now(),
+            )
+            PooledVideoRoom.objects.filter(appointment_id__in=cleared_ids).delete()
+
+        stats["scanned"] += len(rows)
+        stats["cleared"] += len(cleared_ids)
+        stats["failed"] += len(rows) - len(cleared_ids)
+        if progress:
+            progress(stats)
+        if unavailable:
+            stats["stopped"] = True
+            break
+    return stats
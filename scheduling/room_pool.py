@@ -0,0 +1,224 @@
+# scheduling/room_pool.py
+"""
+Pool de salas de Daily pre-creadas.
+
+Crear una sala cuesta un viaje de ida y vuelta a Daily justo antes de la llamada.
+Con el pool, `Appointment.ensure_video_call_url` reclama una sala ya creada con
+un UPDATE condicional y solo le fija la caducidad; el comando
+`refill_video_room_pool` mantiene el pool lleno creando salas por lotes.
+
+Los contadores de reclamos y el retraso de reposición se guardan en la caché de
+Django (cache.add/cache.incr, sin perder incrementos entre procesos) para que
+cualquier proceso pueda consultarlos; la latencia de reclamo, en un buffer acotado
+de cada proceso.
+"""
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError
+from django.utils import timezone
+from django.utils.crypto import get_random_string
+
+from .models import PooledVideoRoom
+from .video_calls import (
+    appointment_room_expiry,
+    create_daily_room,
+    is_daily_configured,
+    update_daily_room_expiry,
+)
+
+VIDEO_ROOM_POOL_REFILL_BATCH = 10
+VIDEO_ROOM_POOL_REFILL_WORKERS = 4
+# Las salas sin asignar caducan en Daily a los N días; dejamos un día de margen
+VIDEO_ROOM_POOL_IDLE_DAYS = 30
+VIDEO_ROOM_POOL_CLAIM_CANDIDATES = 5
+
+_CLAIM_HITS_KEY = "scheduling:room_pool:claim_hits"
+_CLAIM_MISSES_KEY = "scheduling:room_pool:claim_misses"
+_BELOW_TARGET_SINCE_KEY = "scheduling:room_pool:below_target_since"
+_LAST_REFILL_KEY = "scheduling:room_pool:last_refill"
+_MAX_LATENCY_SAMPLES = 200
+
+# Últimas latencias de reclamo de este proceso
+_claim_latencies = deque(maxlen=_MAX_LATENCY_SAMPLES)
+_claim_latencies_lock = threading.Lock()
+
+
+def get_pool_target_size():
+    return getattr(settings, "VIDEO_ROOM_POOL_SIZE", 20)
+
+
+def _claimable_rooms():
+    cutoff = timezone.now() - timedelta(days=VIDEO_ROOM_POOL_IDLE_DAYS - 1)
+    return PooledVideoRoom.objects.filter(
+        status=PooledVideoRoom.Status.AVAILABLE,
+        created_at__gte=cutoff,
+    )
+
+
+def _incr(key):
+    if not cache.add(key, 1, timeout=None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            # La clave se desalojó entre add e incr
+            cache.set(key, 1, timeout=None)
+
+
+def _record_claim(started, hit):
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    with _claim_latencies_lock:
+        _claim_latencies.append(elapsed_ms)
+
+    _incr(_CLAIM_HITS_KEY if hit else _CLAIM_MISSES_KEY)
+
+    # El pool bajó del objetivo: empieza a contar el retraso de reposición
+    cache.add(_BELOW_TARGET_SINCE_KEY, timezone.now(), timeout=None)
+
+
+def sync_room_expiry(room, appointment):
+    """
+    Fija en Daily la caducidad de la cita (best effort). Si falla, la sala sigue
+    siendo usable y `refill_pool` reintenta la sincronización.
+    """
+    try:
+        synced = update_daily_room_expiry(room.name, appointment_room_expiry(appointment))
+    except requests.RequestException:
+        synced = False
+    if synced:
+        PooledVideoRoom.objects.filter(pk=room.pk).update(expiry_synced=True)
+        room.expiry_synced = True
+    return synced
+
+
+def claim_pooled_room(appointment):
+    """
+    Reclama atómicamente una sala disponible para la cita y devuelve el
+    PooledVideoRoom, o None si el pool está vacío o desactivado (tamaño 0).
+
+    Varios procesos pueden reclamar a la vez: cada uno prueba candidatos en orden
+    aleatorio y solo gana quien consigue el UPDATE ... WHERE status='AVAILABLE'.
+    """
+    existing = PooledVideoRoom.objects.filter(appointment=appointment).first()
+    if existing:
+        return existing
+    if not get_pool_target_size():
+        return None
+
+    started = time.perf_counter()
+    candidates = list(
+        _claimable_rooms()
+        .order_by("created_at")
+        .values_list("pk", flat=True)[:VIDEO_ROOM_POOL_CLAIM_CANDIDATES]
+    )
+    random.shuffle(candidates)
+
+    for room_id in candidates:
+        try:
+            claimed = PooledVideoRoom.objects.filter(
+                pk=room_id,
+                status=PooledVideoRoom.Status.AVAILABLE,
+            ).update(
+                status=PooledVideoRoom.Status.CLAIMED,
+                appointment=appointment,
+                claimed_at=timezone.now(),
+            )
+        except IntegrityError:
+            # Otra petición ya asignó una sala a esta cita
+            return PooledVideoRoom.objects.filter(appointment=appointment).first()
+        if claimed:
+            _record_claim(started, hit=True)
+            room = PooledVideoRoom.objects.get(pk=room_id)
+            sync_room_expiry(room, appointment)
+            return room
+
+    _record_claim(started, hit=False)
+    return None
+
+
+def _create_pool_room(_):
+    name = f"pool-{get_random_string(16).lower()}"
+    exp = int((timezone.now() + timedelta(days=VIDEO_ROOM_POOL_IDLE_DAYS)).timestamp())
+    try:
+        data = create_daily_room(name, {"exp": exp})
+    except requests.RequestException:
+        return None
+    if not data or not data.get("url"):
+        return None
+    return PooledVideoRoom(name=data.get("name", name), url=data["url"])
+
+
+def refill_pool(target=None, batch_size=VIDEO_ROOM_POOL_REFILL_BATCH):
+    """
+    Repone el pool hasta `target` salas disponibles, creando como mucho
+    `batch_size` por llamada en paralelo. También descarta salas sin asignar
+    a punto de caducar y reintenta fijar la caducidad de salas ya asignadas.
+    Devuelve el número de salas creadas.
+    """
+    if not is_daily_configured():
+        return 0
+    target = get_pool_target_size() if target is None else target
+
+    cutoff = timezone.now() - timedelta(days=VIDEO_ROOM_POOL_IDLE_DAYS - 1)
+    PooledVideoRoom.objects.filter(
+        status=PooledVideoRoom.Status.AVAILABLE,
+        created_at__lt=cutoff,
+    ).delete()
+
+    for room in (
+        PooledVideoRoom.objects
+        .filter(status=PooledVideoRoom.Status.CLAIMED, expiry_synced=False)
+        .select_related("appointment")
+        .exclude(appointment=None)[:batch_size]
+    ):
+        sync_room_expiry(room, room.appointment)
+
+    available = _claimable_rooms().count()
+    to_create = min(max(target - available, 0), batch_size)
+
+    rooms = []
+    if to_create:
+        with ThreadPoolExecutor(max_workers=VIDEO_ROOM_POOL_REFILL_WORKERS) as executor:
+            rooms = [room for room in executor.map(_create_pool_room, range(to_create)) if room]
+        PooledVideoRoom.objects.bulk_create(rooms)
+
+    if available + len(rooms) >= target:
+        cache.delete(_BELOW_TARGET_SINCE_KEY)
+    else:
+        cache.add(_BELOW_TARGET_SINCE_KEY, timezone.now(), timeout=None)
+    cache.set(_LAST_REFILL_KEY, timezone.now(), timeout=None)
+    return len(rooms)
+
+
+def get_pool_metrics():
+    """
+    Métricas del pool: tamaño actual y objetivo, latencia de reclamo (media y p95),
+    aciertos/fallos y segundos que lleva el pool por debajo del objetivo.
+    La latencia es la de los reclamos de este proceso.
+    """
+    with _claim_latencies_lock:
+        samples = sorted(_claim_latencies)
+    counters = cache.get_many([_CLAIM_HITS_KEY, _CLAIM_MISSES_KEY])
+    below_since = cache.get(_BELOW_TARGET_SINCE_KEY)
+    now = timezone.now()
+
+    return {
+        "available": _claimable_rooms().count(),
+        "target": get_pool_target_size(),
+        "claimed_pending_expiry": PooledVideoRoom.objects.filter(
+            status=PooledVideoRoom.Status.CLAIMED, expiry_synced=False
+        ).count(),
+        "claim_hits": counters.get(_CLAIM_HITS_KEY, 0),
+        "claim_misses": counters.get(_CLAIM_MISSES_KEY, 0),
+        "claim_latency_avg_ms": sum(samples) / len(samples) if samples else None,
+        "claim_latency_p95_ms": samples[min(len(samples) - 1, int(len(samples) * 0.95))] if samples else None,
+        "refill_lag_seconds": (now - below_since).total_seconds() if below_since else 0,
+        "last_refill_at": cache.get(_LAST_REFILL_KEY),
+    }
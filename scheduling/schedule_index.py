@@ -0,0 +1,218 @@
+# scheduling/schedule_index.py
+"""
+Índice opcional en memoria de la agenda de cada médico basado en bits.
+
+Con slots fijos de APPOINTMENT_SLOT_MINUTES (20 min) un día completo son 72 bits:
+el bit i representa el slot que empieza en i * 20 minutos (hora local).
+Por médico se guardan:
+- Una máscara semanal de disponibilidad por día de la semana (lista de 7 enteros).
+- Una máscara de ocupación por fecha, construida a partir de las citas.
+
+Los slots libres de un día son entonces `disponible & ~ocupado & ~pasado`.
+
+Coherencia: cada médico tiene un contador de versión en la caché de Django que
+incrementan las señales de Appointment y DoctorAvailability (ver signals.py).
+Una entrada cuya versión no coincide se considera fría y la lectura vuelve
+al camino del ORM, que a su vez recarga la entrada.
+"""
+import threading
+from collections import OrderedDict
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import APPOINTMENT_SLOT_MINUTES, APPOINTMENT_SLOT_DELTA
+
+SLOT_SECONDS = APPOINTMENT_SLOT_MINUTES * 60
+SLOTS_PER_DAY = 24 * 60 // APPOINTMENT_SLOT_MINUTES
+FULL_DAY_MASK = (1 << SLOTS_PER_DAY) - 1
+
+# Máximo de médicos en memoria (se descartan los menos usados)
+SCHEDULE_INDEX_MAX_DOCTORS = 1024
+
+_VERSION_KEY = "scheduling:schedule_index:version:{doctor_id}"
+
+
+def is_schedule_index_enabled():
+    return getattr(settings, "SCHEDULING_SCHEDULE_INDEX", False)
+
+
+def get_doctor_version(doctor_id):
+    return cache.get(_VERSION_KEY.format(doctor_id=doctor_id), 0)
+
+
+def bump_doctor_version(doctor_id):
+    """
+    Invalida el índice de un médico en todos los procesos que compartan la caché.
+    """
+    key = _VERSION_KEY.format(doctor_id=doctor_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, timeout=None)
+
+
+def _seconds_of_day(value):
+    return value.hour * 3600 + value.minute * 60 + value.second + value.microsecond / 1_000_000
+
+
+def availability_mask(start_time, end_time):
+    """
+    Máscara de bits de una franja. Devuelve None si la franja no está alineada
+    con la rejilla de slots (en ese caso el médico no es indexable).
+    """
+    start_seconds = _seconds_of_day(start_time)
+    if start_seconds % SLOT_SECONDS:
+        return None
+    slot_count = max(0, int(_seconds_of_day(end_time) - start_seconds) // SLOT_SECONDS)
+    first = int(start_seconds) // SLOT_SECONDS
+    return ((1 << slot_count) - 1) << first
+
+
+def _past_mask(day, now_local):
+    """
+    Bits de los slots cuyo inicio ya pasó.
+    """
+    today = now_local.date()
+    if day < today:
+        return FULL_DAY_MASK
+    if day > today:
+        return 0
+    cutoff = -(-_seconds_of_day(now_local) // SLOT_SECONDS)  # techo
+    return (1 << min(int(cutoff), SLOTS_PER_DAY)) - 1
+
+
+def _iter_bits(mask):
+    while mask:
+        lowest = mask & -mask
+        yield lowest.bit_length() - 1
+        mask ^= lowest
+
+
+class _DoctorSchedule:
+    __slots__ = ("version", "weekly", "occupied", "indexable")
+
+    def __init__(self, version):
+        self.version = version
+        self.weekly = [None] * 7  # None = día de la semana no cargado
+        self.occupied = {}  # {date: máscara}; presencia = fecha cargada
+        self.indexable = True
+
+
+class ScheduleIndex:
+    def __init__(self, max_doctors=SCHEDULE_INDEX_MAX_DOCTORS):
+        self._doctors = OrderedDict()
+        self._lock = threading.Lock()
+        self._max_doctors = max_doctors
+
+    def clear(self):
+        with self._lock:
+            self._doctors.clear()
+
+    def _current_entry(self, doctor_id):
+        entry = self._doctors.get(doctor_id)
+        if entry is None:
+            return None
+        if entry.version != get_doctor_version(doctor_id):
+            del self._doctors[doctor_id]
+            return None
+        self._doctors.move_to_end(doctor_id)
+        return entry
+
+    def store(self, doctor_id, version, availabilities_by_weekday, weekdays,
+              occupied_starts, start_date, days):
+        """
+        Carga en el índice lo que el camino del ORM ya leyó: las franjas de
+        `weekdays` y las citas de [start_date, start_date + days).
+        `version` debe leerse ANTES de consultar la base de datos, para que una
+        escritura concurrente deje la entrada obsoleta y no la dé por buena.
+        """
+        with self._lock:
+            entry = self._current_entry(doctor_id)
+            if entry is None or entry.version != version:
+                entry = _DoctorSchedule(version)
+
+            for weekday in weekdays:
+                mask = 0
+                for start_time, end_time in availabilities_by_weekday.get(weekday, []):
+                    window = availability_mask(start_time, end_time)
+                    if window is None:
+                        entry.indexable = False
+                        break
+                    mask |= window
+                entry.weekly[weekday] = mask
+
+            dates = [start_date + timedelta(days=offset) for offset in range(days)]
+            for day in dates:
+                entry.occupied[day] = 0
+            for scheduled in occupied_starts:
+                self._mark_occupied(entry, scheduled)
+
+            # Descartamos fechas pasadas para acotar memoria
+            today = timezone.localdate()
+            for day in [d for d in entry.occupied if d < today]:
+                del entry.occupied[day]
+
+            self._doctors[doctor_id] = entry
+            self._doctors.move_to_end(doctor_id)
+            while len(self._doctors) > self._max_doctors:
+                self._doctors.popitem(last=False)
+
+    @staticmethod
+    def _mark_occupied(entry, scheduled):
+        """
+        Marca los slots que se solapan con [scheduled, scheduled + 20 min),
+        aunque la cita no esté alineada o cruce la medianoche.
+        """
+        local = timezone.localtime(scheduled)
+        start_seconds = _seconds_of_day(local)
+        first = int(start_seconds // SLOT_SECONDS)
+        last = int(-(-(start_seconds + SLOT_SECONDS) // SLOT_SECONDS)) - 1
+        for index in range(first, last + 1):
+            day = local.date() + timedelta(days=index // SLOTS_PER_DAY)
+            if day in entry.occupied:
+                entry.occupied[day] |= 1 << (index % SLOTS_PER_DAY)
+
+    def free_slots_over_range(self, doctor_id, start_date, days):
+        """
+        Devuelve {date: [(slot_start, slot_end), ...]} con operaciones de bits,
+        o None si el índice está frío para ese médico o rango.
+        """
+        now_local = timezone.localtime(timezone.now())
+        today = now_local.date()
+        with self._lock:
+            entry = self._current_entry(doctor_id)
+            if entry is None or not entry.indexable:
+                return None
+            dates = [start_date + timedelta(days=offset) for offset in range(days)]
+            masks = {}
+            for day in dates:
+                if day < today:
+                    # Días pasados: nunca hay slots libres
+                    masks[day] = 0
+                    continue
+                weekly = entry.weekly[day.weekday()]
+                occupied = entry.occupied.get(day)
+                if weekly is None or (weekly and occupied is None):
+                    return None
+                masks[day] = weekly & ~(occupied or 0)
+
+        slots_by_date = {}
+        for day, mask in masks.items():
+            mask &= ~_past_mask(day, now_local)
+            slots = []
+            for index in _iter_bits(mask):
+                slot_start = _slot_start(day, index)
+                slots.append((slot_start, slot_start + APPOINTMENT_SLOT_DELTA))
+            slots_by_date[day] = slots
+        return slots_by_date
+
+
+def _slot_start(day, index):
+    naive = datetime.combine(day, time.min) + timedelta(seconds=index * SLOT_SECONDS)
+    return timezone.make_aware(naive, timezone.get_current_timezone())
+
+
+schedule_index = ScheduleIndex()
@@ -0,0 +1,41 @@
+# scheduling/signals.py
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from accounts.models import User
+
+from .directory import bump_directory_version, is_listed_doctor
+from .models import Appointment, DoctorAvailability
+from .schedule_index import bump_doctor_version
+
+
+@receiver(post_save, sender=Appointment)
+@receiver(post_delete, sender=Appointment)
+@receiver(post_save, sender=DoctorAvailability)
+@receiver(post_delete, sender=DoctorAvailability)
+def invalidate_doctor_schedule_index(sender, instance, **kwargs):
+    """
+    Cualquier cambio en citas o disponibilidad de un médico invalida su entrada
+    en el índice de agenda. Las actualizaciones masivas con QuerySet.update()
+    no disparan señales y deben llamar a bump_doctor_version explícitamente.
+    """
+    bump_doctor_version(instance.doctor_id)
+
+
+@receiver(post_save, sender=DoctorAvailability)
+@receiver(post_delete, sender=DoctorAvailability)
+def invalidate_availability_directory(sender, instance, **kwargs):
+    bump_directory_version()
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_directory_doctor(sender, instance, update_fields=None, **kwargs):
+    """
+    Altas, bajas y cambios de nombre o rol de médicos. Quien deja de ser médico
+    ya no tiene role=DOCTOR: se detecta porque sigue en el directorio cacheado.
+    """
+    if update_fields and set(update_fields) <= {"last_login"}:
+        return
+    if instance.role == User.Roles.DOCTOR or is_listed_doctor(instance.pk):
+        bump_directory_version()
@@ -0,0 +1,175 @@
+# scheduling/summaries.py
+from datetime import timedelta
+
+from django.db.models import Max
+from django.utils import timezone
+
+from accounts.models import User
+from .models import DailySlotSummary
+from .utils import get_available_slots_over_range
+
+# Días hacia adelante (desde hoy) que se mantienen materializados.
+# El horizonte avanza con roll_slot_summaries (rebuild_slot_summaries --roll, cada noche).
+SLOT_SUMMARY_HORIZON_DAYS = 60
+
+
+def _clip_to_horizon(start_date, days):
+    """
+    Recorta [start_date, start_date + days) al horizonte [hoy, hoy + HORIZON).
+    Devuelve (start_date, days) o (None, 0) si no hay intersección.
+    """
+    today = timezone.localdate()
+    horizon_end = today + timedelta(days=SLOT_SUMMARY_HORIZON_DAYS)
+    start = max(start_date or today, today)
+    end = min((start_date or today) + timedelta(days=days), horizon_end)
+    if start >= end:
+        return None, 0
+    return start, (end - start).days
+
+
+def refresh_slot_summaries(doctor, start_date=None, days=SLOT_SUMMARY_HORIZON_DAYS):
+    """
+    Recalcula con el motor de rango los resúmenes de un médico para
+    [start_date, start_date + days) dentro del horizonte y los guarda con un upsert.
+    `doctor` puede ser la instancia o su id.
+    """
+    start, days = _clip_to_horizon(start_date, days)
+    if not start:
+        return 0
+
+    doctor_id = getattr(doctor, "pk", doctor)
+    slots_by_date = get_available_slots_over_range(doctor_id, start, days=days)
+
+    rows = [
+        DailySlotSummary(
+            doctor_id=doctor_id,
+            date=day,
+            free_slot_count=len(slots),
+            first_free_start=slots[0][0] if slots else None,
+        )
+        for day, slots in slots_by_date.items()
+    ]
+    DailySlotSummary.objects.bulk_create(
+        rows,
+        update_conflicts=True,
+        unique_fields=["doctor", "date"],
+        update_fields=["free_slot_count", "first_free_start", "updated_at"],
+    )
+    return len(rows)
+
+
+def refresh_slot_summary_for_appointment(appointment):
+    """
+    Actualiza solo el día de la cita (al crearla o cancelarla).
+    """
+    day = timezone.localdate(appointment.scheduled_datetime)
+    return refresh_slot_summaries(appointment.doctor_id, day, days=1)
+
+
+def get_slot_summary_calendar(doctor, start_date, days=14):
+    """
+    Devuelve [(date, num_slots)] leyendo la tabla de resúmenes con una sola
+    consulta por rango. Los días que no estén materializados (fuera del horizonte
+    o aún no construidos) se calculan en vivo.
+
+    Nota: el resumen de hoy puede contar slots que ya pasaron desde su último
+    refresco; el paso 2 siempre vuelve a calcular el día elegido en vivo.
+    """
+    end_date = start_date + timedelta(days=days - 1)
+    counts = dict(
+        DailySlotSummary.objects
+        .filter(doctor=doctor, date__gte=start_date, date__lte=end_date)
+        .values_list("date", "free_slot_count")
+    )
+
+    missing = [
+        start_date + timedelta(days=offset)
+        for offset in range(days)
+        if start_date + timedelta(days=offset) not in counts
+    ]
+    if missing:
+        live = get_available_slots_over_range(
+            doctor, missing[0], days=(missing[-1] - missing[0]).days + 1
+        )
+        for day in missing:
+            counts[day] = len(live[day])
+
+    return sorted(counts.items())
+
+
+def _summary_doctors(doctors=None):
+    if doctors is not None:
+        return doctors
+    return User.objects.filter(role=User.Roles.DOCTOR).order_by("id")
+
+
+def rebuild_slot_summaries(doctors=None, days=SLOT_SUMMARY_HORIZON_DAYS):
+    """
+    Reconstruye los resúmenes de todos los médicos (o de `doctors`) y elimina
+    filas de días pasados o de usuarios que ya no son médicos.
+    Devuelve el número de filas escritas.
+    """
+    today = timezone.localdate()
+    DailySlotSummary.objects.filter(date__lt=today).delete()
+    if doctors is None:
+        DailySlotSummary.objects.exclude(doctor__role=User.Roles.DOCTOR).delete()
+
+    written = 0
+    for doctor in _summary_doctors(doctors):
+        written += refresh_slot_summaries(doctor, today, days=days)
+    return written
+
+
+def roll_slot_summaries(doctors=None):
+    """
+    Avanza el horizonte móvil: borra los días pasados y materializa, por médico,
+    solo los días posteriores a su último resumen hasta hoy + HORIZON. Los días
+    ya guardados no se recalculan (las reservas y cancelaciones los mantienen).
+    Devuelve el número de filas escritas.
+    """
+    today = timezone.localdate()
+    DailySlotSummary.objects.filter(date__lt=today).delete()
+    if doctors is None:
+        DailySlotSummary.objects.exclude(doctor__role=User.Roles.DOCTOR).delete()
+
+    doctors = list(_summary_doctors(doctors))
+    last_dates = dict(
+        DailySlotSummary.objects
+        .filter(doctor__in=doctors)
+        .values("doctor")
+        .annotate(last_date=Max("date"))
+        .values_list("doctor", "last_date")
+    )
+    written = 0
+    for doctor in doctors:
+        last_date = last_dates.get(doctor.pk)
+        start = today if last_date is None else last_date + timedelta(days=1)
+        written += refresh_slot_summaries(doctor, start, days=SLOT_SUMMARY_HORIZON_DAYS)
+    return written
+
+
+def verify_slot_summaries(doctors=None, days=SLOT_SUMMARY_HORIZON_DAYS):
+    """
+    Compara la tabla contra el cálculo en vivo.
+    Devuelve una lista de (doctor, date, valor_guardado, valor_real); vacía si coincide.
+    """
+    start, days = _clip_to_horizon(timezone.localdate(), days)
+    if not start:
+        return []
+
+    end_date = start + timedelta(days=days - 1)
+    mismatches = []
+    for doctor in _summary_doctors(doctors):
+        stored = {
+            day: (count, first_free)
+            for day, count, first_free in (
+                DailySlotSummary.objects
+                .filter(doctor=doctor, date__gte=start, date__lte=end_date)
+                .values_list("date", "free_slot_count", "first_free_start")
+            )
+        }
+        for day, slots in get_available_slots_over_range(doctor, start, days=days).items():
+            expected = (len(slots), slots[0][0] if slots else None)
+            if stored.get(day) != expected:
+                mismatches.append((doctor, day, stored.get(day), expected))
+    return mismatches
@@ -1,3 +1,1147 @@
-from django.test import TestCase
+import asyncio
+import threading
+from collections import deque
+from datetime import datetime, time, timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import IntegrityError, connection, connections, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import User
+from clinical.models import ArchivedConsultation, Consultation
+from dashboard.roles import change_user_roles
+
+from .archive import (
+    APPOINTMENT_FIELDS,
+    CONSULTATION_FIELDS,
+    appointment_sources,
+    archive_batch,
+    archive_cutoff,
+    merge_by_schedule,
+    restore_batch,
+)
+from .booking import SlotUnavailableError, book_appointment, parse_slot_value
+from .directory import build_availability_directory, get_availability_directory
+from .daily_client import (
+    METRIC_OPERATIONS,
+    CircuitBreaker,
+    DailyClient,
+    DailyUnavailableError,
+    daily_client,
+    get_daily_metrics,
+)
+from .daily_client import _record_metrics as _record_daily_metrics
+from .fake_daily import FakeDailyServer
+from .models import (
+    Appointment,
+    ArchivedAppointment,
+    DailySlotSummary,
+    DoctorAvailability,
+    PooledVideoRoom,
+    VideoRoomTask,
+)
+from .pagination import decode_cursor, encode_cursor, keyset_paginate
+from .room_cleanup import _delete_rooms, _RateLimiter, cleanup_expired_rooms
+from .room_pool import _record_claim, claim_pooled_room, get_pool_metrics, refill_pool
+from .schedule_index import (
+    FULL_DAY_MASK,
+    ScheduleIndex,
+    _past_mask,
+    availability_mask,
+    bump_doctor_version,
+    schedule_index,
+)
+from .summaries import (
+    SLOT_SUMMARY_HORIZON_DAYS,
+    rebuild_slot_summaries,
+    roll_slot_summaries,
+    verify_slot_summaries,
+)
+from .utils import find_earliest_available_slots, get_available_slots_over_range, iter_free_slots
+from .video_calls import appointment_room_expiry
+from .video_outbox import VIDEO_ROOM_MAX_ATTEMPTS
+
+EXTRA_DOCTORS = 25
+
+
+def make_user(name, role):
+    return User.objects.create_user(username=name, email=f"{name}@example.com", role=role)
+
+
+def next_weekday_at(hour, minute=0, days=1):
+    """
+    Slot aware de dentro de `days` días a la hora local indicada.
+    """
+    day = timezone.localdate() + timedelta(days=days)
+    return timezone.make_aware(datetime.combine(day, time(hour, minute)))
+
+
+@override_settings(REQUEST_METRICS_ENABLED=False)
+class AvailabilityDirectoryTests(TestCase):
+    """
+    Directorio de disponibilidad del paso 1: con la caché caliente no consulta
+    franjas, se construye con un número fijo de consultas y cada cambio de
+    franja o de médico se ve en la siguiente petición.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = cls._user("directory_admin", User.Roles.ADMIN)
+        cls.patient = cls._user("directory_patient", User.Roles.PATIENT)
+        cls.doctor = cls._user("directory_doctor", User.Roles.DOCTOR)
+        cls.availability = DoctorAvailability.objects.create(
+            doctor=cls.doctor, weekday=DoctorAvailability.Weekday.MONDAY,
+            start_time=time(8), end_time=time(12),
+        )
+
+    @staticmethod
+    def _user(name, role):
+        return User.objects.create_user(username=name, email=f"{name}@example.com", role=role)
+
+    def setUp(self):
+        cache.clear()
+
+    def _commit(self, write):
+        # El directorio se invalida al confirmar la transacción
+        with self.captureOnCommitCallbacks(execute=True):
+            return write()
+
+    def _entry(self, user):
+        directory, _ = get_availability_directory()
+        return next((item for item in directory if item["doctor_id"] == user.pk), None)
+
+    def _slots(self, user):
+        entry = self._entry(user)
+        return [slot for day in entry["days"] for slot in day["slots"]] if entry else []
+
+    def _assert_fresh(self):
+        self.assertEqual(get_availability_directory()[0], build_availability_directory())
+
+    def test_warm_step1_does_not_query_availabilities(self):
+        self.client.force_login(self.patient)
+        url = reverse("scheduling:new_appointment_step1")
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(url)
+        self.assertContains(response, "directory_doctor")
+        availability_table = DoctorAvailability._meta.db_table
+        self.assertFalse([q["sql"] for q in captured.captured_queries if availability_table in q["sql"]])
+
+    def test_build_runs_fixed_number_of_queries(self):
+        doctors = User.objects.bulk_create(
+            User(username=f"directory_extra{i}", email=f"directory_extra{i}@example.com",
+                 role=User.Roles.DOCTOR)
+            for i in range(EXTRA_DOCTORS)
+        )
+        DoctorAvailability.objects.bulk_create(
+            DoctorAvailability(doctor=doctor, weekday=weekday, start_time=time(14), end_time=time(18))
+            for doctor in doctors
+            for weekday in range(5)
+        )
+        with self.assertNumQueries(2):
+            directory = build_availability_directory()
+        self.assertEqual(len(directory), EXTRA_DOCTORS + 1)
+
+    def test_new_availability(self):
+        get_availability_directory()
+        self._commit(lambda: DoctorAvailability.objects.create(
+            doctor=self.doctor, weekday=DoctorAvailability.Weekday.TUESDAY,
+            start_time=time(14), end_time=time(16),
+        ))
+        self.assertIn("14:00–16:00", self._slots(self.doctor))
+        self._assert_fresh()
+
+    def test_inactive_and_deleted_availability(self):
+        get_availability_directory()
+        self.availability.is_active = False
+        self._commit(self.availability.save)
+        self.assertNotIn("08:00–12:00", self._slots(self.doctor))
+
+        self.availability.is_active = True
+        self._commit(self.availability.save)
+        self.assertIn("08:00–12:00", self._slots(self.doctor))
+        self._commit(self.availability.delete)
+        self.assertNotIn("08:00–12:00", self._slots(self.doctor))
+        self._assert_fresh()
+
+    def test_doctor_name(self):
+        get_availability_directory()
+        self.doctor.first_name = "Zoila"
+        self._commit(self.doctor.save)
+        self.assertEqual(self._entry(self.doctor)["initial"], "Z")
+        self._assert_fresh()
+
+    def test_role_change(self):
+        get_availability_directory()
+        self._commit(lambda: change_user_roles(self.admin, [self.patient], User.Roles.DOCTOR))
+        self.assertIsNotNone(self._entry(self.patient))
+        self._commit(lambda: change_user_roles(self.admin, [self.patient], User.Roles.PATIENT))
+        self.assertIsNone(self._entry(self.patient))
+        self._assert_fresh()
+
+    def test_rolled_back_change_does_not_invalidate(self):
+        get_availability_directory()
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with transaction.atomic():
+                DoctorAvailability.objects.create(
+                    doctor=self.doctor, weekday=DoctorAvailability.Weekday.FRIDAY,
+                    start_time=time(9), end_time=time(10),
+                )
+                transaction.set_rollback(True)
+        self.assertEqual(callbacks, [])
+        with self.assertNumQueries(0):
+            get_availability_directory()
+        self._assert_fresh()
+
+
+class ConcurrentVideoRoomJoinTests(TransactionTestCase):
+    """
+    Muchas uniones simultáneas a la videollamada de una misma cita contra un
+    Daily falso: solo se crea (o se reclama del pool) una sala y todas las
+    peticiones reciben la URL guardada en la cita.
+    """
+    JOINS = 8
+    # Latencia de Daily: ensancha la ventana de carrera
+    LATENCY = 0.2
+
+    def setUp(self):
+        doctor = User.objects.create_user(
+            username="joins_doctor", email="joins_doctor@example.com", role=User.Roles.DOCTOR,
+        )
+        patient = User.objects.create_user(
+            username="joins_patient", email="joins_patient@example.com", role=User.Roles.PATIENT,
+        )
+        self.appointment = Appointment.objects.create(
+            patient=patient, doctor=doctor, reason="Uniones simultáneas",
+            scheduled_datetime=timezone.now() + timedelta(hours=1),
+        )
+        self.server = FakeDailyServer(latency=self.LATENCY).start()
+        self.addCleanup(self.server.stop)
+
+    def _join_concurrently(self, **settings):
+        urls = []
+        errors = []
+        barrier = threading.Barrier(self.JOINS)
+
+        def worker():
+            barrier.wait(timeout=10)
+            try:
+                # Cada hilo simula una petición con su propia instancia de la cita
+                instance = Appointment.objects.get(pk=self.appointment.pk)
+                urls.append(instance.ensure_video_call_url())
+            except Exception as exc:  # noqa: BLE001 - el test recoge cualquier fallo del hilo
+                errors.append(exc)
+            finally:
+                connections.close_all()
+
+        with override_settings(
+            DAILY_API_BASE_URL=self.server.base_url,
+            DAILY_API_KEY="fake",
+            DAILY_DOMAIN=self.server.domain,
+            **settings,
+        ):
+            threads = [threading.Thread(target=worker) for _ in range(self.JOINS)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(errors, [])
+        self.appointment.refresh_from_db()
+        self.assertTrue(self.appointment.video_call_url)
+        self.assertEqual(urls, [self.appointment.video_call_url] * self.JOINS)
+
+    def _rooms_created(self):
+        return sum(1 for name in self.server.rooms if name.startswith(f"cita-{self.appointment.pk}-"))
+
+    def test_one_daily_room_without_pool(self):
+        self._join_concurrently(VIDEO_ROOM_POOL_SIZE=0)
+        self.assertEqual(self._rooms_created(), 1)
+
+    def test_one_pooled_room(self):
+        PooledVideoRoom.objects.bulk_create(
+            PooledVideoRoom(name=f"pool-joins-{i}", url=f"https://fake.daily.co/pool-joins-{i}")
+            for i in range(3)
+        )
+        self._join_concurrently()
+        self.assertEqual(self._rooms_created(), 0)
+        self.assertEqual(PooledVideoRoom.objects.filter(appointment=self.appointment).count(), 1)
+
+
+class VideoRoomTaskTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        doctor = User.objects.create_user(
+            username="task_doctor", email="task_doctor@example.com", role=User.Roles.DOCTOR,
+        )
+        patient = User.objects.create_user(
+            username="task_patient", email="task_patient@example.com", role=User.Roles.PATIENT,
+        )
+        cls.appointment = Appointment.objects.create(
+            patient=patient, doctor=doctor, reason="Sala",
+            scheduled_datetime=timezone.now() + timedelta(hours=1),
+        )
+
+    def _failed_task(self):
+        return VideoRoomTask.objects.create(
+            appointment=self.appointment,
+            status=VideoRoomTask.Status.FAILED,
+            attempts=VIDEO_ROOM_MAX_ATTEMPTS,
+            next_attempt_at=timezone.now() + timedelta(hours=1),
+            last_error="Daily no configurado o respuesta no válida.",
+        )
+
+    def test_viewer_requeues_failed_task(self):
+        self._failed_task()
+        task = self.appointment.request_video_room()
+        task.refresh_from_db()
+        self.assertEqual(task.status, VideoRoomTask.Status.PENDING)
+        self.assertEqual(task.attempts, 0)
+        self.assertLessEqual(task.next_attempt_at, timezone.now())
+
+    def test_canceled_appointment_keeps_failed_task(self):
+        self._failed_task()
+        self.appointment.cancel()
+        task = self.appointment.request_video_room()
+        task.refresh_from_db()
+        self.assertEqual(task.status, VideoRoomTask.Status.FAILED)
+
+
+class RoomPoolTests(TestCase):
+    """
+    Pool de salas contra un Daily falso: la reposición llena el pool hasta el
+    objetivo, el reclamo asigna una sala y le fija la caducidad, y los
+    contadores de reclamos no pierden incrementos entre hilos.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        doctor = make_user("pool_doctor", User.Roles.DOCTOR)
+        patient = make_user("pool_patient", User.Roles.PATIENT)
+        cls.appointments = Appointment.objects.bulk_create(
+            Appointment(patient=patient, doctor=doctor, scheduled_datetime=next_weekday_at(9, 20 * i))
+            for i in range(3)
+        )
+
+    def setUp(self):
+        cache.clear()
+        daily_client.breaker.record_success()
+        self.server = FakeDailyServer().start()
+        self.addCleanup(self.server.stop)
+        settings = override_settings(
+            DAILY_API_BASE_URL=self.server.base_url,
+            DAILY_API_KEY="fake",
+            DAILY_DOMAIN=self.server.domain,
+            VIDEO_ROOM_POOL_SIZE=2,
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def test_refill_and_claim(self):
+        # Una sala sin asignar a punto de caducar se descarta al reponer
+        stale = PooledVideoRoom.objects.create(name="pool-stale", url="https://fake.daily.co/pool-stale")
+        PooledVideoRoom.objects.filter(pk=stale.pk).update(created_at=timezone.now() - timedelta(days=40))
+
+        self.assertEqual(refill_pool(), 2)
+        self.assertFalse(PooledVideoRoom.objects.filter(pk=stale.pk).exists())
+        self.assertEqual(refill_pool(), 0)
+        self.assertEqual(get_pool_metrics()["refill_lag_seconds"], 0)
+
+        first, second, third = self.appointments
+        room = claim_pooled_room(first)
+        self.assertEqual(room.status, PooledVideoRoom.Status.CLAIMED)
+        self.assertEqual(room.appointment_id, first.pk)
+        self.assertTrue(room.expiry_synced)
+        self.assertEqual(self.server.rooms[room.name]["config"]["exp"], appointment_room_expiry(first))
+        # Reclamar otra vez devuelve la misma sala
+        self.assertEqual(claim_pooled_room(first), room)
+        self.assertIsNotNone(claim_pooled_room(second))
+        self.assertIsNone(claim_pooled_room(third))
+
+        metrics = get_pool_metrics()
+        self.assertEqual((metrics["claim_hits"], metrics["claim_misses"]), (2, 1))
+        self.assertEqual(metrics["available"], 0)
+        self.assertIsNotNone(metrics["claim_latency_p95_ms"])
+        self.assertEqual(refill_pool(), 2)
+
+    def test_claim_counters_are_not_lost(self):
+        threads = [
+            threading.Thread(target=lambda hit=hit: [_record_claim(0, hit) for _ in range(200)])
+            for hit in (True, False) * 4
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        metrics = get_pool_metrics()
+        self.assertEqual((metrics["claim_hits"], metrics["claim_misses"]), (800, 800))
+
+
+class DailyClientTests(SimpleTestCase):
+    """
+    Circuit breaker del cliente de Daily (cerrado, abierto, semiabierto con una
+    sola llamada de prueba) y contadores por operación sin incrementos perdidos.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.clock = 1000.0
+        patcher = mock.patch("scheduling.daily_client.time.monotonic", side_effect=lambda: self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # Sin las latencias de otros tests en el buffer del proceso
+        samples = mock.patch.dict(
+            "scheduling.daily_client._latency_samples",
+            {operation: deque() for operation in METRIC_OPERATIONS},
+        )
+        samples.start()
+        self.addCleanup(samples.stop)
+        self.breaker = CircuitBreaker(failure_threshold=3, reset_seconds=30)
+
+    def _fail(self, times):
+        for _ in range(times):
+            self.breaker.record_failure()
+
+    def test_opens_after_threshold(self):
+        self._fail(2)
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.assertTrue(self.breaker.allow_request())
+        self._fail(1)
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(self.breaker.allow_request())
+
+    def test_success_resets_failures(self):
+        self._fail(2)
+        self.breaker.record_success()
+        self._fail(2)
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_half_open_allows_a_single_probe(self):
+        self._fail(3)
+        self.clock += 30
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertTrue(self.breaker.allow_request())
+        self.assertFalse(self.breaker.allow_request())
+
+        # La prueba falla: vuelve a abrirse con un fallo, sin esperar al umbral
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.clock += 30
+        self.assertTrue(self.breaker.allow_request())
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.assertTrue(self.breaker.allow_request())
+
+    def test_open_breaker_fails_fast(self):
+        client = DailyClient()
+        client.breaker = self.breaker
+        self._fail(3)
+        with mock.patch.object(client, "_session") as session, self.assertRaises(DailyUnavailableError):
+            client.request("list_rooms", "GET", "rooms", idempotent=True)
+        session.request.assert_not_called()
+        operations = dict(get_daily_metrics()["operations"])
+        self.assertEqual((operations["list_rooms"]["calls"], operations["list_rooms"]["errors"]), (1, 1))
+
+    def test_metrics_are_not_lost(self):
+        def worker():
+            for i in range(200):
+                _record_daily_metrics("update_room", 2.0, error=i % 2)
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        metrics = dict(get_daily_metrics()["operations"])["update_room"]
+        self.assertEqual((metrics["calls"], metrics["errors"]), (1600, 800))
+        self.assertAlmostEqual(metrics["avg_ms"], 2.0)
+        self.assertEqual(metrics["max_ms"], 2.0)
+
+
+class RoomCleanupTests(TestCase):
+    """
+    Limpieza de salas caducadas contra un Daily falso: borra por lotes, no
+    vuelve a seleccionar citas ya procesadas, avanza el cursor sobre las que
+    fallan y se detiene si el circuito de Daily se abre.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        doctor = make_user("cleanup_doctor", User.Roles.DOCTOR)
+        patient = make_user("cleanup_patient", User.Roles.PATIENT)
+        past = timezone.now() - timedelta(days=2)
+        cls.expired = Appointment.objects.bulk_create(
+            Appointment(
+                patient=patient, doctor=doctor, scheduled_datetime=past + timedelta(minutes=20 * i),
+                video_call_url=f"https://fake.daily.co/cleanup-{i}",
+            )
+            for i in range(5)
+        )
+        cls.upcoming = Appointment.objects.create(
+            patient=patient, doctor=doctor, scheduled_datetime=timezone.now() + timedelta(hours=1),
+            video_call_url="https://fake.daily.co/cleanup-upcoming",
+        )
+        cls.pooled = PooledVideoRoom.objects.create(
+            name="cleanup-0", url=cls.expired[0].video_call_url,
+            status=PooledVideoRoom.Status.CLAIMED, appointment=cls.expired[0],
+        )
+
+    def setUp(self):
+        daily_client.breaker.record_success()
+        self.server = FakeDailyServer().start()
+        self.addCleanup(self.server.stop)
+        # cleanup-4 ya no existe en Daily: un 404 también cuenta como borrada
+        for i in range(4):
+            self.server.rooms[f"cleanup-{i}"] = {"name": f"cleanup-{i}", "config": {}}
+        self.server.rooms["cleanup-upcoming"] = {"name": "cleanup-upcoming", "config": {}}
+        settings = override_settings(
+            DAILY_API_BASE_URL=self.server.base_url, DAILY_API_KEY="fake", DAILY_DOMAIN=self.server.domain,
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def _with_url(self):
+        return set(Appointment.objects.exclude(video_call_url=None).values_list("pk", flat=True))
+
+    def test_cleanup_deletes_rooms_and_does_not_reselect(self):
+        started = timezone.now()
+        stats = cleanup_expired_rooms(batch_size=2, rate=0)
+        self.assertEqual(stats, {"scanned": 5, "cleared": 5, "failed": 0, "stopped": False})
+        self.assertEqual(set(self.server.rooms), {"cleanup-upcoming"})
+        self.assertEqual(self._with_url(), {self.upcoming.pk})
+        self.assertFalse(PooledVideoRoom.objects.filter(pk=self.pooled.pk).exists())
+        # El UPDATE masivo también marca updated_at
+        self.assertFalse(
+            Appointment.objects.filter(pk__in=[a.pk for a in self.expired], updated_at__lt=started).exists()
+        )
+        # Una segunda ejecución no vuelve a leer las citas procesadas
+        with self.assertNumQueries(1):
+            stats = cleanup_expired_rooms(batch_size=2, rate=0)
+        self.assertEqual(stats["scanned"], 0)
+
+    def test_failed_rooms_are_skipped_by_the_cursor(self):
+        failing = {"cleanup-1", "cleanup-3"}
+        with mock.patch(
+            "scheduling.room_cleanup.delete_daily_room", side_effect=lambda name: name not in failing,
+        ):
+            stats = cleanup_expired_rooms(batch_size=2, rate=0)
+        self.assertEqual(stats, {"scanned": 5, "cleared": 3, "failed": 2, "stopped": False})
+        self.assertEqual(self._with_url(), {self.expired[1].pk, self.expired[3].pk, self.upcoming.pk})
+        # Se reintentan en la siguiente ejecución
+        self.assertEqual(cleanup_expired_rooms(rate=0)["cleared"], 2)
+
+    def test_open_circuit_stops_the_cleanup(self):
+        with mock.patch(
+            "scheduling.room_cleanup.delete_daily_room", side_effect=DailyUnavailableError("abierto"),
+        ):
+            stats = cleanup_expired_rooms(batch_size=2, rate=0)
+        self.assertEqual(stats, {"scanned": 2, "cleared": 0, "failed": 2, "stopped": True})
+
+    def test_concurrency_is_bounded(self):
+        lock = threading.Lock()
+        active = []
+        peak = []
+
+        def delete(name):
+            with lock:
+                active.append(name)
+                peak.append(len(active))
+            threading.Event().wait(0.02)
+            with lock:
+                active.remove(name)
+            return True
+
+        names = {f"room-{i}" for i in range(12)}
+        with mock.patch("scheduling.room_cleanup.delete_daily_room", side_effect=delete):
+            deleted, unavailable = asyncio.run(_delete_rooms(names, concurrency=3, rate=0))
+        self.assertEqual((deleted, unavailable), (names, False))
+        self.assertLessEqual(max(peak), 3)
+
+    def test_rate_limiter_spaces_calls(self):
+        delays = []
+
+        async def sleep(delay):
+            delays.append(round(delay, 6))
+
+        async def run():
+            limiter = _RateLimiter(10)
+            for _ in range(4):
+                await limiter.wait()
+
+        with mock.patch("scheduling.room_cleanup.time.monotonic", return_value=50.0), \
+                mock.patch("scheduling.room_cleanup.asyncio.sleep", side_effect=sleep):
+            asyncio.run(run())
+        # La primera llamada sale ya; las siguientes, cada 1/rate segundos
+        self.assertEqual(delays, [0.1, 0.2, 0.3])
+
+
+def weekly_availability(doctor, start=time(8), end=time(12)):
+    DoctorAvailability.objects.bulk_create(
+        DoctorAvailability(doctor=doctor, weekday=weekday, start_time=start, end_time=end)
+        for weekday in range(7)
+    )
+
+
+class BookingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = make_user("booking_doctor", User.Roles.DOCTOR)
+        cls.patient = make_user("booking_patient", User.Roles.PATIENT)
+        cls.other_patient = make_user("booking_other", User.Roles.PATIENT)
+        weekly_availability(cls.doctor)
+        cls.slot = next_weekday_at(9)
+
+    def test_second_booking_of_slot_is_rejected(self):
+        book_appointment(self.patient, self.doctor, self.slot, reason="Primera")
+        with self.assertRaises(SlotUnavailableError):
+            book_appointment(self.other_patient, self.doctor, self.slot, reason="Segunda")
+        self.assertEqual(Appointment.objects.filter(doctor=self.doctor).count(), 1)
+
+    def test_unique_constraint_rejects_duplicate_insert(self):
+        Appointment.objects.create(patient=self.patient, doctor=self.doctor, scheduled_datetime=self.slot)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Appointment.objects.create(patient=self.other_patient, doctor=self.doctor, scheduled_datetime=self.slot)
+
+    def test_slots_outside_the_grid_are_rejected(self):
+        rejected = {
+            "desalineado": next_weekday_at(9, 5),
+            "fuera de la franja": next_weekday_at(13),
+            "cruza el final de la franja": next_weekday_at(11, 50),
+            "en el pasado": next_weekday_at(9, days=-1),
+        }
+        for name, slot in rejected.items():
+            with self.subTest(slot=name), self.assertRaises(SlotUnavailableError):
+                book_appointment(self.patient, self.doctor, slot)
+        self.assertFalse(Appointment.objects.filter(doctor=self.doctor).exists())
+
+    def test_canceled_appointment_frees_its_slot(self):
+        book_appointment(self.patient, self.doctor, self.slot).cancel()
+        appointment = book_appointment(self.other_patient, self.doctor, self.slot)
+        self.assertEqual(appointment.patient, self.other_patient)
+        self.assertEqual(
+            sorted(Appointment.objects.filter(doctor=self.doctor).values_list("status", flat=True)),
+            [Appointment.Status.CANCELED, Appointment.Status.PENDING],
+        )
+
+    def test_parse_slot_value(self):
+        self.assertIsNone(parse_slot_value("no-es-una-fecha"))
+        self.assertIsNone(parse_slot_value(None))
+        self.assertEqual(parse_slot_value(self.slot.isoformat()), self.slot)
+        naive = timezone.localtime(self.slot).replace(tzinfo=None)
+        self.assertEqual(parse_slot_value(naive.isoformat()), self.slot)
+
+
+class ConcurrentBookingTests(TransactionTestCase):
+    PATIENTS = 6
+
+    def test_simultaneous_bookings_of_one_slot(self):
+        doctor = make_user("race_doctor", User.Roles.DOCTOR)
+        weekly_availability(doctor)
+        patients = [make_user(f"race_patient{i}", User.Roles.PATIENT) for i in range(self.PATIENTS)]
+        slot = next_weekday_at(10)
+        barrier = threading.Barrier(self.PATIENTS)
+        outcomes = []
+
+        def worker(patient):
+            barrier.wait(timeout=10)
+            try:
+                book_appointment(patient, doctor, slot)
+                outcomes.append("booked")
+            except SlotUnavailableError:
+                outcomes.append("unavailable")
+            except Exception as exc:  # noqa: BLE001 - el test recoge cualquier fallo del hilo
+                outcomes.append(exc)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=worker, args=(patient,)) for patient in patients]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(map(str, outcomes)), ["booked"] + ["unavailable"] * (self.PATIENTS - 1))
+        self.assertEqual(Appointment.objects.filter(doctor=doctor, scheduled_datetime=slot).count(), 1)
+
+
+@override_settings(SCHEDULING_SCHEDULE_INDEX=False)
+class FreeSlotTests(TestCase):
+    """
+    Barrido de slots libres del motor de rango: bordes de franja, franjas
+    solapadas, slots ya pasados de hoy y dos consultas para todo el rango.
+    """
+
+    def setUp(self):
+        self.day = timezone.localdate() + timedelta(days=1)
+        self.before_day = timezone.make_aware(datetime.combine(self.day, time(0)))
+
+    def _at(self, hour, minute=0, day=None):
+        return timezone.make_aware(datetime.combine(day or self.day, time(hour, minute)))
+
+    def _free(self, windows, occupied=(), now=None, day=None):
+        day = day or self.day
+        return [
+            slot_start
+            for _, slot_start, _ in iter_free_slots(
+                {day.weekday(): windows}, list(occupied), day, 1, now=now or self.before_day,
+            )
+        ]
+
+    def test_slot_that_exactly_fills_the_window(self):
+        self.assertEqual(self._free([(time(8), time(9))]), [self._at(8), self._at(8, 20), self._at(8, 40)])
+        # 10 minutos sobrantes no forman un slot
+        self.assertEqual(self._free([(time(8), time(8, 50))]), [self._at(8), self._at(8, 20)])
+        self.assertEqual(self._free([(time(8), time(8, 19))]), [])
+
+    def test_overlapping_windows_yield_each_slot_once(self):
+        windows = [(time(8), time(9)), (time(8, 20), time(9, 20))]
+        self.assertEqual(
+            self._free(windows),
+            [self._at(8), self._at(8, 20), self._at(8, 40), self._at(9)],
+        )
+
+    def test_occupied_slots_are_skipped(self):
+        # Una cita no alineada (8:10) solapa los slots de las 8:00 y de las 8:20
+        self.assertEqual(
+            self._free([(time(8), time(9, 20))], occupied=[self._at(8, 10), self._at(9)]),
+            [self._at(8, 40)],
+        )
+
+    def test_past_slots_today_are_skipped(self):
+        today = timezone.localdate()
+        now = self._at(8, 30, day=today)
+        self.assertEqual(
+            self._free([(time(8), time(9, 20))], now=now, day=today),
+            [self._at(8, 40, day=today), self._at(9, day=today)],
+        )
+
+    def test_range_uses_two_queries(self):
+        doctor = make_user("free_doctor", User.Roles.DOCTOR)
+        patient = make_user("free_patient", User.Roles.PATIENT)
+        weekly_availability(doctor, time(8), time(9))
+        Appointment.objects.create(patient=patient, doctor=doctor, scheduled_datetime=self._at(8, 20))
+        with self.assertNumQueries(2):
+            slots = get_available_slots_over_range(doctor, self.day, days=14)
+        self.assertEqual(len(slots), 14)
+        self.assertEqual(slots[self.day], [
+            (self._at(8), self._at(8, 20)), (self._at(8, 40), self._at(9)),
+        ])
+        # Sin franjas no hace falta consultar citas
+        with self.assertNumQueries(1):
+            get_available_slots_over_range(patient, self.day, days=14)
+
+
+@override_settings(SCHEDULING_SCHEDULE_INDEX=False)
+class EarliestSlotTests(TestCase):
+    """
+    Búsqueda de los primeros slots entre todos los médicos: mismo orden que
+    recorrer el calendario completo, corte exacto en `limit` y tramos que
+    avanzan cuando los primeros días no tienen hueco.
+    """
+    DAYS = 30
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.first = make_user("earliest_first", User.Roles.DOCTOR)
+        cls.second = make_user("earliest_second", User.Roles.DOCTOR)
+        cls.patient = make_user("earliest_patient", User.Roles.PATIENT)
+        weekly_availability(cls.first, time(8), time(9))
+        weekly_availability(cls.second, time(8, 20), time(9, 20))
+        # Un paciente con franjas no es candidato
+        weekly_availability(cls.patient, time(7), time(8))
+        cls.start_date = timezone.localdate() + timedelta(days=1)
+
+    def _expected(self, doctors):
+        """
+        Referencia: todos los slots del rango de cada médico, ordenados.
+        """
+        slots = sorted(
+            (slot_start, doctor.pk, slot_end)
+            for doctor in doctors
+            for day_slots in get_available_slots_over_range(doctor, self.start_date, self.DAYS).values()
+            for slot_start, slot_end in day_slots
+        )
+        return [(slot_start, doctor_id) for slot_start, doctor_id, _ in slots]
+
+    def _earliest(self, limit, doctors=None):
+        return [
+            (slot_start, doctor.pk)
+            for doctor, slot_start, _ in find_earliest_available_slots(
+                limit=limit, doctors=doctors, start_date=self.start_date, days=self.DAYS,
+            )
+        ]
+
+    def test_order_and_limit_match_the_full_calendar(self):
+        expected = self._expected([self.first, self.second])
+        for limit in (1, 4, 7, 15, 40):
+            self.assertEqual(self._earliest(limit), expected[:limit])
+
+    def test_ties_are_ordered_by_doctor(self):
+        found = find_earliest_available_slots(limit=3, start_date=self.start_date, days=self.DAYS)
+        day = self.start_date
+        self.assertEqual(
+            [(doctor, slot_start) for doctor, slot_start, _ in found],
+            [
+                (self.first, timezone.make_aware(datetime.combine(day, time(8)))),
+                (self.first, timezone.make_aware(datetime.combine(day, time(8, 20)))),
+                (self.second, timezone.make_aware(datetime.combine(day, time(8, 20)))),
+            ],
+        )
+
+    def test_later_chunks_are_searched_when_first_days_are_full(self):
+        # Ocupa los 4 primeros días del primer médico: tramos de 1, 2 y 4 días
+        Appointment.objects.bulk_create(
+            Appointment(patient=self.patient, doctor=self.first, scheduled_datetime=slot_start)
+            for slot_start, _ in self._expected([self.first])[:12]
+        )
+        expected = self._expected([self.first])
+        self.assertEqual(expected[0][0].date(), self.start_date + timedelta(days=4))
+        self.assertEqual(self._earliest(5, doctors=[self.first]), expected[:5])
+
+    def test_window_without_slots(self):
+        self.assertEqual(self._earliest(5, doctors=[self.patient]), [])
+        self.assertEqual(
+            find_earliest_available_slots(limit=5, start_date=self.start_date, days=0), [],
+        )
+
+
+class SlotSummaryTests(TestCase):
+    """
+    Resúmenes diarios de slots: el horizonte móvil avanza sin recalcular los
+    días ya guardados y verify_slot_summaries detecta filas desfasadas.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = make_user("summary_doctor", User.Roles.DOCTOR)
+        cls.patient = make_user("summary_patient", User.Roles.PATIENT)
+        weekly_availability(cls.doctor)
+
+    def setUp(self):
+        cache.clear()
+        self.today = timezone.localdate()
+
+    def _dates(self):
+        return list(DailySlotSummary.objects.filter(doctor=self.doctor).values_list("date", flat=True))
+
+    def test_roll_fills_new_days_and_drops_past_ones(self):
+        rebuild_slot_summaries(days=10)
+        # Simula el paso de un día: una fila de ayer que ya no sirve
+        DailySlotSummary.objects.create(doctor=self.doctor, date=self.today - timedelta(days=1))
+        kept = DailySlotSummary.objects.get(doctor=self.doctor, date=self.today + timedelta(days=5))
+
+        written = roll_slot_summaries()
+        self.assertEqual(written, SLOT_SUMMARY_HORIZON_DAYS - 10)
+        self.assertEqual(
+            self._dates(),
+            [self.today + timedelta(days=offset) for offset in range(SLOT_SUMMARY_HORIZON_DAYS)],
+        )
+        # Los días ya materializados no se reescriben
+        self.assertEqual(DailySlotSummary.objects.get(pk=kept.pk).updated_at, kept.updated_at)
+        self.assertEqual(verify_slot_summaries(), [])
+        # Sin días nuevos no escribe nada
+        self.assertEqual(roll_slot_summaries(), 0)
+
+    def test_roll_skips_former_doctors(self):
+        rebuild_slot_summaries()
+        User.objects.filter(pk=self.doctor.pk).update(role=User.Roles.PATIENT)
+        self.assertEqual(roll_slot_summaries(), 0)
+        self.assertEqual(self._dates(), [])
+
+    def test_verify_command(self):
+        call_command("rebuild_slot_summaries", "--roll", stdout=StringIO())
+        out = StringIO()
+        call_command("verify_slot_summaries", stdout=out)
+        self.assertIn("coinciden", out.getvalue())
+
+        day = self.today + timedelta(days=3)
+        DailySlotSummary.objects.filter(doctor=self.doctor, date=day).update(free_slot_count=0)
+        out = StringIO()
+        with self.assertRaises(CommandError):
+            call_command("verify_slot_summaries", "--doctor", str(self.doctor.pk), stdout=out)
+        self.assertIn(str(day), out.getvalue())
+        with self.assertRaises(CommandError):
+            call_command("rebuild_slot_summaries", "--verify", stdout=StringIO())
+
+
+class ScheduleIndexTests(TestCase):
+    """
+    El índice de bits responde lo mismo que el motor del ORM, también después
+    de reservar y cancelar, y descarta entradas invalidadas o poco usadas.
+    """
+    DAYS = 14
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = make_user("index_doctor", User.Roles.DOCTOR)
+        # Franja de fin no alineado (16:30): el último slot entero empieza a las 16:00
+        weekly_availability(cls.doctor, time(8), time(12))
+        weekly_availability(cls.doctor, time(14), time(16, 30))
+        # Médico no indexable (franja desalineada): siempre por el ORM
+        cls.unaligned = make_user("index_unaligned", User.Roles.DOCTOR)
+        weekly_availability(cls.unaligned, time(8, 10), time(10))
+        cls.patient = make_user("index_patient", User.Roles.PATIENT)
+        Appointment.objects.bulk_create([
+            Appointment(patient=cls.patient, doctor=cls.doctor, scheduled_datetime=next_weekday_at(9)),
+            # Cita antigua no alineada: ocupa dos slots
+            Appointment(patient=cls.patient, doctor=cls.doctor, scheduled_datetime=next_weekday_at(10, 10, days=2)),
+            Appointment(
+                patient=cls.patient, doctor=cls.doctor, scheduled_datetime=next_weekday_at(8, days=3),
+                status=Appointment.Status.CANCELED,
+            ),
+        ])
+
+    def setUp(self):
+        cache.clear()
+        schedule_index.clear()
+        self.addCleanup(schedule_index.clear)
+
+    def _slots(self, doctor, enabled):
+        with override_settings(SCHEDULING_SCHEDULE_INDEX=enabled):
+            return get_available_slots_over_range(doctor, timezone.localdate(), self.DAYS)
+
+    def _earliest(self, enabled):
+        with override_settings(SCHEDULING_SCHEDULE_INDEX=enabled):
+            return find_earliest_available_slots(limit=40)
+
+    def _assert_parity(self):
+        for doctor in (self.doctor, self.unaligned):
+            expected = self._slots(doctor, enabled=False)
+            # Primera lectura: carga el índice; segunda: responde desde los bits
+            self.assertEqual(self._slots(doctor, enabled=True), expected)
+            self.assertEqual(self._slots(doctor, enabled=True), expected)
+        self.assertEqual(self._earliest(enabled=True), self._earliest(enabled=False))
+
+    def test_warm_index_runs_no_queries(self):
+        self._slots(self.doctor, enabled=True)
+        with self.assertNumQueries(0):
+            self._slots(self.doctor, enabled=True)
+
+    def test_parity_with_orm(self):
+        self._assert_parity()
+
+    def test_parity_after_booking_and_cancel(self):
+        self._assert_parity()
+        appointment = book_appointment(self.patient, self.doctor, next_weekday_at(11, days=4))
+        self.assertNotIn(
+            appointment.scheduled_datetime,
+            [start for start, _ in self._slots(self.doctor, enabled=True)[appointment.scheduled_datetime.date()]],
+        )
+        self._assert_parity()
+        appointment.cancel()
+        self._assert_parity()
+
+    def test_masks(self):
+        # 08:00-12:00 son los slots 24 a 35
+        self.assertEqual(availability_mask(time(8), time(12)), ((1 << 12) - 1) << 24)
+        self.assertIsNone(availability_mask(time(8, 10), time(12)))
+        today = timezone.localdate()
+        now = timezone.make_aware(datetime.combine(today, time(8, 10)))
+        self.assertEqual(_past_mask(today - timedelta(days=1), now), FULL_DAY_MASK)
+        self.assertEqual(_past_mask(today + timedelta(days=1), now), 0)
+        # A las 08:10 ya empezaron los slots hasta el de las 08:00 (índice 24)
+        self.assertEqual(_past_mask(today, now), (1 << 25) - 1)
+
+    def _store(self, index, doctor_id, version=0):
+        index.store(doctor_id, version, {}, set(range(7)), [], timezone.localdate(), 1)
+
+    def test_version_bump_invalidates_entry(self):
+        index = ScheduleIndex()
+        self._store(index, self.doctor.pk)
+        self.assertIsNotNone(index.free_slots_over_range(self.doctor.pk, timezone.localdate(), 1))
+        bump_doctor_version(self.doctor.pk)
+        self.assertIsNone(index.free_slots_over_range(self.doctor.pk, timezone.localdate(), 1))
+
+    def test_least_recently_used_doctor_is_evicted(self):
+        index = ScheduleIndex(max_doctors=2)
+        today = timezone.localdate()
+        self._store(index, 1)
+        self._store(index, 2)
+        index.free_slots_over_range(1, today, 1)
+        self._store(index, 3)
+        self.assertIsNone(index.free_slots_over_range(2, today, 1))
+        self.assertIsNotNone(index.free_slots_over_range(1, today, 1))
+        self.assertIsNotNone(index.free_slots_over_range(3, today, 1))
+
+
+class ArchiveTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = make_user("archive_doctor", User.Roles.DOCTOR)
+        cls.patient = make_user("archive_patient", User.Roles.PATIENT)
+        old = timezone.now() - timedelta(days=400)
+        cls.old = Appointment.objects.bulk_create(
+            Appointment(
+                patient=cls.patient, doctor=cls.doctor, reason=f"Antigua {i}",
+                scheduled_datetime=old + timedelta(hours=i),
+                status=Appointment.Status.CANCELED if i % 3 == 0 else Appointment.Status.COMPLETED,
+                video_call_url=f"https://fake.daily.co/archive-{i}",
+            )
+            for i in range(5)
+        )
+        Consultation.objects.bulk_create(
+            Consultation(appointment=appointment, doctor_notes=f"Notas {appointment.pk}")
+            for appointment in cls.old[1:3]
+        )
+        VideoRoomTask.objects.create(appointment=cls.old[0], status=VideoRoomTask.Status.DONE)
+        cls.recent = Appointment.objects.create(
+            patient=cls.patient, doctor=cls.doctor, status=Appointment.Status.COMPLETED,
+            scheduled_datetime=timezone.now() - timedelta(days=10),
+        )
+
+    def _move_all(self, move):
+        while move()[0]:
+            pass
+
+    def test_archive_and_restore_round_trip(self):
+        appointments = list(Appointment.objects.order_by("id").values(*APPOINTMENT_FIELDS))
+        consultations = list(Consultation.objects.order_by("id").values(*CONSULTATION_FIELDS))
+
+        cutoff = archive_cutoff()
+        self._move_all(lambda: archive_batch(cutoff, batch_size=2))
+        self.assertEqual(list(Appointment.objects.values_list("id", flat=True)), [self.recent.pk])
+        self.assertEqual(
+            sorted(ArchivedAppointment.objects.values_list("id", flat=True)),
+            [appointment.pk for appointment in self.old],
+        )
+        self.assertEqual(ArchivedConsultation.objects.count(), 2)
+        self.assertFalse(Consultation.objects.exists())
+        # El outbox de salas de citas pasadas se descarta a propósito
+        self.assertFalse(VideoRoomTask.objects.exists())
+
+        self._move_all(lambda: restore_batch(batch_size=2))
+        self.assertFalse(ArchivedAppointment.objects.exists())
+        self.assertFalse(ArchivedConsultation.objects.exists())
+        # Mismos ids y fechas: auto_now no reescribe nada al restaurar
+        self.assertEqual(list(Appointment.objects.order_by("id").values(*APPOINTMENT_FIELDS)), appointments)
+        self.assertEqual(list(Consultation.objects.order_by("id").values(*CONSULTATION_FIELDS)), consultations)
+
+    def test_merged_listing_order(self):
+        archive_batch(archive_cutoff(), batch_size=3)
+        # Una cita viva a la misma hora que una archivada: desempata el id
+        tied = Appointment.objects.create(
+            patient=self.patient, doctor=self.doctor, status=Appointment.Status.COMPLETED,
+            scheduled_datetime=self.old[1].scheduled_datetime,
+        )
+        expected = sorted(
+            [*Appointment.objects.all(), *ArchivedAppointment.objects.all()],
+            key=lambda appointment: (appointment.scheduled_datetime, appointment.pk),
+        )
+        self.assertIn(tied, expected)
+        for descending in (False, True):
+            with self.subTest(descending=descending):
+                order = ("-scheduled_datetime", "-id") if descending else ("scheduled_datetime", "id")
+                merged = merge_by_schedule(
+                    [source.order_by(*order) for source in appointment_sources(patient=self.patient)],
+                    descending=descending,
+                )
+                self.assertEqual(
+                    [(type(a), a.pk) for a in merged],
+                    [(type(a), a.pk) for a in (expected[::-1] if descending else expected)],
+                )
+
+
+class KeysetPaginationTests(TestCase):
+    """
+    Paginación por cursor sobre (scheduled_datetime, id): recorre en ambos
+    sentidos filas con la misma fecha repartidas entre citas vivas y archivadas,
+    ignora cursores mal formados y termina sin páginas vacías.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.patient = make_user("keyset_patient", User.Roles.PATIENT)
+        doctors = [make_user(f"keyset_doctor_{i}", User.Roles.DOCTOR) for i in range(4)]
+        base = timezone.now() - timedelta(days=400)
+        moments = [base, base + timedelta(hours=1), base + timedelta(hours=2)]
+        Appointment.objects.bulk_create(
+            Appointment(patient=cls.patient, doctor=doctor, scheduled_datetime=moment)
+            for moment in (moments[0], moments[2])
+            for doctor in doctors
+        )
+        Appointment.objects.create(patient=cls.patient, doctor=doctors[0], scheduled_datetime=moments[1])
+        ArchivedAppointment.objects.bulk_create(
+            ArchivedAppointment(
+                id=100_000 + i, patient=cls.patient, doctor=doctors[i], scheduled_datetime=moments[0],
+                status=Appointment.Status.COMPLETED, created_at=base, updated_at=base,
+            )
+            for i in range(2)
+        )
+
+    def _sources(self):
+        return appointment_sources(patient=self.patient)
+
+    def _expected(self, descending):
+        rows = [(item.scheduled_datetime, item.pk) for source in self._sources() for item in source]
+        return sorted(rows, reverse=descending)
+
+    def _keys(self, page):
+        return [(item.scheduled_datetime, item.pk) for item in page.items]
+
+    def _walk(self, descending, page_size):
+        pages = []
+        page = keyset_paginate(self._sources(), descending=descending, page_size=page_size)
+        pages.append(self._keys(page))
+        while page.has_next:
+            page = keyset_paginate(
+                self._sources(), descending=descending, page_size=page_size,
+                after=decode_cursor(page.next_cursor),
+            )
+            pages.append(self._keys(page))
+        self.assertFalse(page.has_next)
+        # Vuelta atrás desde la última página
+        back = [self._keys(page)]
+        while page.has_previous:
+            page = keyset_paginate(
+                self._sources(), descending=descending, page_size=page_size,
+                before=decode_cursor(page.previous_cursor),
+            )
+            back.append(self._keys(page))
+        return pages, back[::-1]
+
+    def test_ties_across_pages_in_both_directions(self):
+        for descending in (False, True):
+            for page_size in (1, 2, 3, 4):
+                with self.subTest(descending=descending, page_size=page_size):
+                    pages, back = self._walk(descending, page_size)
+                    self.assertEqual([key for page in pages for key in page], self._expected(descending))
+                    self.assertTrue(all(pages))
+                    self.assertEqual(back, pages)
+
+    def test_exact_last_page_has_no_next(self):
+        # 11 filas en páginas de 11: una sola página, sin siguiente vacía
+        page = keyset_paginate(self._sources(), page_size=11)
+        self.assertEqual(len(page.items), 11)
+        self.assertFalse(page.has_next)
+        self.assertFalse(page.has_previous)
+
+    def test_cursor_past_the_end_gives_empty_page(self):
+        last = Appointment.objects.order_by("-scheduled_datetime", "-id").first()
+        page = keyset_paginate(self._sources(), after=decode_cursor(encode_cursor(last)))
+        self.assertEqual(page.items, [])
+        self.assertFalse(page.has_next)
+        self.assertFalse(page.has_previous)
+
+    def test_malformed_cursors(self):
+        for value in (None, "", "%%%", "sin-separador", "YWJjfHh5eg", "_w"):
+            with self.subTest(value=value):
+                self.assertIsNone(decode_cursor(value))
+        appointment = Appointment.objects.first()
+        self.assertEqual(
+            decode_cursor(encode_cursor(appointment)),
+            (appointment.scheduled_datetime, appointment.pk),
+        )
+
+    def test_view_ignores_malformed_cursor(self):
+        self.client.force_login(self.patient)
+        url = reverse("scheduling:patient_appointments")
+        response = self.client.get(url, {"scope": "all", "after": "%%%"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context["appointments"]), 11)
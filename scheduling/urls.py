@@ -8,6 +8,11 @@ urlpatterns = [
     path("paciente/citas/", views.patient_appointments, name="patient_appointments"),
     path("paciente/citas/nueva/", views.new_appointment_step1, name="new_appointment_step1"),
     path("paciente/citas/nueva/slots/", views.new_appointment_step2, name="new_appointment_step2"),
+    path(
+        "paciente/citas/nueva/mas-pronto/",
+        views.earliest_available_slots,
+        name="earliest_available_slots",
+    ),
     path("medico/citas/", views.doctor_appointments, name="doctor_appointments"),
     path("citas/<int:pk>/cancelar/", views.cancel_appointment, name="cancel_appointment"),
     path("medico/disponibilidad/", views.doctor_availability, name="doctor_availability"),
@@ -1,7 +1,15 @@
+import heapq
+from collections import defaultdict
 from datetime import datetime, time
 from datetime import timedelta
 from django.utils import timezone
+from accounts.models import User
 from .models import Appointment, DoctorAvailability, APPOINTMENT_SLOT_DELTA
+from .schedule_index import (
+    get_doctor_version,
+    is_schedule_index_enabled,
+    schedule_index,
+)
 
 
 def _make_aware(dt: datetime) -> datetime:
@@ -14,6 +22,138 @@ def _make_aware(dt: datetime) -> datetime:
     return timezone.make_aware(dt, timezone.get_current_timezone())
 
 
+def _load_availabilities_by_weekday(doctor, weekdays):
+    """
+    Una sola consulta: franjas activas del doctor agrupadas por día de la semana,
+    ordenadas por hora de inicio.
+    """
+    by_weekday = defaultdict(list)
+    availabilities = (
+        DoctorAvailability.objects
+        .filter(doctor=doctor, is_active=True, weekday__in=weekdays)
+        .order_by("weekday", "start_time")
+        .values_list("weekday", "start_time", "end_time")
+    )
+    for weekday, start_time, end_time in availabilities:
+        by_weekday[weekday].append((start_time, end_time))
+    return by_weekday
+
+
+def _load_occupied_starts(doctor, range_start, range_end):
+    """
+    Una sola consulta: inicios de citas no canceladas del doctor en el rango,
+    ya ordenados para el barrido.
+    """
+    return list(
+        Appointment.objects
+        .filter(
+            doctor=doctor,
+            scheduled_datetime__gte=range_start,
+            scheduled_datetime__lte=range_end,
+        )
+        .exclude(status=Appointment.Status.CANCELED)
+        .order_by("scheduled_datetime")
+        .values_list("scheduled_datetime", flat=True)
+    )
+
+
+def _candidate_slots_for_date(date, day_availabilities):
+    """
+    Genera los slots [inicio, inicio+20) de cada franja del día, ordenados por inicio.
+    Si dos franjas se solapan, cada slot aparece una sola vez.
+    """
+    candidates = set()
+    for start_time, end_time in day_availabilities:
+        current_start = _make_aware(datetime.combine(date, start_time))
+        avail_end = _make_aware(datetime.combine(date, end_time))
+        while current_start + APPOINTMENT_SLOT_DELTA <= avail_end:
+            candidates.add(current_start)
+            current_start += APPOINTMENT_SLOT_DELTA
+    return sorted(candidates)
+
+
+def iter_free_slots(availabilities_by_weekday, occupied_starts, start_date, days, now=None):
+    """
+    Generador perezoso de (date, slot_start, slot_end) libres, en orden cronológico.
+
+    Hace un barrido ordenado: como todas las citas duran lo mismo, ordenar por
+    inicio también ordena por fin, así que un único puntero sobre `occupied_starts`
+    basta para detectar solapamientos sin recorrer todas las citas por cada slot.
+    """
+    now = now or timezone.now()
+    occupied_index = 0
+    occupied_count = len(occupied_starts)
+    current = start_date
+
+    for _ in range(days):
+        day_availabilities = availabilities_by_weekday.get(current.weekday())
+        if day_availabilities:
+            for slot_start in _candidate_slots_for_date(current, day_availabilities):
+                # Evitamos slots en el pasado
+                if slot_start < now:
+                    continue
+                slot_end = slot_start + APPOINTMENT_SLOT_DELTA
+
+                # Descartamos citas que terminan antes de que empiece el slot
+                while (
+                    occupied_index < occupied_count
+                    and occupied_starts[occupied_index] + APPOINTMENT_SLOT_DELTA <= slot_start
+                ):
+                    occupied_index += 1
+
+                has_conflict = (
+                    occupied_index < occupied_count
+                    and occupied_starts[occupied_index] < slot_end
+                )
+                if not has_conflict:
+                    yield current, slot_start, slot_end
+        current = current + timedelta(days=1)
+
+
+def get_available_slots_over_range(doctor, start_date, days=14):
+    """
+    Motor de rango: devuelve {date: [(slot_start, slot_end), ...]} para
+    [start_date, start_date + days-1] usando solo dos consultas
+    (disponibilidades activas y citas no canceladas de todo el rango).
+    Si SCHEDULING_SCHEDULE_INDEX está activo, responde desde el índice de bits
+    en memoria cuando está caliente y lo recarga con estas mismas consultas cuando no.
+    """
+    doctor_id = getattr(doctor, "pk", doctor)
+    use_index = is_schedule_index_enabled()
+    if use_index:
+        cached = schedule_index.free_slots_over_range(doctor_id, start_date, days)
+        if cached is not None:
+            return cached
+        # Índice frío: leemos la versión antes de consultar (ver ScheduleIndex.store)
+        version = get_doctor_version(doctor_id)
+
+    dates = [start_date + timedelta(days=offset) for offset in range(days)]
+    slots_by_date = {d: [] for d in dates}
+    weekdays = {d.weekday() for d in dates}
+
+    availabilities_by_weekday = _load_availabilities_by_weekday(doctor_id, weekdays)
+    occupied_starts = []
+
+    if availabilities_by_weekday:
+        # Incluimos una cita previa al rango por si su intervalo invade el primer slot
+        range_start = _make_aware(datetime.combine(dates[0], time.min)) - APPOINTMENT_SLOT_DELTA
+        range_end = _make_aware(datetime.combine(dates[-1], time.max))
+        occupied_starts = _load_occupied_starts(doctor_id, range_start, range_end)
+
+        for day, slot_start, slot_end in iter_free_slots(
+            availabilities_by_weekday, occupied_starts, start_date, days
+        ):
+            slots_by_date[day].append((slot_start, slot_end))
+
+    if use_index:
+        schedule_index.store(
+            doctor_id, version, availabilities_by_weekday, weekdays,
+            occupied_starts, start_date, days,
+        )
+
+    return slots_by_date
+
+
 def get_available_slots_for_doctor_and_date(doctor, date):
     """
     Devuelve una lista de tuplas (slot_start, slot_end) para un doctor y una fecha concreta,
@@ -22,83 +162,142 @@ def get_available_slots_for_doctor_and_date(doctor, date):
     - Citas ya asignadas (evita solapamientos)
     - No generar slots en el pasado si la fecha es hoy
     Cada slot dura APPOINTMENT_SLOT_DELTA (20 minutos).
+    Es un envoltorio del motor de rango para un único día.
     """
-    weekday = date.weekday()
+    return get_available_slots_over_range(doctor, date, days=1)[date]
 
-    # 1. Disponibilidad activa del doctor en ese día de la semana
-    availabilities = DoctorAvailability.objects.filter(
-        doctor=doctor,
-        is_active=True,
-        weekday=weekday,
-    )
 
-    if not availabilities.exists():
-        return []
+def summarize_slots_by_date(slots_by_date):
+    """
+    Convierte {date: [slots]} en la lista [(date, num_slots)] del mini-calendario.
+    """
+    return [(day, len(slots)) for day, slots in sorted(slots_by_date.items())]
 
-    tz = timezone.get_current_timezone()
 
-    # 2. Citas existentes del doctor ese día
-    day_start = _make_aware(datetime.combine(date, time.min))
-    day_end = _make_aware(datetime.combine(date, time.max))
+def get_availability_over_range(doctor, start_date, days=14):
+    """
+    Devuelve una lista de tuples (date, num_slots) para el rango:
+    [start_date, start_date + days-1]
+    """
+    return summarize_slots_by_date(
+        get_available_slots_over_range(doctor, start_date, days=days)
+    )
 
-    existing_appointments = Appointment.objects.filter(
-        doctor=doctor,
-        scheduled_datetime__gte=day_start,
-        scheduled_datetime__lte=day_end,
-    ).exclude(status=Appointment.Status.CANCELED)
 
-    occupied_intervals = [
-        (
-            appt.scheduled_datetime,
-            appt.scheduled_datetime + APPOINTMENT_SLOT_DELTA,
+def _load_occupied_starts_by_doctor(doctor_ids, range_start, range_end):
+    """
+    Una sola consulta para varios doctores: {doctor_id: [inicios ordenados]}.
+    """
+    by_doctor = defaultdict(list)
+    appointments = (
+        Appointment.objects
+        .filter(
+            doctor_id__in=doctor_ids,
+            scheduled_datetime__gte=range_start,
+            scheduled_datetime__lte=range_end,
         )
-        for appt in existing_appointments
-    ]
+        .exclude(status=Appointment.Status.CANCELED)
+        .order_by("doctor_id", "scheduled_datetime")
+        .values_list("doctor_id", "scheduled_datetime")
+    )
+    for doctor_id, scheduled_datetime in appointments:
+        by_doctor[doctor_id].append(scheduled_datetime)
+    return by_doctor
 
-    # 3. Generar slots por cada franja de disponibilidad
-    slots = []
-    now = timezone.now()
 
-    for avail in availabilities:
-        current_start = _make_aware(datetime.combine(date, avail.start_time))
-        avail_end = _make_aware(datetime.combine(date, avail.end_time))
+def _doctor_slot_stream(doctor_id, availabilities_by_weekday, occupied_starts, start_date, days, now):
+    """
+    Flujo perezoso (slot_start, doctor_id, slot_end) de un médico, ordenable con heapq.merge.
+    """
+    for _, slot_start, slot_end in iter_free_slots(
+        availabilities_by_weekday, occupied_starts, start_date, days, now=now
+    ):
+        yield slot_start, doctor_id, slot_end
 
-        # Si es hoy, evitamos slots totalmente en el pasado
-        if date == now.date() and current_start < now:
-            while current_start < now:
-                current_start += APPOINTMENT_SLOT_DELTA
 
-        # Generamos slots [start, start+20) dentro de la franja
-        while current_start + APPOINTMENT_SLOT_DELTA <= avail_end:
-            slot_start = current_start
-            slot_end = current_start + APPOINTMENT_SLOT_DELTA
+def find_earliest_available_slots(limit=10, doctors=None, start_date=None, days=30):
+    """
+    Busca los primeros `limit` slots libres entre todos los médicos (o solo entre
+    `doctors`) en [start_date, start_date + days-1].
 
-            # Comprobar solapamiento con citas existentes
-            has_conflict = any(
-                not (slot_end <= occ_start or slot_start >= occ_end)
-                for occ_start, occ_end in occupied_intervals
-            )
+    Devuelve una lista de tuplas (doctor, slot_start, slot_end) en orden cronológico.
 
-            if not has_conflict:
-                slots.append((slot_start, slot_end))
+    No construye el calendario de cada médico: recorre la ventana en tramos que
+    crecen (1, 2, 4... días), carga solo las citas de ese tramo y mezcla de forma
+    perezosa los flujos de slots de cada médico con heapq.merge, deteniéndose en
+    cuanto tiene `limit` resultados.
+    """
+    start_date = start_date or timezone.localdate()
+    end_date = start_date + timedelta(days=days)
 
-            current_start += APPOINTMENT_SLOT_DELTA
+    # 1. Disponibilidades activas de todos los médicos candidatos (una consulta)
+    availability_qs = DoctorAvailability.objects.filter(
+        is_active=True,
+        doctor__role=User.Roles.DOCTOR,
+    )
+    if doctors is not None:
+        availability_qs = availability_qs.filter(doctor__in=doctors)
 
-    # Ordenamos por inicio de slot
-    slots.sort(key=lambda s: s[0])
-    return slots
+    availabilities = defaultdict(lambda: defaultdict(list))
+    for doctor_id, weekday, start_time, end_time in (
+        availability_qs
+        .order_by("doctor_id", "weekday", "start_time")
+        .values_list("doctor_id", "weekday", "start_time", "end_time")
+    ):
+        availabilities[doctor_id][weekday].append((start_time, end_time))
 
-def get_availability_over_range(doctor, start_date, days=14):
-    """
-    Devuelve una lista de tuples (date, num_slots) para el rango:
-    [start_date, start_date + days-1]
-    """
-    results = []
-    current = start_date
+    if not availabilities:
+        return []
 
-    for _ in range(days):
-        slots = get_available_slots_for_doctor_and_date(doctor, current)
-        results.append((current, len(slots)))
-        current = current + timedelta(days=1)
+    # 2. Recorrer la ventana por tramos hasta reunir `limit` slots
+    now = timezone.now()
+    found = []
+    chunk_start = start_date
+    chunk_days = 1
+
+    while chunk_start < end_date and len(found) < limit:
+        chunk_days = min(chunk_days, (end_date - chunk_start).days)
+        chunk_last = chunk_start + timedelta(days=chunk_days - 1)
+        weekdays = {
+            (chunk_start + timedelta(days=offset)).weekday()
+            for offset in range(chunk_days)
+        }
+        doctor_ids = [
+            doctor_id
+            for doctor_id, by_weekday in availabilities.items()
+            if weekdays.intersection(by_weekday)
+        ]
 
-    return results
\ No newline at end of file
+        if doctor_ids:
+            range_start = _make_aware(datetime.combine(chunk_start, time.min)) - APPOINTMENT_SLOT_DELTA
+            range_end = _make_aware(datetime.combine(chunk_last, time.max))
+            occupied = _load_occupied_starts_by_doctor(doctor_ids, range_start, range_end)
+
+            streams = [
+                _doctor_slot_stream(
+                    doctor_id,
+                    availabilities[doctor_id],
+                    occupied.get(doctor_id, []),
+                    chunk_start,
+                    chunk_days,
+                    now,
+                )
+                for doctor_id in doctor_ids
+            ]
+            for slot in heapq.merge(*streams):
+                found.append(slot)
+                if len(found) >= limit:
+                    break
+
+        chunk_start = chunk_last + timedelta(days=1)
+        chunk_days *= 2
+
+    # 3. Cargar los médicos de los resultados en una sola consulta
+    doctors_by_id = {
+        doctor.pk: doctor
+        for doctor in User.objects.filter(pk__in={doctor_id for _, doctor_id, _ in found})
+    }
+    return [
+        (doctors_by_id[doctor_id], slot_start, slot_end)
+        for slot_start, doctor_id, slot_end in found
+    ]
@@ -1,52 +1,80 @@
 # scheduling/video_calls.py
-import requests
+"""
+Operaciones de salas de videollamada sobre el cliente único de Daily
+(scheduling.daily_client).
+
+IMPORTANTE: este módulo NO importa models para evitar ciclos.
+Recibe las instancias de Appointment como parámetro.
+"""
 from datetime import timedelta
+from urllib.parse import urlsplit
+
 from django.conf import settings
+from django.utils.crypto import get_random_string
 
+from .daily_client import daily_client
 
-DAILY_API_BASE_URL = getattr(settings, "DAILY_API_BASE_URL", "https://api.daily.co/v1")
-DAILY_API_KEY = getattr(settings, "DAILY_API_KEY", "")
-DAILY_ROOMS_ENDPOINT = f"{DAILY_API_BASE_URL}/rooms"
+# Las salas de una cita caducan en Daily este tiempo después de la hora programada
+VIDEO_ROOM_TTL = timedelta(hours=2)
 
 
-def create_daily_room_for_appointment(appointment):
+def is_daily_configured():
+    return daily_client.is_configured()
+
+
+def _room_privacy():
+    return getattr(settings, "DAILY_ROOM_PRIVACY", "public")
+
+
+def create_daily_room(room_name, properties=None):
     """
-    Crea una sala Daily para una cita concreta y devuelve la URL.
+    Crea una sala Daily con el nombre dado y devuelve el JSON de la sala
+    (incluye `url`), o None si Daily responde con error.
+    """
+    return daily_client.create_room(room_name, properties, privacy=_room_privacy())
+
 
-    IMPORTANTE: este módulo NO importa models para evitar ciclos.
-    Recibe la instancia de Appointment como parámetro.
+def update_daily_room_expiry(room_name, exp_timestamp):
     """
-    if not DAILY_API_KEY or not getattr(settings, "DAILY_DOMAIN", ""):
-        # Si no está configurado, devolvemos None para no romper el flujo
-        return None
+    Fija la caducidad (`exp`) de una sala existente. Devuelve True si Daily la aceptó.
+    """
+    return daily_client.update_room(room_name, {"exp": exp_timestamp})
 
-    from django.utils.crypto import get_random_string  # import local para evitar dependencias globales
 
-    room_name = f"cita-{appointment.pk}-{get_random_string(8)}"
+def delete_daily_room(room_name):
+    """
+    Borra una sala en Daily. Devuelve True si ya no existe.
+    """
+    return daily_client.delete_room(room_name)
+
 
-    # Ejemplo: sala expira 2h después de la cita
-    exp_timestamp = int(
-        (appointment.scheduled_datetime + timedelta(hours=2)).timestamp()
-    )
+def appointment_room_expiry(appointment):
+    """
+    Timestamp de caducidad de la sala de una cita: VIDEO_ROOM_TTL después de la hora programada.
+    """
+    return int((appointment.scheduled_datetime + VIDEO_ROOM_TTL).timestamp())
 
-    payload = {
-        "name": room_name,
-        "privacy": "public", 
-        "properties": {
-            "exp": exp_timestamp,
-        },
-}
 
-    headers = {
-        "Authorization": f"Bearer {DAILY_API_KEY}",
-        "Content-Type": "application/json",
-    }
+def room_name_from_url(url):
+    """
+    Nombre de la sala a partir de su URL (https://<dominio>/<nombre>).
+    """
+    return urlsplit(url or "").path.strip("/").rsplit("/", 1)[-1]
+
 
-    response = requests.post(DAILY_ROOMS_ENDPOINT, json=payload, headers=headers)
+def create_daily_room_for_appointment(appointment):
+    """
+    Crea una sala Daily para una cita concreta y devuelve la URL.
 
-    if response.status_code not in (200, 201):
-        # TODO: loguear el error si quieres
+    Los errores de red (y el circuit breaker abierto) se propagan como
+    requests.RequestException para que el worker del outbox pueda reintentar.
+    """
+    if not is_daily_configured():
+        # Si no está configurado, devolvemos None para no romper el flujo
         return None
 
-    data = response.json()
+    room_name = f"cita-{appointment.pk}-{get_random_string(8)}"
+    data = create_daily_room(room_name, {"exp": appointment_room_expiry(appointment)})
+    if data is None:
+        return None
     return data.get("url")
@@ -0,0 +1,112 @@
+# scheduling/video_outbox.py
+"""
+Worker del outbox de salas de videollamada.
+
+La reserva solo inserta un VideoRoomTask en la misma transacción que la cita;
+este módulo lo procesa fuera de la petición, con reintentos y backoff exponencial.
+"""
+import random
+from datetime import timedelta
+
+import requests
+from django.utils import timezone
+
+from .models import VideoRoomTask
+
+VIDEO_ROOM_MAX_ATTEMPTS = 8
+VIDEO_ROOM_BACKOFF_BASE_SECONDS = 15
+VIDEO_ROOM_BACKOFF_MAX_SECONDS = 3600
+# Tiempo durante el cual una tarea reclamada es invisible para otros workers
+VIDEO_ROOM_LEASE_SECONDS = 120
+
+
+def backoff_delay(attempts):
+    """
+    Backoff exponencial con jitter completo, acotado a VIDEO_ROOM_BACKOFF_MAX_SECONDS.
+    """
+    ceiling = min(
+        VIDEO_ROOM_BACKOFF_MAX_SECONDS,
+        VIDEO_ROOM_BACKOFF_BASE_SECONDS * (2 ** max(attempts - 1, 0)),
+    )
+    return timedelta(seconds=random.uniform(ceiling / 2, ceiling))
+
+
+def _claim(task_id, now):
+    """
+    Reclama una tarea con un UPDATE condicional: si otro worker la tomó antes,
+    su next_attempt_at ya se movió al futuro y no se actualiza ninguna fila.
+    """
+    return VideoRoomTask.objects.filter(
+        pk=task_id,
+        status=VideoRoomTask.Status.PENDING,
+        next_attempt_at__lte=now,
+    ).update(next_attempt_at=now + timedelta(seconds=VIDEO_ROOM_LEASE_SECONDS)) == 1
+
+
+def process_task(task):
+    """
+    Intenta crear la sala de una tarea ya reclamada y registra el resultado.
+    Devuelve True si la cita quedó con URL.
+    """
+    appointment = task.appointment
+    error = ""
+    try:
+        url = appointment.ensure_video_call_url()
+    except requests.RequestException as exc:
+        url = None
+        error = f"{exc.__class__.__name__}: {exc}"
+
+    if url:
+        task.status = VideoRoomTask.Status.DONE
+        task.last_error = ""
+        task.save(update_fields=["status", "last_error", "updated_at"])
+        return True
+
+    task.attempts += 1
+    task.last_error = error or "Daily no configurado o respuesta no válida."
+    if task.attempts >= VIDEO_ROOM_MAX_ATTEMPTS:
+        # El worker deja de intentarlo; Appointment.request_video_room la reactiva
+        # si alguien abre la videollamada de la cita
+        task.status = VideoRoomTask.Status.FAILED
+    else:
+        task.next_attempt_at = timezone.now() + backoff_delay(task.attempts)
+    task.save(update_fields=["status", "attempts", "last_error", "next_attempt_at", "updated_at"])
+    return False
+
+
+def process_due_video_room_tasks(batch_size=20):
+    """
+    Procesa hasta `batch_size` tareas vencidas. Devuelve (creadas, fallidas).
+    Es seguro ejecutar varios workers a la vez.
+    """
+    now = timezone.now()
+    due_ids = list(
+        VideoRoomTask.objects
+        .filter(status=VideoRoomTask.Status.PENDING, next_attempt_at__lte=now)
+        .order_by("next_attempt_at")
+        .values_list("id", flat=True)[:batch_size]
+    )
+
+    created = failed = 0
+    for task_id in due_ids:
+        if not _claim(task_id, now):
+            continue
+        task = VideoRoomTask.objects.select_related("appointment").get(pk=task_id)
+        if task.appointment.status == task.appointment.Status.CANCELED:
+            task.status = VideoRoomTask.Status.FAILED
+            task.last_error = "La cita fue cancelada."
+            task.save(update_fields=["status", "last_error", "updated_at"])
+        elif task.appointment.is_video_room_expired:
+            task.status = VideoRoomTask.Status.FAILED
+            task.last_error = "La cita ya terminó; la sala habría caducado."
+            task.save(update_fields=["status", "last_error", "updated_at"])
+        elif task.appointment.video_call_url:
+            # Otra vía ya creó la sala
+            task.status = VideoRoomTask.Status.DONE
+            task.save(update_fields=["status", "updated_at"])
+            created += 1
+        elif process_task(task):
+            created += 1
+        else:
+            failed += 1
+    return created, failed
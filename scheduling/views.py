@@ -9,32 +9,83 @@ from datetime import datetime
 from accounts.decorators import role_required
 from accounts.models import User
 from .forms import (
+    AppointmentListFilterForm,
     AppointmentSearchForm,
     AppointmentSlotForm,
     DoctorAvailabilityForm,
+    EarliestSlotSearchForm,
 )
-from .models import Appointment, DoctorAvailability
+from .archive import appointment_sources
+from .booking import SlotUnavailableError, book_appointment, parse_slot_value
+from .directory import get_availability_directory
+from .models import Appointment, DoctorAvailability, APPOINTMENT_SLOT_DELTA
+from .pagination import decode_cursor, keyset_paginate
+from .summaries import get_slot_summary_calendar, refresh_slot_summaries
 from .utils import (
+    find_earliest_available_slots,
     get_available_slots_for_doctor_and_date,
-    get_availability_over_range,
 )
-from collections import defaultdict
 from django.http import HttpResponseForbidden
 
 
+def _appointment_list_context(request, querysets):
+    """
+    Aplica los filtros (próximas/pasadas/todas y estado) a las citas vivas y
+    archivadas y devuelve una página por cursor sobre (scheduled_datetime, id).
+    Las próximas se listan de la más cercana a la más lejana; pasadas y todas,
+    de la más reciente hacia atrás.
+    """
+    form = AppointmentListFilterForm(request.GET)
+    filters = form.cleaned_data if form.is_valid() else {"scope": form.SCOPE_UPCOMING}
+
+    # Una cita sigue siendo "próxima" mientras dura su slot
+    boundary = timezone.now() - APPOINTMENT_SLOT_DELTA
+    scope = filters["scope"]
+    lookups = {}
+    if scope == form.SCOPE_UPCOMING:
+        lookups["scheduled_datetime__gte"] = boundary
+        # El archivo solo guarda citas pasadas hace al menos un día
+        querysets = querysets[:1]
+    elif scope == form.SCOPE_PAST:
+        lookups["scheduled_datetime__lt"] = boundary
+    if filters.get("status"):
+        lookups["status"] = filters["status"]
+
+    page = keyset_paginate(
+        [queryset.filter(**lookups) for queryset in querysets],
+        descending=scope != form.SCOPE_UPCOMING,
+        after=decode_cursor(request.GET.get("after")),
+        before=decode_cursor(request.GET.get("before")),
+    )
+
+    def page_query(param, cursor):
+        query = request.GET.copy()
+        query.pop("after", None)
+        query.pop("before", None)
+        query[param] = cursor
+        return query.urlencode()
+
+    return {
+        "filter_form": form,
+        "appointments": page.items,
+        "page": page,
+        "next_page_query": page_query("after", page.next_cursor) if page.has_next else "",
+        "previous_page_query": page_query("before", page.previous_cursor) if page.has_previous else "",
+    }
+
+
 @role_required(User.Roles.PATIENT)
 def patient_appointments(request):
     """
-    Lista de citas del paciente.
+    Lista de citas del paciente, paginada por cursor.
     La creación ahora se hace en un flujo separado por slots.
     """
-    appointments = (
-        Appointment.objects
-        .filter(patient=request.user)
-        .select_related("doctor")
-        .order_by("scheduled_datetime")
-    )
-    return render(request, "scheduling/patient_appointments.html", {"appointments": appointments})
+    querysets = [
+        queryset.select_related("doctor")
+        for queryset in appointment_sources(patient=request.user)
+    ]
+    context = _appointment_list_context(request, querysets)
+    return render(request, "scheduling/patient_appointments.html", context)
 
 @role_required(User.Roles.PATIENT)
 def new_appointment_step1(request):
@@ -66,42 +117,45 @@ def new_appointment_step1(request):
     else:
         form = AppointmentSearchForm(initial=initial)
 
-    # 2) Construir disponibilidad típica de cada médico
-    doctors = (
-        User.objects
-        .filter(role=User.Roles.DOCTOR)
-        .prefetch_related("availabilities")
-    )
-
-    doctors_availability = []
-    for doctor in doctors:
-        # Solo disponibilidades activas
-        avail_qs = doctor.availabilities.filter(is_active=True).order_by("weekday", "start_time")
-        day_map = defaultdict(list)  # { "Lunes": ["08:00–12:00", ...], ... }
-
-        for avail in avail_qs:
-            label = f"{avail.start_time.strftime('%H:%M')}–{avail.end_time.strftime('%H:%M')}"
-            day_map[avail.get_weekday_display()].append(label)
-
-        days = [
-            {"day": day, "slots": ranges}
-            for day, ranges in day_map.items()
-        ]
-
-        doctors_availability.append(
-            {
-                "doctor": doctor,
-                "days": days,
-            }
-        )
+    # 2) Disponibilidad típica de cada médico, con su fragmento ya renderizado
+    # (cacheados; ver scheduling/directory.py)
+    doctors_availability, availability_directory = get_availability_directory()
 
     context = {
         "form": form,
         "doctors_availability": doctors_availability,
+        "availability_directory": availability_directory,
     }
     return render(request, "scheduling/new_appointment_step1.html", context)
 
 
+@role_required(User.Roles.PATIENT)
+def earliest_available_slots(request):
+    """
+    El paciente busca "la cita más pronto posible con cualquier médico".
+    Cada resultado enlaza al paso 2 con el médico y la fecha ya elegidos.
+    """
+    form = EarliestSlotSearchForm(request.GET or None)
+    results = []
+
+    if form.is_bound and form.is_valid():
+        doctors = form.cleaned_data["doctors"]
+        results = find_earliest_available_slots(
+            limit=form.cleaned_data["limit"] or 10,
+            doctors=doctors or None,
+            start_date=form.cleaned_data["start_date"],
+            days=form.cleaned_data["days"] or 30,
+        )
+    elif not form.is_bound:
+        results = find_earliest_available_slots()
+
+    context = {
+        "form": form,
+        "results": results,
+    }
+    return render(request, "scheduling/earliest_slots.html", context)
+
+
 @role_required(User.Roles.PATIENT)
 def new_appointment_step2(request):
     """
@@ -126,40 +180,21 @@ def new_appointment_step2(request):
         messages.error(request, "La fecha seleccionada no es válida.")
         return redirect("scheduling:new_appointment_step1")
 
-    # Calculamos slots disponibles
-    slots = get_available_slots_for_doctor_and_date(doctor, date)
-
-    if not slots:
-        messages.info(
-            request,
-            "No hay horarios disponibles para ese médico en la fecha seleccionada. "
-            "Elige otra fecha o médico."
-        )
-        return redirect("scheduling:new_appointment_step1")
-
-    # ✅ Mini-calendario: próximos 14 días desde la fecha seleccionada
-    availability_calendar = get_availability_over_range(doctor, date, days=14)
-
+    form = None
     if request.method == "POST":
-        form = AppointmentSlotForm(request.POST, slots=slots)
+        # Camino rápido: validamos solo el slot pedido, sin regenerar el día
+        slot_start = parse_slot_value(request.POST.get("slot"))
+        requested = [(slot_start, slot_start + APPOINTMENT_SLOT_DELTA)] if slot_start else []
+        form = AppointmentSlotForm(request.POST, slots=requested)
         if form.is_valid():
-            slot_value = form.cleaned_data["slot"]
-            reason = form.cleaned_data["reason"]
-
             try:
-                slot_start = datetime.fromisoformat(slot_value)
-                slot_start = (
-                    timezone.make_aware(slot_start, timezone.get_current_timezone())
-                    if timezone.is_naive(slot_start)
-                    else slot_start
+                book_appointment(
+                    patient=request.user,
+                    doctor=doctor,
+                    slot_start=slot_start,
+                    reason=form.cleaned_data["reason"],
                 )
-            except ValueError:
-                messages.error(request, "El slot seleccionado no es válido.")
-                return redirect("scheduling:new_appointment_step1")
-
-            # ✅ Defensa extra: verificar que el slot siga disponible
-            latest_slots = get_available_slots_for_doctor_and_date(doctor, date)
-            if not any(s[0] == slot_start for s in latest_slots):
+            except SlotUnavailableError:
                 messages.error(
                     request,
                     "El horario seleccionado ya no está disponible. "
@@ -169,23 +204,32 @@ def new_appointment_step2(request):
                     f"{reverse('scheduling:new_appointment_step2')}?doctor={doctor.pk}&date={date.isoformat()}"
                 )
 
-            # ✅ Crear la cita
-            appointment = Appointment.objects.create(
-                patient=request.user,
-                doctor=doctor,
-                scheduled_datetime=slot_start,
-                reason=reason,
-                # si usas status:
-                # status=Appointment.Status.SCHEDULED,
-            )
-
-            # ✅ AHORA sí, generar sala de videollamada
-            appointment.ensure_video_call_url()
-
             messages.success(request, "Cita creada correctamente.")
             return redirect("scheduling:patient_appointments")
-        else:
-            messages.error(request, "Por favor, corrige los errores en el formulario.")
+
+        messages.error(request, "Por favor, corrige los errores en el formulario.")
+
+    # Calculamos en vivo los slots del día elegido
+    slots = get_available_slots_for_doctor_and_date(doctor, date)
+
+    if not slots:
+        messages.info(
+            request,
+            "No hay horarios disponibles para ese médico en la fecha seleccionada. "
+            "Elige otra fecha o médico."
+        )
+        return redirect("scheduling:new_appointment_step1")
+
+    # ✅ Mini-calendario: próximos 14 días desde la fecha seleccionada,
+    # leído de la tabla de resúmenes (el día elegido usa el cálculo en vivo)
+    availability_calendar = [
+        (d, len(slots) if d == date else count)
+        for d, count in get_slot_summary_calendar(doctor, date, days=14)
+    ]
+
+    if form is not None:
+        # POST inválido: volvemos a mostrar el formulario con todos los slots del día
+        form = AppointmentSlotForm(request.POST, slots=slots)
     else:
         form = AppointmentSlotForm(slots=slots)
 
@@ -202,17 +246,13 @@ def new_appointment_step2(request):
 @role_required(User.Roles.DOCTOR)
 def doctor_appointments(request):
     """
-    El médico ve las citas en las que participa como doctor.
+    El médico ve las citas en las que participa como doctor, paginadas por cursor.
     """
-    appointments = (
-        Appointment.objects
-        .filter(doctor=request.user)
-        .order_by("-scheduled_datetime")
-    )
-
-    context = {
-        "appointments": appointments,
-    }
+    querysets = [
+        queryset.select_related("patient")
+        for queryset in appointment_sources(doctor=request.user)
+    ]
+    context = _appointment_list_context(request, querysets)
     return render(request, "scheduling/doctor_appointments.html", context)
 
 
@@ -262,6 +302,7 @@ def doctor_availability(request):
             availability = form.save(commit=False)
             availability.doctor = request.user
             availability.save()
+            refresh_slot_summaries(request.user)
             messages.success(request, "Disponibilidad guardada correctamente.")
             return redirect("scheduling:doctor_availability")
     else:
@@ -283,6 +324,7 @@ def delete_doctor_availability(request, pk):
         DoctorAvailability, pk=pk, doctor=request.user
     )
     availability.delete()
+    refresh_slot_summaries(request.user)
     messages.success(request, "Disponibilidad eliminada.")
     return redirect("scheduling:doctor_availability")
 
@@ -302,11 +344,13 @@ def appointment_video_call(request, appointment_id):
     ):
         return HttpResponseForbidden("No tienes permiso para acceder a esta videollamada.")
 
-    # Aseguramos que haya una sala (por si la cita es vieja)
-    appointment.ensure_video_call_url()
+    # Si no hay sala (cita vieja o aún en cola), la encolamos y mostramos
+    # el estado "preparando sala" hasta que el worker la cree
+    video_room_task = appointment.request_video_room()
 
     context = {
         "appointment": appointment,
+        "video_room_task": video_room_task,
     }
     return render(request, "scheduling/appointment_video_call.html", context)
 